@@ -9,7 +9,7 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 from app.db.base import Base
-from app.models import tenant, user, farm, section, device, schedule, watering_log, device_status
+from app.models import tenant, user, farm, section, device, schedule, watering_log, device_status, telemetry
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
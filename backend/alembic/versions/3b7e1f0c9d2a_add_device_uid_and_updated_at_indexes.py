@@ -0,0 +1,30 @@
+"""add indexes on devices.device_uid and devices.updated_at
+
+Revision ID: 3b7e1f0c9d2a
+Revises: a5569c5fd6a1
+Create Date: 2026-10-17 09:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7e1f0c9d2a'
+down_revision: Union[str, Sequence[str], None] = 'a5569c5fd6a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_devices_device_uid'), 'devices', ['device_uid'], unique=False)
+    op.create_index(op.f('ix_devices_updated_at'), 'devices', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_devices_updated_at'), table_name='devices')
+    op.drop_index(op.f('ix_devices_device_uid'), table_name='devices')
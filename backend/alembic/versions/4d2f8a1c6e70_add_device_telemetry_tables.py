@@ -0,0 +1,68 @@
+"""add device_telemetry (daily partitioned) and device_telemetry_hourly
+
+Revision ID: 4d2f8a1c6e70
+Revises: 9e4c2a7b5f13
+Create Date: 2026-10-17 11:26:54.114093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d2f8a1c6e70'
+down_revision: Union[str, Sequence[str], None] = '9e4c2a7b5f13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Partitioned tables need the partitioning column in every unique key and
+    # cannot have foreign keys. Daily partitions are split off pmax by the
+    # MQTT worker's telemetry maintenance (app.services.telemetry_service).
+    op.execute("""
+        CREATE TABLE device_telemetry (
+            id BIGINT NOT NULL AUTO_INCREMENT,
+            device_id INTEGER NOT NULL,
+            farm_id INTEGER NOT NULL,
+            kind VARCHAR(20) NOT NULL,
+            code VARCHAR(50) NULL,
+            message VARCHAR(1000) NULL,
+            data TEXT NULL,
+            ts DATETIME NOT NULL,
+            PRIMARY KEY (id, ts),
+            KEY ix_device_telemetry_device_ts (device_id, ts),
+            KEY ix_device_telemetry_farm_ts (farm_id, ts),
+            KEY ix_device_telemetry_ts (ts)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        PARTITION BY RANGE (TO_DAYS(ts)) (
+            PARTITION pmax VALUES LESS THAN MAXVALUE
+        )
+    """)
+    op.create_table('device_telemetry_hourly',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('device_id', sa.Integer(), nullable=False),
+    sa.Column('farm_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('code', sa.String(length=50), nullable=True),
+    sa.Column('hour', sa.DateTime(), nullable=False),
+    sa.Column('message_count', sa.Integer(), nullable=False),
+    sa.Column('first_ts', sa.DateTime(), nullable=False),
+    sa.Column('last_ts', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_device_telemetry_hourly_id'), 'device_telemetry_hourly', ['id'], unique=False)
+    op.create_index('ix_device_telemetry_hourly_device_hour', 'device_telemetry_hourly', ['device_id', 'hour'], unique=False)
+    op.create_index('ix_device_telemetry_hourly_farm_hour', 'device_telemetry_hourly', ['farm_id', 'hour'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_device_telemetry_hourly_farm_hour', table_name='device_telemetry_hourly')
+    op.drop_index('ix_device_telemetry_hourly_device_hour', table_name='device_telemetry_hourly')
+    op.drop_index(op.f('ix_device_telemetry_hourly_id'), table_name='device_telemetry_hourly')
+    op.drop_table('device_telemetry_hourly')
+    op.drop_table('device_telemetry')
@@ -0,0 +1,28 @@
+"""add composite index for the offline sweeper on devices
+
+Revision ID: 9e4c2a7b5f13
+Revises: 3b7e1f0c9d2a
+Create Date: 2026-10-17 10:03:18.227645
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4c2a7b5f13'
+down_revision: Union[str, Sequence[str], None] = '3b7e1f0c9d2a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_devices_offline_sweep', 'devices', ['is_deleted', 'last_seen', 'status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_devices_offline_sweep', table_name='devices')
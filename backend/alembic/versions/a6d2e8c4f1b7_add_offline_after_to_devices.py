@@ -0,0 +1,30 @@
+"""add per-device offline deadline from the agent's announced heartbeat interval
+
+Revision ID: a6d2e8c4f1b7
+Revises: d1f7b3a9e5c2
+Create Date: 2026-10-17 18:12:41.509317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d2e8c4f1b7'
+down_revision: Union[str, Sequence[str], None] = 'd1f7b3a9e5c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('devices', sa.Column('offline_after', sa.DateTime(), nullable=True))
+    op.create_index('ix_devices_offline_after', 'devices', ['is_deleted', 'offline_after', 'status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_devices_offline_after', table_name='devices')
+    op.drop_column('devices', 'offline_after')
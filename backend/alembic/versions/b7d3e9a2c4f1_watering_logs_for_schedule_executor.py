@@ -0,0 +1,30 @@
+"""allow farm-level watering logs and index runs by schedule and start time
+
+Revision ID: b7d3e9a2c4f1
+Revises: 4d2f8a1c6e70
+Create Date: 2026-10-17 14:02:41.508317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d3e9a2c4f1'
+down_revision: Union[str, Sequence[str], None] = '4d2f8a1c6e70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.alter_column('watering_logs', 'section_id', existing_type=sa.Integer(), nullable=True)
+    op.create_index('ix_watering_logs_schedule_start', 'watering_logs', ['schedule_id', 'start_time'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_watering_logs_schedule_start', table_name='watering_logs')
+    op.alter_column('watering_logs', 'section_id', existing_type=sa.Integer(), nullable=False)
@@ -0,0 +1,58 @@
+"""add device_gpio_pins inventory and a unique index on active mapping pins
+
+Revision ID: c4a8e2f6d1b3
+Revises: b7d3e9a2c4f1
+Create Date: 2026-10-17 16:12:08.731942
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a8e2f6d1b3'
+down_revision: Union[str, Sequence[str], None] = 'b7d3e9a2c4f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    # Check before any DDL: MySQL can't roll DDL back, so failing later would leave a half-applied revision
+    duplicates = conn.execute(sa.text(
+        "SELECT device_id, gpio_pin FROM peripheral_mappings WHERE is_deleted = 0 "
+        "GROUP BY device_id, gpio_pin HAVING COUNT(*) > 1"
+    )).fetchall()
+    if duplicates:
+        raise RuntimeError(
+            "Active peripheral mappings share a GPIO pin; soft-delete the extras before upgrading: "
+            + ", ".join(f"device {d} pin {p}" for d, p in duplicates)
+        )
+
+    op.create_table('device_gpio_pins',
+    sa.Column('device_id', sa.Integer(), nullable=False),
+    sa.Column('gpio_pin', sa.Integer(), autoincrement=False, nullable=False),
+    sa.ForeignKeyConstraint(['device_id'], ['devices.id'], ),
+    sa.PrimaryKeyConstraint('device_id', 'gpio_pin')
+    )
+    # Backfill from the comma-separated strings
+    rows = []
+    for device_id, pins in conn.execute(sa.text("SELECT id, available_gpio_pins FROM devices WHERE available_gpio_pins IS NOT NULL")):
+        parsed = {int(pin.strip()) for pin in pins.split(',') if pin.strip().isdigit()}
+        rows.extend({"device_id": device_id, "gpio_pin": pin} for pin in sorted(parsed))
+    if rows:
+        conn.execute(sa.text("INSERT INTO device_gpio_pins (device_id, gpio_pin) VALUES (:device_id, :gpio_pin)"), rows)
+
+    # NULL once the mapping is deleted, so the unique index only covers active mappings
+    op.add_column('peripheral_mappings', sa.Column('active_gpio_pin', sa.Integer(), sa.Computed('CASE WHEN is_deleted = 0 THEN gpio_pin END'), nullable=True))
+    op.create_index('ux_peripheral_mappings_device_active_pin', 'peripheral_mappings', ['device_id', 'active_gpio_pin'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_peripheral_mappings_device_active_pin', table_name='peripheral_mappings')
+    op.drop_column('peripheral_mappings', 'active_gpio_pin')
+    op.drop_table('device_gpio_pins')
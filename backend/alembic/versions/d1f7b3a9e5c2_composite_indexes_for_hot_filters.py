@@ -0,0 +1,49 @@
+"""composite indexes for the hot soft-delete filters found by audit_query_plans.py
+
+Revision ID: d1f7b3a9e5c2
+Revises: c4a8e2f6d1b3
+Create Date: 2026-10-17 17:40:22.164508
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1f7b3a9e5c2'
+down_revision: Union[str, Sequence[str], None] = 'c4a8e2f6d1b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# devices.device_uid and users.username are already indexed (3b7e1f0c9d2a, unique constraint)
+INDEXES = [
+    ('ix_farms_tenant_deleted', 'farms', ['tenant_id', 'deleted']),
+    ('ix_sections_farm_deleted', 'sections', ['farm_id', 'is_deleted']),
+    ('ix_devices_farm_deleted', 'devices', ['farm_id', 'is_deleted']),
+    ('ix_peripheral_mappings_section_deleted', 'peripheral_mappings', ['section_id', 'is_deleted']),
+    ('ix_peripheral_mappings_farm_deleted', 'peripheral_mappings', ['farm_id', 'is_deleted']),
+    ('ix_schedules_mapping_deleted', 'schedules', ['peripheral_mapping_id', 'is_deleted']),
+    ('ix_users_tenant_deleted', 'users', ['tenant_id', 'deleted']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    for name, table, columns in reversed(INDEXES):
+        if bind.dialect.name == 'mysql':
+            # InnoDB drops the implicit foreign key index once a composite index
+            # leads with the same column, and won't drop the composite while the
+            # foreign key needs it, so give the key its own index back first.
+            others = [i for i in sa.inspect(bind).get_indexes(table) if i['name'] != name]
+            if not any(i['column_names'][:1] == columns[:1] for i in others):
+                op.create_index(f'ix_{table}_{columns[0]}', table, columns[:1], unique=False)
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,30 @@
+"""add updated_at indexes on schedules and peripheral_mappings for the executor refresh
+
+Revision ID: e3b9f5d7a2c8
+Revises: a6d2e8c4f1b7
+Create Date: 2026-10-17 19:04:12.318604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b9f5d7a2c8'
+down_revision: Union[str, Sequence[str], None] = 'a6d2e8c4f1b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_schedules_updated_at'), 'schedules', ['updated_at'], unique=False)
+    op.create_index(op.f('ix_peripheral_mappings_updated_at'), 'peripheral_mappings', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_peripheral_mappings_updated_at'), table_name='peripheral_mappings')
+    op.drop_index(op.f('ix_schedules_updated_at'), table_name='schedules')
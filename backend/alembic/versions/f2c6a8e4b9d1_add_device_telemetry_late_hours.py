@@ -0,0 +1,31 @@
+"""add device_telemetry_late_hours: past hours to re-roll after late telemetry inserts
+
+Revision ID: f2c6a8e4b9d1
+Revises: e3b9f5d7a2c8
+Create Date: 2026-10-17 19:31:08.642177
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c6a8e4b9d1'
+down_revision: Union[str, Sequence[str], None] = 'e3b9f5d7a2c8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('device_telemetry_late_hours',
+    sa.Column('hour', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('hour')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('device_telemetry_late_hours')
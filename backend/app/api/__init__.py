@@ -4,4 +4,7 @@ from .farm import router as farm_router
 from .section import router as section_router
 from .device import router as device_router
 from .peripheral import router as peripheral_router
-from .schedule import router as schedule_router 
\ No newline at end of file
+from .schedule import router as schedule_router 
+from .telemetry import router as telemetry_router
+from .export import router as export_router
+from .async_lists import router as async_list_router
\ No newline at end of file
@@ -0,0 +1,185 @@
+"""Async variants of the hot list endpoints, served when API_DB_MODE=async.
+
+Paths and responses match the sync handlers in farm.py, section.py, device.py,
+peripheral.py and schedule.py; main.py registers this router first so it
+takes those paths over. Statements are shared with the sync handlers where
+they exist; relationships are loaded eagerly since an AsyncSession can't
+lazy-load.
+"""
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from app.api.deps import get_async_db, get_current_user_async
+from app.api.conditional import CachedView
+from app.api.device import device_list_statement
+from app.api.farm import FARM_LIST_ADAPTER, farm_list_statement, farm_list_version
+from app.api.pagination import Page, page_params, page_response
+from app.api.peripheral import MAPPING_LIST_ADAPTER, check_tenant_access, section_peripherals_version
+from app.api.schedule import SCHEDULE_LIST_ADAPTER, schedule_list_version
+from app.api.section import SECTION_LIST_ADAPTER, section_list_statement, section_list_version
+from app.models.farm import Farm
+from app.models.peripheral import PeripheralMapping, PeripheralType
+from app.models.schedule import Schedule
+from app.models.section import Section
+from app.schemas.device import DeviceOut
+from app.schemas.farm import FarmOut
+from app.schemas.schedule import ScheduleOut
+from app.schemas.section import SectionOut
+
+router = APIRouter()
+
+
+def require_admin_role(current_user):
+    if current_user.role not in ["tenant_admin", "super_admin"]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+
+@router.get("/farms/", response_model=list[FarmOut], tags=["farms"])
+async def list_farms(
+    response: Response,
+    tenant_id: Optional[int] = Query(None),
+    name: Optional[str] = Query(None, description="Name prefix"),
+    farm_code: Optional[str] = Query(None),
+    page: Page = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user_async),
+):
+    require_admin_role(current_user)
+    view = CachedView(page.request, current_user, "farms", farm_list_version(current_user))
+    cached = await view.lookup_async(db)
+    if cached is not None:
+        return cached
+    rows = (await db.execute(farm_list_statement(page, current_user, tenant_id, name, farm_code))).mappings()
+    return view.respond(page_response(rows, page, response), FARM_LIST_ADAPTER, response.headers)
+
+
+@router.get("/sections/", response_model=List[SectionOut], tags=["sections"])
+async def list_sections(
+    response: Response,
+    farm_id: Optional[int] = Query(None),
+    crop_type: Optional[str] = Query(None),
+    name: Optional[str] = Query(None, description="Name prefix"),
+    page: Page = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user_async),
+):
+    require_admin_role(current_user)
+    view = CachedView(page.request, current_user, "sections", section_list_version(current_user))
+    cached = await view.lookup_async(db)
+    if cached is not None:
+        return cached
+    rows = (await db.execute(section_list_statement(page, current_user, farm_id, crop_type, name))).mappings()
+    return view.respond(page_response(rows, page, response), SECTION_LIST_ADAPTER, response.headers)
+
+
+@router.get("/sections/farm/{farm_id}", response_model=List[SectionOut], tags=["sections"])
+async def list_sections_by_farm(
+    farm_id: int,
+    response: Response,
+    crop_type: Optional[str] = Query(None),
+    name: Optional[str] = Query(None, description="Name prefix"),
+    page: Page = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user_async),
+):
+    require_admin_role(current_user)
+    farm = (await db.execute(select(Farm).where(Farm.id == farm_id, Farm.deleted == False))).scalars().first()
+    if not farm:
+        raise HTTPException(status_code=404, detail="Farm not found")
+    if current_user.role == "tenant_admin" and farm.tenant_id != current_user.tenant_id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    rows = (await db.execute(section_list_statement(page, current_user, farm_id, crop_type, name))).mappings()
+    return page_response(rows, page, response)
+
+
+@router.get("/devices/", response_model=list[DeviceOut], tags=["devices"])
+async def list_devices(
+    response: Response,
+    farm_id: Optional[int] = Query(None),
+    status: Optional[str] = Query(None),
+    device_uid: Optional[str] = Query(None),
+    is_deleted: Optional[bool] = Query(None),
+    page: Page = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user_async),
+):
+    require_admin_role(current_user)
+    rows = (await db.execute(device_list_statement(page, current_user, farm_id, status, device_uid, is_deleted))).mappings()
+    return page_response(rows, page, response)
+
+
+@router.get("/peripherals/types", response_model=List[dict], tags=["peripherals"])
+async def list_peripheral_types(scope: Optional[str] = Query(None), db: AsyncSession = Depends(get_async_db), current_user=Depends(get_current_user_async)):
+    require_admin_role(current_user)
+    stmt = select(PeripheralType)
+    if scope:
+        stmt = stmt.where(PeripheralType.scope == scope)
+    return [{"id": t.id, "name": t.name, "scope": t.scope} for t in (await db.execute(stmt)).scalars()]
+
+
+def mapping_rows(rows, scope_column: str) -> List[dict]:
+    return [{
+        "id": m.id,
+        "device_id": m.device_id,
+        scope_column: getattr(m, scope_column),
+        "peripheral_type_id": m.peripheral_type_id,
+        "peripheral_type_name": type_name,
+        "gpio_pin": m.gpio_pin,
+        "is_deleted": m.is_deleted
+    } for m, type_name in rows]
+
+
+@router.get("/peripherals/sections/{section_id}", response_model=List[dict], tags=["peripherals"])
+async def list_section_peripherals(section_id: int, request: Request, db: AsyncSession = Depends(get_async_db), current_user=Depends(get_current_user_async)):
+    section = (await db.execute(
+        select(Section).options(joinedload(Section.farm)).where(Section.id == section_id, Section.is_deleted == False)
+    )).scalars().first()
+    if not section:
+        raise HTTPException(status_code=404, detail="Section not found")
+    check_tenant_access(section.farm, current_user)
+    view = CachedView(request, current_user, "section-peripherals", section_peripherals_version(section_id), ids=(section_id,))
+    cached = await view.lookup_async(db)
+    if cached is not None:
+        return cached
+    rows = await db.execute(
+        select(PeripheralMapping, PeripheralType.name)
+        .join(PeripheralType, PeripheralMapping.peripheral_type_id == PeripheralType.id)
+        .where(PeripheralMapping.section_id == section_id, PeripheralMapping.is_deleted == False)
+    )
+    return view.respond(mapping_rows(rows, "section_id"), MAPPING_LIST_ADAPTER)
+
+
+@router.get("/peripherals/farms/{farm_id}", response_model=List[dict], tags=["peripherals"])
+async def list_farm_peripherals(farm_id: int, db: AsyncSession = Depends(get_async_db), current_user=Depends(get_current_user_async)):
+    farm = (await db.execute(select(Farm).where(Farm.id == farm_id, Farm.deleted == False))).scalars().first()
+    if not farm:
+        raise HTTPException(status_code=404, detail="Farm not found")
+    check_tenant_access(farm, current_user)
+    rows = await db.execute(
+        select(PeripheralMapping, PeripheralType.name)
+        .join(PeripheralType, PeripheralMapping.peripheral_type_id == PeripheralType.id)
+        .where(PeripheralMapping.farm_id == farm_id, PeripheralMapping.is_deleted == False)
+    )
+    return mapping_rows(rows, "farm_id")
+
+
+@router.get("/schedules/peripheral/{mapping_id}", response_model=List[ScheduleOut], tags=["schedules"])
+async def list_schedules(mapping_id: int, request: Request, db: AsyncSession = Depends(get_async_db), current_user=Depends(get_current_user_async)):
+    mapping_id_found = (await db.execute(
+        select(PeripheralMapping.id).where(PeripheralMapping.id == mapping_id, PeripheralMapping.is_deleted == False)
+    )).scalar_one_or_none()
+    if mapping_id_found is None:
+        raise HTTPException(status_code=404, detail="Peripheral mapping not found")
+    # TODO: Add tenant/farm/section RBAC check
+    view = CachedView(request, current_user, "schedules", schedule_list_version(mapping_id), ids=(mapping_id,))
+    cached = await view.lookup_async(db)
+    if cached is not None:
+        return cached
+    schedules = (await db.execute(
+        select(Schedule).where(Schedule.peripheral_mapping_id == mapping_id, Schedule.is_deleted == False)
+    )).scalars().all()
+    return view.respond(schedules, SCHEDULE_LIST_ADAPTER)
@@ -0,0 +1,76 @@
+"""Conditional GET for the polled dashboard endpoints, backed by the response cache.
+
+A handler builds a CachedView after its permission checks and calls
+lookup()/lookup_async(). That returns a 304 when If-None-Match carries the
+current ETag, or the cached body when one is stored for this version. On a
+miss the handler runs as usual and passes its payload to respond(), which
+serializes it through the response model, stores it and adds the ETag. The
+cache key carries the caller's role and tenant, so a body is only reused for
+callers who passed the same checks.
+"""
+from typing import Dict, Iterable, Optional, Sequence
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from app.api.pagination import NEXT_CURSOR_HEADER
+from app.core.config import settings
+from app.services.response_cache_service import (
+    CachedResponse, VersionPart, etag_matches, make_etag, response_cache, version_statement,
+)
+
+CACHE_CONTROL = "private, no-cache"  # Always revalidate; a 304 is cheap
+PAGE_HEADERS = {NEXT_CURSOR_HEADER.lower(), "link"}
+
+
+class CachedView:
+    def __init__(self, request: Request, current_user, resource: str, parts: Sequence[VersionPart], ids: Iterable = ()):
+        self.request = request
+        self.parts = parts
+        self.tables = frozenset(part.model.__tablename__ for part in parts)
+        self.version_key = (resource, current_user.role, current_user.tenant_id, *ids)
+        # Every query parameter (filters, cursor, limit, fields) selects a different body
+        self.key = (self.version_key, request.url.path, request.url.query)
+        self.etag: Optional[str] = None
+
+    def _respond_cached(self, version: str) -> Optional[Response]:
+        self.etag = make_etag(self.key, version)
+        headers = {"ETag": self.etag, "Cache-Control": CACHE_CONTROL}
+        if etag_matches(self.request.headers.get("if-none-match"), self.etag):
+            response_cache.note_not_modified()
+            return Response(status_code=304, headers=headers)
+        cached = response_cache.get(self.key, self.etag)
+        if cached is None:
+            return None
+        return Response(cached.body, media_type="application/json", headers={**cached.headers, **headers})
+
+    def lookup(self, db) -> Optional[Response]:
+        if not settings.response_cache_enabled:
+            return None
+        version = response_cache.cached_version(self.version_key)
+        if version is None:
+            row = db.execute(version_statement(self.parts)).one()
+            version = response_cache.store_version(self.version_key, self.tables, row)
+        return self._respond_cached(version)
+
+    async def lookup_async(self, db) -> Optional[Response]:
+        if not settings.response_cache_enabled:
+            return None
+        version = response_cache.cached_version(self.version_key)
+        if version is None:
+            row = (await db.execute(version_statement(self.parts))).one()
+            version = response_cache.store_version(self.version_key, self.tables, row)
+        return self._respond_cached(version)
+
+    def respond(self, payload, adapter: TypeAdapter, headers: Optional[Dict[str, str]] = None):
+        """Serialize and cache the handler's payload (or page_response's JSONResponse) under the looked-up ETag."""
+        if self.etag is None:
+            return payload
+        if isinstance(payload, Response):
+            body = payload.body
+            headers = {k: v for k, v in payload.headers.items() if k.lower() not in ("content-length", "content-type")}
+        else:
+            body = adapter.dump_json(adapter.validate_python(payload, from_attributes=True))
+            headers = {k: v for k, v in (headers or {}).items() if k.lower() in PAGE_HEADERS}
+        response_cache.put(self.key, CachedResponse(self.etag, body, headers))
+        return Response(body, media_type="application/json", headers={**headers, "ETag": self.etag, "Cache-Control": CACHE_CONTROL})
@@ -1,10 +1,13 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app.db.session import SessionLocal
 from app.core.config import settings
+from app.models.user import User
 from app.services.user_service import get_user_by_username
+from app.services.principal_cache_service import Principal, principal_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
 
@@ -20,25 +23,58 @@ def get_db():
     finally:
         db.close()
 
+# Dependency to get an AsyncSession (API_DB_MODE=async)
+
+async def get_async_db():
+    # Imported here so the sync stack runs without an async driver installed
+    from app.db.async_session import AsyncSessionLocal
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Dependency to get current user from JWT
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_token(token: str):
+    """(username, issued_at) of a valid access token."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
-            raise credentials_exception
+            raise credentials_exception()
     except JWTError:
-        raise credentials_exception
+        raise credentials_exception()
+    # Tokens issued before iat was added fall back to exp, which is just as unique per login
+    return username, payload.get("iat", payload.get("exp"))
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    username, issued_at = decode_token(token)
+    principal = principal_cache.get(username, issued_at)
+    if principal is not None:
+        return principal
     user = get_user_by_username(db, username=username)
     if user is None:
-        raise credentials_exception
-    return user
+        raise credentials_exception()
+    principal = Principal.from_user(user)
+    principal_cache.put(issued_at, principal)
+    return principal
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db=Depends(get_async_db)):
+    username, issued_at = decode_token(token)
+    principal = principal_cache.get(username, issued_at)
+    if principal is not None:
+        return principal
+    user = (await db.execute(select(User).where(User.username == username).limit(1))).scalar_one_or_none()
+    if user is None:
+        raise credentials_exception()
+    principal = Principal.from_user(user)
+    principal_cache.put(issued_at, principal)
+    return principal
 
 # Dependency to enforce admin roles
 
@@ -1,17 +1,63 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from app.db.session import SessionLocal
 from app.models.device import Device
+from app.models.farm import Farm
 from app.api.deps import get_db, get_current_user
-from app.schemas.device import DeviceOut, DeviceCreate
+from app.api.pagination import ListSpec, Page, page_params, page_response
+from app.schemas.device import DeviceOut, DeviceCreate, DeviceBatchCreate
+from app.schemas.batch import BatchResult
+from app.services.provisioning_service import provision_devices
+from app.services.gpio_pin_service import sync_device_pins
+from app.core.config import settings
 
 router = APIRouter(prefix="/devices", tags=["devices"])
 
+DEVICE_LIST = ListSpec(Device, {
+    "id": Device.id,
+    "farm_id": Device.farm_id,
+    "device_uid": Device.device_uid,
+    "status": Device.status,
+    "firmware_version": Device.firmware_version,
+    "last_seen": Device.last_seen,
+    "created_at": Device.created_at,
+    "updated_at": Device.updated_at,
+    "available_gpio_pins": Device.available_gpio_pins,
+    "is_deleted": Device.is_deleted,
+})
+
+def device_list_statement(page: Page, current_user, farm_id: Optional[int], status: Optional[str],
+                          device_uid: Optional[str], is_deleted: Optional[bool]):
+    stmt = DEVICE_LIST.statement(page)
+    # Tenant admins only see devices on their tenant's farms
+    if current_user.role != "super_admin":
+        stmt = stmt.join(Farm, Farm.id == Device.farm_id).where(Farm.tenant_id == current_user.tenant_id)
+    if farm_id is not None:
+        stmt = stmt.where(Device.farm_id == farm_id)
+    if status:
+        stmt = stmt.where(Device.status == status)
+    if device_uid:
+        stmt = stmt.where(Device.device_uid == device_uid)
+    if is_deleted is not None:
+        stmt = stmt.where(Device.is_deleted == is_deleted)
+    return stmt
+
 @router.get("/", response_model=list[DeviceOut])
-def list_devices(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def list_devices(
+    response: Response,
+    farm_id: Optional[int] = Query(None),
+    status: Optional[str] = Query(None),
+    device_uid: Optional[str] = Query(None),
+    is_deleted: Optional[bool] = Query(None),
+    page: Page = Depends(page_params),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
     if current_user.role not in ["tenant_admin", "super_admin"]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    return db.query(Device).all()
+    rows = db.execute(device_list_statement(page, current_user, farm_id, status, device_uid, is_deleted)).mappings()
+    return page_response(rows, page, response)
 
 @router.post("/", response_model=DeviceOut)
 def create_device(device_in: DeviceCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
@@ -23,10 +69,22 @@ def create_device(device_in: DeviceCreate, db: Session = Depends(get_db), curren
         raise HTTPException(status_code=400, detail="A device already exists for this farm. Only one non-deleted device is allowed per farm.")
     device = Device(**device_in.dict(exclude_unset=True))
     db.add(device)
+    db.flush()
+    sync_device_pins(db, {device.id: device.available_gpio_pins})
     db.commit()
     db.refresh(device)
     return device
 
+@router.post("/batch", response_model=BatchResult)
+def create_devices_batch(batch: DeviceBatchCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    if current_user.role not in ["tenant_admin", "super_admin"]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if len(batch.items) > settings.provisioning_max_items:
+        raise HTTPException(status_code=400, detail=f"At most {settings.provisioning_max_items} items per batch")
+    outcome = provision_devices(db, batch.items, current_user, atomic=batch.atomic)
+    db.commit()
+    return outcome.as_dict()
+
 @router.put("/{device_id}", response_model=DeviceOut)
 def update_device(device_id: int, device_in: DeviceCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     if current_user.role not in ["tenant_admin", "super_admin"]:
@@ -34,8 +92,11 @@ def update_device(device_id: int, device_in: DeviceCreate, db: Session = Depends
     device = db.query(Device).filter(Device.id == device_id).first()
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
-    for key, value in device_in.dict(exclude_unset=True).items():
+    updates = device_in.dict(exclude_unset=True)
+    for key, value in updates.items():
         setattr(device, key, value)
+    if "available_gpio_pins" in updates:
+        sync_device_pins(db, {device.id: device.available_gpio_pins})
     db.commit()
     db.refresh(device)
     return device
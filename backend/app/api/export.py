@@ -0,0 +1,173 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+from app.api.deps import get_db, get_current_user
+from app.core.config import settings
+from app.models.device import Device
+from app.models.farm import Farm
+from app.models.peripheral import PeripheralMapping, PeripheralType
+from app.models.schedule import Schedule
+from app.models.section import Section
+from app.models.watering_log import WateringLog
+from app.services.export_service import EXPORT_FORMATS, export_filename, stream_export
+from typing import Optional
+from datetime import datetime
+
+router = APIRouter(prefix="/exports", tags=["exports"])
+
+FORMAT_PATTERN = f"^({'|'.join(EXPORT_FORMATS)})$"
+
+
+def scope(db: Session, current_user, tenant_id: Optional[int], farm_id: Optional[int]):
+    """(tenant_id, farm_id) the export is restricted to; tenant admins are pinned to their own tenant."""
+    if current_user.role not in ["tenant_admin", "super_admin"]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if current_user.role == "tenant_admin":
+        if tenant_id is not None and tenant_id != current_user.tenant_id:
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+        tenant_id = current_user.tenant_id
+    if farm_id is not None:
+        farm = db.query(Farm).filter(Farm.id == farm_id).first()
+        if not farm:
+            raise HTTPException(status_code=404, detail="Farm not found")
+        if tenant_id is not None and farm.tenant_id != tenant_id:
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+    return tenant_id, farm_id
+
+
+def restrict(stmt, farm_column, tenant_id: Optional[int], farm_id: Optional[int], in_farm=None):
+    """in_farm(farm_id), if given, is an index-friendly stand-in for farm_column == farm_id."""
+    if farm_id is not None:
+        # scope() has already checked the farm belongs to the tenant
+        return stmt.where(in_farm(farm_id) if in_farm is not None else farm_column == farm_id)
+    if tenant_id is not None:
+        stmt = stmt.join(Farm, Farm.id == farm_column).where(Farm.tenant_id == tenant_id)
+    return stmt
+
+
+def export_response(stmt, name: str, export_format: str, compress: bool) -> StreamingResponse:
+    filename = export_filename(name, export_format, compress)
+    return StreamingResponse(
+        stream_export(stmt, export_format, compress=compress, batch_size=settings.export_batch_size),
+        media_type="application/gzip" if compress else EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def mapping_farm_id():
+    # Farm-level mappings carry farm_id; section-level ones get it from their section
+    return func.coalesce(PeripheralMapping.farm_id, Section.farm_id)
+
+
+def mapping_in_farm(farm_id: int):
+    # Same rows as mapping_farm_id() == farm_id, but the coalesce can't use an index
+    return or_(
+        PeripheralMapping.farm_id == farm_id,
+        PeripheralMapping.section_id.in_(select(Section.id).where(Section.farm_id == farm_id)),
+    )
+
+
+@router.get("/devices")
+def export_devices(
+    tenant_id: Optional[int] = Query(None),
+    farm_id: Optional[int] = Query(None),
+    include_deleted: bool = Query(False),
+    export_format: str = Query("ndjson", alias="format", pattern=FORMAT_PATTERN),
+    gzip: bool = Query(False, description="Gzip the stream (.gz download)"),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    tenant_id, farm_id = scope(db, current_user, tenant_id, farm_id)
+    stmt = select(
+        Device.id, Device.farm_id, Device.device_uid, Device.status, Device.firmware_version, Device.last_seen,
+        Device.available_gpio_pins, Device.is_deleted, Device.created_at, Device.updated_at,
+    )
+    if not include_deleted:
+        stmt = stmt.where(Device.is_deleted == False)
+    stmt = restrict(stmt, Device.farm_id, tenant_id, farm_id).order_by(Device.id)
+    return export_response(stmt, "devices", export_format, gzip)
+
+
+@router.get("/peripheral-mappings")
+def export_peripheral_mappings(
+    tenant_id: Optional[int] = Query(None),
+    farm_id: Optional[int] = Query(None),
+    include_deleted: bool = Query(False),
+    export_format: str = Query("ndjson", alias="format", pattern=FORMAT_PATTERN),
+    gzip: bool = Query(False, description="Gzip the stream (.gz download)"),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    tenant_id, farm_id = scope(db, current_user, tenant_id, farm_id)
+    farm_column = mapping_farm_id()
+    stmt = (
+        select(
+            PeripheralMapping.id, PeripheralMapping.device_id, farm_column.label("farm_id"), PeripheralMapping.section_id,
+            PeripheralMapping.peripheral_type_id, PeripheralType.name.label("peripheral_type_name"), PeripheralMapping.gpio_pin,
+            PeripheralMapping.is_deleted, PeripheralMapping.created_at, PeripheralMapping.updated_at,
+        )
+        .join(PeripheralType, PeripheralType.id == PeripheralMapping.peripheral_type_id)
+        .outerjoin(Section, Section.id == PeripheralMapping.section_id)
+    )
+    if not include_deleted:
+        stmt = stmt.where(PeripheralMapping.is_deleted == False)
+    stmt = restrict(stmt, farm_column, tenant_id, farm_id, in_farm=mapping_in_farm).order_by(PeripheralMapping.id)
+    return export_response(stmt, "peripheral-mappings", export_format, gzip)
+
+
+@router.get("/schedules")
+def export_schedules(
+    tenant_id: Optional[int] = Query(None),
+    farm_id: Optional[int] = Query(None),
+    include_deleted: bool = Query(False),
+    export_format: str = Query("ndjson", alias="format", pattern=FORMAT_PATTERN),
+    gzip: bool = Query(False, description="Gzip the stream (.gz download)"),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    tenant_id, farm_id = scope(db, current_user, tenant_id, farm_id)
+    farm_column = mapping_farm_id()
+    stmt = (
+        select(
+            Schedule.id, Schedule.peripheral_mapping_id, PeripheralMapping.device_id, farm_column.label("farm_id"),
+            PeripheralMapping.section_id, Schedule.cron_expression, Schedule.duration_minutes, Schedule.is_deleted,
+            Schedule.created_at, Schedule.updated_at,
+        )
+        .join(PeripheralMapping, PeripheralMapping.id == Schedule.peripheral_mapping_id)
+        .outerjoin(Section, Section.id == PeripheralMapping.section_id)
+    )
+    if not include_deleted:
+        stmt = stmt.where(Schedule.is_deleted == False)
+    stmt = restrict(stmt, farm_column, tenant_id, farm_id, in_farm=mapping_in_farm).order_by(Schedule.id)
+    return export_response(stmt, "schedules", export_format, gzip)
+
+
+@router.get("/watering-logs")
+def export_watering_logs(
+    tenant_id: Optional[int] = Query(None),
+    farm_id: Optional[int] = Query(None),
+    start: Optional[datetime] = Query(None, description="Runs starting at or after this time"),
+    end: Optional[datetime] = Query(None, description="Runs starting before this time"),
+    export_format: str = Query("ndjson", alias="format", pattern=FORMAT_PATTERN),
+    gzip: bool = Query(False, description="Gzip the stream (.gz download)"),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    tenant_id, farm_id = scope(db, current_user, tenant_id, farm_id)
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    stmt = (
+        select(
+            WateringLog.id, WateringLog.schedule_id, WateringLog.device_id, Device.farm_id, WateringLog.section_id,
+            WateringLog.start_time, WateringLog.end_time, WateringLog.actual_water_amount, WateringLog.status,
+            WateringLog.error_message, WateringLog.created_at,
+        )
+        .join(Device, Device.id == WateringLog.device_id)
+    )
+    if start is not None:
+        stmt = stmt.where(WateringLog.start_time >= start)
+    if end is not None:
+        stmt = stmt.where(WateringLog.start_time < end)
+    stmt = restrict(stmt, Device.farm_id, tenant_id, farm_id).order_by(WateringLog.id)
+    return export_response(stmt, "watering-logs", export_format, gzip)
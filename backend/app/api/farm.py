@@ -1,41 +1,71 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from app.db.session import SessionLocal
 from app.models.farm import Farm
 from app.schemas.farm import FarmCreate, FarmUpdate, FarmOut
 from app.api.deps import get_db, get_current_user, require_admin
+from app.api.pagination import ListSpec, Page, page_params, page_response
+from app.api.conditional import CachedView
+from app.services.response_cache_service import VersionPart
 from app.models.tenant import Tenant
-from sqlalchemy.orm import joinedload
-from app.models.section import Section
-from app.models.peripheral import PeripheralMapping
-from app.models.schedule import Schedule
+from app.services.cascade_delete_service import soft_delete_farm
+from app.services.exclusivity_context_service import exclusivity_contexts
 
 router = APIRouter(prefix="/farms", tags=["farms"])
 
+FARM_LIST = ListSpec(Farm, {
+    "id": Farm.id,
+    "tenant_id": Farm.tenant_id,
+    "name": Farm.name,
+    "farm_code": Farm.farm_code,
+    "description": Farm.description,
+    "location": Farm.location,
+    "total_area": Farm.total_area,
+    "farm_owner_name": Farm.farm_owner_name,
+    "deleted": Farm.deleted,
+    "tenant_name": Tenant.name,
+})
+
+def farm_list_statement(page: Page, current_user, tenant_id: Optional[int], name: Optional[str], farm_code: Optional[str]):
+    stmt = FARM_LIST.statement(page).outerjoin(Tenant, Tenant.id == Farm.tenant_id).where(Farm.deleted == False)
+    # Tenant admins only see farms in their own tenant
+    if current_user.role != "super_admin":
+        stmt = stmt.where(Farm.tenant_id == current_user.tenant_id)
+    if tenant_id is not None:
+        stmt = stmt.where(Farm.tenant_id == tenant_id)
+    if name:
+        stmt = stmt.where(Farm.name.startswith(name, autoescape=True))
+    if farm_code:
+        stmt = stmt.where(Farm.farm_code == farm_code)
+    return stmt
+
+FARM_LIST_ADAPTER = TypeAdapter(List[FarmOut])
+
+def farm_list_version(current_user) -> List[VersionPart]:
+    """What the farm list reads for this caller: their farms and the tenant names."""
+    in_scope = () if current_user.role == "super_admin" else (Farm.tenant_id == current_user.tenant_id,)
+    return [VersionPart(Farm, in_scope), VersionPart(Tenant)]
+
 @router.get("/", response_model=list[FarmOut])
-def list_farms(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def list_farms(
+    response: Response,
+    tenant_id: Optional[int] = Query(None),
+    name: Optional[str] = Query(None, description="Name prefix"),
+    farm_code: Optional[str] = Query(None),
+    page: Page = Depends(page_params),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
     if current_user.role not in ["tenant_admin", "super_admin"]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    if current_user.role == "super_admin":
-        # Super admin can see all farms with tenant names
-        farms = db.query(Farm).options(joinedload(Farm.tenant)).filter(Farm.deleted == False).all()
-        # Add tenant_name to each farm object
-        for farm in farms:
-            farm.tenant_name = farm.tenant.name if farm.tenant else None
-        print(f"Super admin farms data: {[{'id': f.id, 'name': f.name, 'tenant_name': f.tenant_name} for f in farms]}")  # Debug log
-        return farms
-    else:
-        # Tenant admin can only see farms in their tenant, but still load tenant info for consistency
-        farms = db.query(Farm).options(joinedload(Farm.tenant)).filter(
-            Farm.tenant_id == current_user.tenant_id,
-            Farm.deleted == False
-        ).all()
-        # Add tenant_name to each farm object
-        for farm in farms:
-            farm.tenant_name = farm.tenant.name if farm.tenant else None
-        print(f"Tenant admin farms data: {[{'id': f.id, 'name': f.name, 'tenant_name': f.tenant_name} for f in farms]}")  # Debug log
-        return farms
+    view = CachedView(page.request, current_user, "farms", farm_list_version(current_user))
+    cached = view.lookup(db)
+    if cached is not None:
+        return cached
+    rows = db.execute(farm_list_statement(page, current_user, tenant_id, name, farm_code)).mappings()
+    return view.respond(page_response(rows, page, response), FARM_LIST_ADAPTER, response.headers)
 
 @router.post("/", response_model=FarmOut)
 def create_farm(farm_in: FarmCreate, db: Session = Depends(get_db), current_user=Depends(require_admin)):
@@ -139,25 +169,9 @@ def delete_farm(farm_id: int, db: Session = Depends(get_db), current_user=Depend
     if current_user.role == "tenant_admin" and farm.tenant_id != current_user.tenant_id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    # Soft delete
-    setattr(farm, "deleted", True)
-    # Soft delete all sections, peripherals, and schedules linked to this farm
-    # Sections
-    sections = db.query(Section).filter(Section.farm_id == farm_id, Section.is_deleted == False).all()
-    for section in sections:
-        setattr(section, 'is_deleted', True)
-    # Peripherals (farm and section)
-    peripherals = db.query(PeripheralMapping).filter(PeripheralMapping.farm_id == farm_id, PeripheralMapping.is_deleted == False).all()
-    # Also get section peripherals
-    section_ids = [section.id for section in sections]
-    if section_ids:
-        peripherals += db.query(PeripheralMapping).filter(PeripheralMapping.section_id.in_(section_ids), PeripheralMapping.is_deleted == False).all()
-    for peripheral in peripherals:
-        setattr(peripheral, 'is_deleted', True)
-        # Schedules for this peripheral
-        schedules = db.query(Schedule).filter(Schedule.peripheral_mapping_id == peripheral.id, Schedule.is_deleted == False).all()
-        for schedule in schedules:
-            setattr(schedule, 'is_deleted', True)
+    # Soft delete the farm with its sections, peripherals and schedules
+    soft_delete_farm(db, farm_id)
     db.commit()
     db.refresh(farm)
+    exclusivity_contexts.invalidate(farm_id)
     return farm 
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""Keyset pagination and sparse fieldsets shared by the list endpoints.
+
+A list request takes `?limit=&cursor=&fields=`. Rows are read in id order
+starting after the cursor, selected as plain columns rather than ORM entities,
+and capped at `limit`. The body stays a JSON list; when more rows exist the
+cursor for the next page comes back in `X-Next-Cursor` and a `Link: rel="next"`
+header. `fields=` narrows the response (and the SELECT) to the named columns;
+`id` is always included since the cursor is built from it.
+"""
+import base64
+import binascii
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.sql import ColumnElement, Select
+
+from app.core.config import settings
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+@dataclass
+class Page:
+    limit: int
+    after_id: Optional[int]
+    fields: Optional[List[str]]  # None means every field of the endpoint's response model
+    request: Request
+
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, _, value = raw.partition(":")
+        if prefix != "id":
+            raise ValueError(raw)
+        return int(value)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def page_params(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=settings.list_max_limit, description="Rows per page"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return; id is always included"),
+) -> Page:
+    return Page(
+        limit=limit or settings.list_default_limit,
+        after_id=decode_cursor(cursor) if cursor else None,
+        fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+        request=request,
+    )
+
+
+class ListSpec:
+    """The columns a list endpoint can return, keyed by response field name.
+
+    Columns may come from joined tables (e.g. a tenant name); the endpoint adds
+    those joins and its filters to the statement returned by statement().
+    """
+
+    def __init__(self, model, columns: Dict[str, ColumnElement]):
+        self.model = model
+        self.columns = columns
+        self.id_column = columns["id"]
+
+    def selected_fields(self, page: Page) -> List[str]:
+        if page.fields is None:
+            return list(self.columns)
+        unknown = [f for f in page.fields if f not in self.columns]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown field(s): {', '.join(unknown)}")
+        return ["id"] + [f for f in dict.fromkeys(page.fields) if f != "id"]
+
+    def statement(self, page: Page) -> Select:
+        """SELECT of the requested columns for one page; one extra row tells whether another page follows."""
+        stmt = select(*(self.columns[f].label(f) for f in self.selected_fields(page))).select_from(self.model)
+        if page.after_id is not None:
+            stmt = stmt.where(self.id_column > page.after_id)
+        return stmt.order_by(self.id_column).limit(page.limit + 1)
+
+
+def page_response(rows, page: Page, response: Response):
+    """The page body from statement() rows, with the next-page headers set."""
+    rows = [dict(row) for row in rows]
+    headers = {}
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        cursor = encode_cursor(rows[-1]["id"])
+        next_url = page.request.url.include_query_params(cursor=cursor)
+        headers = {NEXT_CURSOR_HEADER: cursor, "Link": f'<{next_url}>; rel="next"'}
+    if page.fields is not None:
+        # A partial row can't satisfy the endpoint's response_model, so skip it
+        return JSONResponse(jsonable_encoder(rows), headers=headers)
+    response.headers.update(headers)
+    return rows
@@ -1,4 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import TypeAdapter
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app.db.session import SessionLocal
 from app.models.peripheral import PeripheralType, PeripheralMapping
@@ -7,7 +9,16 @@ from app.models.section import Section
 from app.models.farm import Farm
 from app.api.deps import get_db, get_current_user
 from typing import List, Optional
-from app.models.schedule import Schedule
+from app.services.cascade_delete_service import soft_delete_mapping
+from app.services.provisioning_service import provision_peripheral_mappings
+from app.services.gpio_pin_service import PinInUseError, allocate_mapping, available_pins, pin_on_device
+from sqlalchemy.exc import IntegrityError
+from app.schemas.peripheral import PeripheralMappingBatchCreate
+from app.schemas.batch import BatchResult
+from app.core.config import settings
+from app.services.exclusivity_context_service import exclusivity_contexts
+from app.services.response_cache_service import VersionPart
+from app.api.conditional import CachedView
 
 router = APIRouter(prefix="/peripherals", tags=["peripherals"])
 
@@ -39,23 +50,34 @@ def available_gpio_pins(device_id: int, db: Session = Depends(get_db), current_u
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     check_tenant_access(device, current_user)
-    all_pins = [int(pin.strip()) for pin in (device.available_gpio_pins or '').split(',') if pin.strip().isdigit()]
-    used_pins = set(
-        m.gpio_pin for m in db.query(PeripheralMapping).filter_by(device_id=device_id, is_deleted=False)
-    )
-    return [pin for pin in all_pins if pin not in used_pins]
+    return available_pins(db, device_id)
 
 # 3. List peripheral mappings for a section
+MAPPING_LIST_ADAPTER = TypeAdapter(List[dict])
+
+def section_peripherals_version(section_id: int) -> List[VersionPart]:
+    """What the section's peripheral list reads: the section, its farm (access check) and its mappings."""
+    farm_id = select(Section.farm_id).where(Section.id == section_id).scalar_subquery()
+    return [
+        VersionPart(Section, (Section.id == section_id,)),
+        VersionPart(Farm, (Farm.id == farm_id,)),
+        VersionPart(PeripheralMapping, (PeripheralMapping.section_id == section_id,)),
+    ]
+
 @router.get("/sections/{section_id}", response_model=List[dict])
-def list_section_peripherals(section_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def list_section_peripherals(section_id: int, request: Request, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     section = db.query(Section).filter(Section.id == section_id, Section.is_deleted == False).first()
     if not section:
         raise HTTPException(status_code=404, detail="Section not found")
     check_tenant_access(section.farm, current_user)
+    view = CachedView(request, current_user, "section-peripherals", section_peripherals_version(section_id), ids=(section_id,))
+    cached = view.lookup(db)
+    if cached is not None:
+        return cached
     mappings = db.query(PeripheralMapping, PeripheralType).join(PeripheralType, PeripheralMapping.peripheral_type_id == PeripheralType.id).filter(
         PeripheralMapping.section_id == section_id, PeripheralMapping.is_deleted == False
     ).all()
-    return [{
+    return view.respond([{
         "id": m[0].id,
         "device_id": m[0].device_id,
         "section_id": m[0].section_id,
@@ -63,7 +85,7 @@ def list_section_peripherals(section_id: int, db: Session = Depends(get_db), cur
         "peripheral_type_name": m[1].name,
         "gpio_pin": m[0].gpio_pin,
         "is_deleted": m[0].is_deleted
-    } for m in mappings]
+    } for m in mappings], MAPPING_LIST_ADAPTER)
 
 # 4. List peripheral mappings for a farm
 @router.get("/farms/{farm_id}", response_model=List[dict])
@@ -102,10 +124,6 @@ def attach_section_peripheral(section_id: int, data: dict, db: Session = Depends
     exists = db.query(PeripheralMapping).filter_by(section_id=section_id, peripheral_type_id=peripheral_type_id, is_deleted=False).first()
     if exists:
         raise HTTPException(status_code=400, detail="A peripheral of this type is already attached to this section.")
-    # Only one mapping per GPIO pin per device
-    pin_used = db.query(PeripheralMapping).filter_by(device_id=device_id, gpio_pin=gpio_pin, is_deleted=False).first()
-    if pin_used:
-        raise HTTPException(status_code=400, detail="This GPIO pin is already in use on this device.")
     # Only allow types with correct scope
     ptype = db.query(PeripheralType).filter_by(id=peripheral_type_id, scope='section').first()
     if not ptype:
@@ -114,13 +132,16 @@ def attach_section_peripheral(section_id: int, data: dict, db: Session = Depends
     device = db.query(Device).filter(Device.id == device_id, Device.is_deleted == False).first()
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
-    all_pins = [int(pin.strip()) for pin in (device.available_gpio_pins or '').split(',') if pin.strip().isdigit()]
-    if gpio_pin not in all_pins:
+    if not pin_on_device(db, device_id, gpio_pin):
         raise HTTPException(status_code=400, detail="GPIO pin not available on this device.")
-    mapping = PeripheralMapping(device_id=device_id, section_id=section_id, peripheral_type_id=peripheral_type_id, gpio_pin=gpio_pin)
-    db.add(mapping)
+    # Only one mapping per GPIO pin per device, enforced by the unique active-pin index
+    try:
+        mapping = allocate_mapping(db, device_id=device_id, section_id=section_id, peripheral_type_id=peripheral_type_id, gpio_pin=gpio_pin)
+    except PinInUseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     db.commit()
     db.refresh(mapping)
+    exclusivity_contexts.invalidate(section.farm_id)
     return {"id": mapping.id}
 
 # 6. Attach peripheral to farm
@@ -138,25 +159,43 @@ def attach_farm_peripheral(farm_id: int, data: dict, db: Session = Depends(get_d
     exists = db.query(PeripheralMapping).filter_by(farm_id=farm_id, peripheral_type_id=peripheral_type_id, is_deleted=False).first()
     if exists:
         raise HTTPException(status_code=400, detail="A peripheral of this type is already attached to this farm.")
-    pin_used = db.query(PeripheralMapping).filter_by(device_id=device_id, gpio_pin=gpio_pin, is_deleted=False).first()
-    if pin_used:
-        raise HTTPException(status_code=400, detail="This GPIO pin is already in use on this device.")
     ptype = db.query(PeripheralType).filter_by(id=peripheral_type_id, scope='farm').first()
     if not ptype:
         raise HTTPException(status_code=400, detail="Invalid peripheral type for farm.")
     device = db.query(Device).filter(Device.id == device_id, Device.is_deleted == False).first()
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
-    all_pins = [int(pin.strip()) for pin in (device.available_gpio_pins or '').split(',') if pin.strip().isdigit()]
-    if gpio_pin not in all_pins:
+    if not pin_on_device(db, device_id, gpio_pin):
         raise HTTPException(status_code=400, detail="GPIO pin not available on this device.")
-    mapping = PeripheralMapping(device_id=device_id, farm_id=farm_id, peripheral_type_id=peripheral_type_id, gpio_pin=gpio_pin)
-    db.add(mapping)
+    # Only one mapping per GPIO pin per device, enforced by the unique active-pin index
+    try:
+        mapping = allocate_mapping(db, device_id=device_id, farm_id=farm_id, peripheral_type_id=peripheral_type_id, gpio_pin=gpio_pin)
+    except PinInUseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     db.commit()
     db.refresh(mapping)
+    exclusivity_contexts.invalidate(farm_id)
     return {"id": mapping.id}
 
-# 7. Soft delete peripheral mapping
+# 7. Attach many peripherals (to sections and/or farms) in one request
+@router.post("/batch", response_model=BatchResult)
+def attach_peripherals_batch(batch: PeripheralMappingBatchCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    if current_user.role not in ["tenant_admin", "super_admin"]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if len(batch.items) > settings.provisioning_max_items:
+        raise HTTPException(status_code=400, detail=f"At most {settings.provisioning_max_items} items per batch")
+    try:
+        outcome = provision_peripheral_mappings(db, batch.items, current_user, atomic=batch.atomic)
+        db.commit()
+    except IntegrityError:
+        # A concurrent request took one of the batch's pins between validation and insert
+        db.rollback()
+        raise HTTPException(status_code=409, detail="A GPIO pin in this batch was taken concurrently; retry the batch")
+    for farm_id in outcome.farm_ids:
+        exclusivity_contexts.invalidate(farm_id)
+    return outcome.as_dict()
+
+# 8. Soft delete peripheral mapping
 @router.delete("/{mapping_id}", response_model=dict)
 def delete_peripheral_mapping(mapping_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     mapping = db.query(PeripheralMapping).filter(PeripheralMapping.id == mapping_id, PeripheralMapping.is_deleted == False).first()
@@ -164,19 +203,20 @@ def delete_peripheral_mapping(mapping_id: int, db: Session = Depends(get_db), cu
         raise HTTPException(status_code=404, detail="Mapping not found")
     # Check tenant access
     # Get section or farm
+    farm_id = mapping.farm_id
     if mapping.section_id is not None:
         section = db.query(Section).filter(Section.id == mapping.section_id).first()
         if section is not None:
+            farm_id = section.farm_id
             check_tenant_access(section.farm, current_user)
     elif mapping.farm_id is not None:
         farm = db.query(Farm).filter(Farm.id == mapping.farm_id).first()
         if farm is not None:
             check_tenant_access(farm, current_user)
-    mapping.is_deleted = True  # type: ignore
-    # Soft delete all schedules linked to this peripheral
-    schedules = db.query(Schedule).filter(Schedule.peripheral_mapping_id == mapping.id, Schedule.is_deleted == False).all()
-    for schedule in schedules:
-        setattr(schedule, 'is_deleted', True)
+    # Soft delete the mapping and all schedules linked to it
+    soft_delete_mapping(db, mapping.id)
     db.commit()
     db.refresh(mapping)
+    if farm_id is not None:
+        exclusivity_contexts.invalidate(farm_id)
     return {"id": mapping.id, "deleted": True} 
\ No newline at end of file
@@ -1,195 +1,137 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from app.db.session import SessionLocal
 from app.models.schedule import Schedule
 from app.models.peripheral import PeripheralMapping, PeripheralType
 from app.api.deps import get_db, get_current_user, require_admin
-from app.schemas.schedule import ScheduleCreate, ScheduleUpdate, ScheduleOut
+from app.schemas.schedule import ScheduleCreate, ScheduleUpdate, ScheduleOut, ScheduleBatchCreate
+from app.schemas.batch import BatchResult
+from app.services.provisioning_service import provision_schedules
+from app.services.schedule_index_service import ScheduleOccurrenceIndex, Conflict
+from app.services.cron_algebra import first_overlap, UnsupportedCronExpression
+from app.services.schedule_clock import schedule_now
+from app.services.exclusivity_context_service import exclusivity_contexts, load_mapping_scope
+from app.services.response_cache_service import VersionPart
+from app.api.conditional import CachedView
+from app.core.config import settings
 from typing import List
-from datetime import timedelta, datetime
 from sqlalchemy import func
-from croniter import croniter
+import logging
 
 router = APIRouter(prefix="/schedules", tags=["schedules"])
+logger = logging.getLogger(__name__)
 
-# Helper to check if two time windows overlap
-def windows_overlap(start1, end1, start2, end2):
-    return max(start1, start2) < min(end1, end2)
+# Expanded windows of each farm's exclusive schedules, re-expanded only when a schedule changes
+occurrence_index = ScheduleOccurrenceIndex(
+    horizon_days=settings.schedule_index_horizon_days,
+    max_windows=settings.schedule_index_max_windows,
+)
 
-# Helper to get next N occurrences for a cron expression
-def get_next_occurrences(cron_expr, base_dt, n=5):
-    itr = croniter(cron_expr, base_dt)
-    return [itr.get_next(datetime) for _ in range(n)]
+def log_context(label, context):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Checking exclusivity for %s in farm %s: %s", label, context.farm_id,
+                     [{'id': s.id, 'mapping_id': s.peripheral_mapping_id, 'cron': s.cron_expression, 'duration': s.duration_minutes} for s in context.schedules])
+
+def find_exact_conflict(rows, cron_expr, duration, exclude_id=None):
+    """First conflict at any point in the future, not just within the index horizon."""
+    now = schedule_now()
+    best = None
+    for schedule_id, existing_cron, existing_duration in rows:
+        if schedule_id == exclude_id:
+            continue
+        try:
+            overlap = first_overlap(cron_expr, duration, existing_cron, existing_duration, now)
+        except UnsupportedCronExpression:
+            continue  # Only covered by the occurrence index
+        if overlap is not None and (best is None or overlap[0][0] < best.new_start):
+            (new_start, new_end), (start, end) = overlap
+            best = Conflict(schedule_id, start, end, new_start, new_end)
+    return best
+
+def check_exclusive_overlap(farm_id, schedules, cron_expr, duration, exclude_id=None):
+    rows = [(s.id, s.cron_expression, s.duration_minutes) for s in schedules if s.duration_minutes is not None]
+    # The index answers near-term conflicts with a bisect; the cron algebra proves there are none later
+    conflict = occurrence_index.check(farm_id, rows, cron_expr, duration, exclude_id=exclude_id)
+    if conflict is None:
+        conflict = find_exact_conflict(rows, cron_expr, duration, exclude_id=exclude_id)
+    if conflict is not None:
+        logger.debug("Overlap detected: new [%s, %s] vs exist [%s, %s] (sched_id=%s)",
+                     conflict.new_start, conflict.new_end, conflict.start, conflict.end, conflict.schedule_id)
+        raise HTTPException(status_code=400, detail="Overlapping schedule not allowed for any exclusive peripheral in this farm.")
+
+SCHEDULE_LIST_ADAPTER = TypeAdapter(List[ScheduleOut])
+
+def schedule_list_version(mapping_id: int) -> List[VersionPart]:
+    """What a mapping's schedule list reads: the mapping (exists, not deleted) and its schedules."""
+    return [
+        VersionPart(PeripheralMapping, (PeripheralMapping.id == mapping_id,)),
+        VersionPart(Schedule, (Schedule.peripheral_mapping_id == mapping_id,)),
+    ]
 
 @router.get("/peripheral/{mapping_id}", response_model=List[ScheduleOut])
-def list_schedules(mapping_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def list_schedules(mapping_id: int, request: Request, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     mapping = db.query(PeripheralMapping).filter(PeripheralMapping.id == mapping_id, PeripheralMapping.is_deleted == False).first()
     if not mapping:
         raise HTTPException(status_code=404, detail="Peripheral mapping not found")
     # TODO: Add tenant/farm/section RBAC check
+    view = CachedView(request, current_user, "schedules", schedule_list_version(mapping_id), ids=(mapping_id,))
+    cached = view.lookup(db)
+    if cached is not None:
+        return cached
     schedules = db.query(Schedule).filter(Schedule.peripheral_mapping_id == mapping_id, Schedule.is_deleted == False).all()
-    return schedules
+    return view.respond(schedules, SCHEDULE_LIST_ADAPTER)
 
 @router.post("/peripheral/{mapping_id}", response_model=ScheduleOut)
 def create_schedule(mapping_id: int, schedule_in: ScheduleCreate, db: Session = Depends(get_db), current_user=Depends(require_admin)):
-    mapping = db.query(PeripheralMapping).filter(PeripheralMapping.id == mapping_id, PeripheralMapping.is_deleted == False).first()
-    if not mapping:
+    scope = load_mapping_scope(db, mapping_id)
+    if scope is None:
         raise HTTPException(status_code=404, detail="Peripheral mapping not found")
-    ptype = db.query(PeripheralType).filter(PeripheralType.id == mapping.peripheral_type_id).first() if mapping else None
-    # Robust exclusivity: check for overlap with all exclusive schedules in the same section/farm
-    if ptype is not None and bool(getattr(ptype, 'exclusive_schedule', False)):
-        print(f"[DEBUG] Checking exclusivity for mapping_id={mapping_id}, ptype={ptype.name}, exclusive_schedule={ptype.exclusive_schedule}")
-        # Always check at the farm level for exclusivity, across all exclusive types
-        farm_id = mapping.farm_id if mapping is not None and getattr(mapping, 'farm_id', None) is not None else None
-        if farm_id is None and mapping is not None and getattr(mapping, 'section_id', None) is not None:
-            from app.models.section import Section
-            section = db.query(Section).filter(Section.id == mapping.section_id).first()
-            if section:
-                farm_id = section.farm_id
-        print(f"[DEBUG] farm_id for exclusivity: {farm_id}")
-        if farm_id is not None:
-            # Get all exclusive peripheral type IDs
-            exclusive_type_ids = [pt.id for pt in db.query(PeripheralType).filter(PeripheralType.exclusive_schedule == True).all()]
-            print(f"[DEBUG] exclusive_type_ids: {exclusive_type_ids}")
-            # Get all section IDs for this farm
-            section_ids = [s.id for s in db.query(Section).filter(Section.farm_id == farm_id).all()]
-            print(f"[DEBUG] section_ids in farm: {section_ids}")
-            # Get all mappings in the farm (direct or via section) with exclusive types
-            all_mappings = db.query(PeripheralMapping).filter(
-                (
-                    (PeripheralMapping.farm_id == farm_id) |
-                    (PeripheralMapping.section_id.in_(section_ids) if section_ids else False)
-                ),
-                PeripheralMapping.peripheral_type_id.in_(exclusive_type_ids)
-            ).all()
-            print(f"[DEBUG] ALL mappings in farm (regardless of is_deleted): {[{'id': m.id, 'type_id': m.peripheral_type_id, 'section_id': m.section_id, 'farm_id': m.farm_id, 'is_deleted': m.is_deleted} for m in all_mappings]}")
-            all_scheds = []
-            for m in all_mappings:
-                scheds = db.query(Schedule).filter(Schedule.peripheral_mapping_id == m.id).all()
-                print(f"[DEBUG] ALL schedules for mapping {m.id} (regardless of is_deleted): {[{'id': s.id, 'cron': s.cron_expression, 'duration': s.duration_minutes, 'is_deleted': s.is_deleted} for s in scheds]}")
-                all_scheds.extend(scheds)
-            print(f"[DEBUG] ALL schedules in farm (regardless of is_deleted): {len(all_scheds)}")
-            # Now filter to only active mappings
-            relevant_mappings = db.query(PeripheralMapping).filter(
-                (
-                    (PeripheralMapping.farm_id == farm_id) |
-                    (PeripheralMapping.section_id.in_(section_ids) if section_ids else False)
-                ),
-                PeripheralMapping.is_deleted == False,
-                PeripheralMapping.peripheral_type_id.in_(exclusive_type_ids)
-            ).all()
-            print(f"[DEBUG] relevant_mappings: {[{'id': m.id, 'type_id': m.peripheral_type_id, 'section_id': m.section_id, 'farm_id': m.farm_id} for m in relevant_mappings]}")
-        else:
-            relevant_mappings = []
-        # Gather all active schedules for these mappings
-        all_schedules = []
-        for m in relevant_mappings:
-            schedules = db.query(Schedule).filter(
-                Schedule.peripheral_mapping_id == m.id,
-                Schedule.is_deleted == False
-            ).all()
-            print(f"[DEBUG] Schedules for mapping {m.id}: {[{'id': s.id, 'cron': s.cron_expression, 'duration': s.duration_minutes} for s in schedules]}")
-            all_schedules.extend(schedules)
-        print(f"[DEBUG] all_schedules count: {len(all_schedules)}")
-        # For each, expand cron and check for overlap
-        new_occurrences = get_next_occurrences(schedule_in.cron_expression, datetime.now(), n=7)
-        print(f"[DEBUG] new_occurrences: {new_occurrences}")
-        for sched in all_schedules:
-            existing_occurrences = get_next_occurrences(sched.cron_expression, datetime.now(), n=7)
-            sched_duration = getattr(sched, 'duration_minutes', None)
-            if sched_duration is None:
-                continue
-            for new_start in new_occurrences:
-                new_end = new_start + timedelta(minutes=schedule_in.duration_minutes)
-                for exist_start in existing_occurrences:
-                    exist_end = exist_start + timedelta(minutes=sched_duration)
-                    if windows_overlap(new_start, new_end, exist_start, exist_end):
-                        print(f"[DEBUG] Overlap detected: new [{new_start}, {new_end}] vs exist [{exist_start}, {exist_end}] (sched_id={sched.id})")
-                        raise HTTPException(status_code=400, detail="Overlapping schedule not allowed for any exclusive peripheral in this farm.")
+    mapping, exclusive, farm_id = scope
+    # Exclusivity is checked at the farm level, across all exclusive peripheral types
+    if exclusive and farm_id is not None:
+        context = exclusivity_contexts.get(db, farm_id)
+        log_context(f"mapping_id={mapping_id}", context)
+        check_exclusive_overlap(farm_id, context.schedules, schedule_in.cron_expression, schedule_in.duration_minutes)
     schedule = Schedule(peripheral_mapping_id=mapping_id, cron_expression=schedule_in.cron_expression, duration_minutes=schedule_in.duration_minutes)
     db.add(schedule)
     db.commit()
     db.refresh(schedule)
+    if farm_id is not None:
+        exclusivity_contexts.invalidate(farm_id)
     return schedule
 
+@router.post("/batch", response_model=BatchResult)
+def create_schedules_batch(batch: ScheduleBatchCreate, db: Session = Depends(get_db), current_user=Depends(require_admin)):
+    if len(batch.items) > settings.provisioning_max_items:
+        raise HTTPException(status_code=400, detail=f"At most {settings.provisioning_max_items} items per batch")
+    # Each item is checked against the farm's exclusive schedules and the batch items accepted before it
+    outcome = provision_schedules(db, batch.items, current_user, check_exclusive_overlap, atomic=batch.atomic)
+    db.commit()
+    for farm_id in outcome.farm_ids:
+        exclusivity_contexts.invalidate(farm_id)
+    return outcome.as_dict()
+
 @router.put("/{schedule_id}", response_model=ScheduleOut)
 def update_schedule(schedule_id: int, schedule_in: ScheduleUpdate, db: Session = Depends(get_db), current_user=Depends(require_admin)):
     schedule = db.query(Schedule).filter(Schedule.id == schedule_id, Schedule.is_deleted == False).first()
     if not schedule:
         raise HTTPException(status_code=404, detail="Schedule not found")
-    mapping = db.query(PeripheralMapping).filter(PeripheralMapping.id == schedule.peripheral_mapping_id).first() if schedule else None
-    ptype = db.query(PeripheralType).filter(PeripheralType.id == mapping.peripheral_type_id).first() if mapping else None
-    # Robust exclusivity: check for overlap with all exclusive schedules in the same section/farm
-    if ptype is not None and bool(getattr(ptype, 'exclusive_schedule', False)):
-        print(f"[DEBUG] (UPDATE) Checking exclusivity for schedule_id={schedule_id}, ptype={ptype.name}, exclusive_schedule={ptype.exclusive_schedule}")
+    scope = load_mapping_scope(db, schedule.peripheral_mapping_id)
+    mapping, exclusive, farm_id = scope if scope is not None else (None, False, None)
+    if exclusive and farm_id is not None:
         cron_expr = schedule_in.cron_expression if schedule_in.cron_expression is not None else schedule.cron_expression
-        duration = schedule_in.duration_minutes if schedule_in.duration_minutes is not None else getattr(schedule, 'duration_minutes', None)
-        farm_id = mapping.farm_id if mapping is not None and getattr(mapping, 'farm_id', None) is not None else None
-        if farm_id is None and mapping is not None and getattr(mapping, 'section_id', None) is not None:
-            from app.models.section import Section
-            section = db.query(Section).filter(Section.id == mapping.section_id).first()
-            if section:
-                farm_id = section.farm_id
-        print(f"[DEBUG] (UPDATE) farm_id for exclusivity: {farm_id}")
-        if farm_id is not None:
-            exclusive_type_ids = [pt.id for pt in db.query(PeripheralType).filter(PeripheralType.exclusive_schedule == True).all()]
-            print(f"[DEBUG] (UPDATE) exclusive_type_ids: {exclusive_type_ids}")
-            from app.models.section import Section
-            section_ids = [s.id for s in db.query(Section).filter(Section.farm_id == farm_id).all()]
-            print(f"[DEBUG] (UPDATE) section_ids in farm: {section_ids}")
-            all_mappings = db.query(PeripheralMapping).filter(
-                (
-                    (PeripheralMapping.farm_id == farm_id) |
-                    (PeripheralMapping.section_id.in_(section_ids) if section_ids else False)
-                ),
-                PeripheralMapping.peripheral_type_id.in_(exclusive_type_ids)
-            ).all()
-            print(f"[DEBUG] (UPDATE) ALL mappings in farm (regardless of is_deleted): {[{'id': m.id, 'type_id': m.peripheral_type_id, 'section_id': m.section_id, 'farm_id': m.farm_id, 'is_deleted': m.is_deleted} for m in all_mappings]}")
-            all_scheds = []
-            for m in all_mappings:
-                scheds = db.query(Schedule).filter(Schedule.peripheral_mapping_id == m.id).all()
-                print(f"[DEBUG] (UPDATE) ALL schedules for mapping {m.id} (regardless of is_deleted): {[{'id': s.id, 'cron': s.cron_expression, 'duration': s.duration_minutes, 'is_deleted': s.is_deleted} for s in scheds]}")
-                all_scheds.extend(scheds)
-            print(f"[DEBUG] (UPDATE) ALL schedules in farm (regardless of is_deleted): {len(all_scheds)}")
-            relevant_mappings = db.query(PeripheralMapping).filter(
-                (
-                    (PeripheralMapping.farm_id == farm_id) |
-                    (PeripheralMapping.section_id.in_(section_ids) if section_ids else False)
-                ),
-                PeripheralMapping.is_deleted == False,
-                PeripheralMapping.peripheral_type_id.in_(exclusive_type_ids)
-            ).all()
-            print(f"[DEBUG] (UPDATE) relevant_mappings: {[{'id': m.id, 'type_id': m.peripheral_type_id, 'section_id': m.section_id, 'farm_id': m.farm_id} for m in relevant_mappings]}")
-        else:
-            relevant_mappings = []
-        all_schedules = []
-        for m in relevant_mappings:
-            schedules = db.query(Schedule).filter(
-                Schedule.peripheral_mapping_id == m.id,
-                Schedule.is_deleted == False,
-                Schedule.id != schedule_id
-            ).all()
-            print(f"[DEBUG] (UPDATE) Schedules for mapping {m.id}: {[{'id': s.id, 'cron': s.cron_expression, 'duration': s.duration_minutes} for s in schedules]}")
-            all_schedules.extend(schedules)
-        print(f"[DEBUG] (UPDATE) all_schedules count: {len(all_schedules)}")
-        new_occurrences = get_next_occurrences(cron_expr, datetime.now(), n=7)
-        print(f"[DEBUG] (UPDATE) new_occurrences: {new_occurrences}")
-        for sched in all_schedules:
-            existing_occurrences = get_next_occurrences(sched.cron_expression, datetime.now(), n=7)
-            sched_duration = getattr(sched, 'duration_minutes', None)
-            if duration is None or sched_duration is None:
-                continue
-            for new_start in new_occurrences:
-                new_end = new_start + timedelta(minutes=duration)
-                for exist_start in existing_occurrences:
-                    exist_end = exist_start + timedelta(minutes=sched_duration)
-                    if windows_overlap(new_start, new_end, exist_start, exist_end):
-                        print(f"[DEBUG] (UPDATE) Overlap detected: new [{new_start}, {new_end}] vs exist [{exist_start}, {exist_end}] (sched_id={sched.id})")
-                        raise HTTPException(status_code=400, detail="Overlapping schedule not allowed for any exclusive peripheral in this farm.")
+        duration = schedule_in.duration_minutes if schedule_in.duration_minutes is not None else schedule.duration_minutes
+        context = exclusivity_contexts.get(db, farm_id)
+        log_context(f"(UPDATE) schedule_id={schedule_id}", context)
+        if duration is not None:
+            check_exclusive_overlap(farm_id, context.schedules, cron_expr, duration, exclude_id=schedule_id)
     for key, value in schedule_in.dict(exclude_unset=True).items():
         setattr(schedule, key, value)
     db.commit()
     db.refresh(schedule)
+    if farm_id is not None:
+        exclusivity_contexts.invalidate(farm_id)
     return schedule
 
 @router.delete("/{schedule_id}", response_model=ScheduleOut)
@@ -200,4 +142,7 @@ def delete_schedule(schedule_id: int, db: Session = Depends(get_db), current_use
     setattr(schedule, 'is_deleted', True)
     db.commit()
     db.refresh(schedule)
+    scope = load_mapping_scope(db, schedule.peripheral_mapping_id)
+    if scope is not None and scope[2] is not None:
+        exclusivity_contexts.invalidate(scope[2])
     return schedule 
\ No newline at end of file
@@ -1,41 +1,88 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from pydantic import TypeAdapter
+from sqlalchemy import select
 from sqlalchemy.orm import Session, joinedload
 from app.db.session import SessionLocal
 from app.models.section import Section
 from app.models.farm import Farm
 from app.schemas.section import SectionCreate, SectionUpdate, SectionOut
 from app.api.deps import get_db, get_current_user, require_admin
-from typing import List
-from app.models.peripheral import PeripheralMapping
-from app.models.schedule import Schedule
+from app.api.pagination import ListSpec, Page, page_params, page_response
+from app.api.conditional import CachedView
+from app.services.response_cache_service import VersionPart
+from typing import List, Optional
+from app.services.cascade_delete_service import soft_delete_section
+from app.services.exclusivity_context_service import exclusivity_contexts
 
 router = APIRouter(prefix="/sections", tags=["sections"])
 
+SECTION_LIST = ListSpec(Section, {
+    "id": Section.id,
+    "farm_id": Section.farm_id,
+    "name": Section.name,
+    "section_code": Section.section_code,
+    "description": Section.description,
+    "crop_type": Section.crop_type,
+    "area": Section.area,
+    "section_incharge_name": Section.section_incharge_name,
+    "notes": Section.notes,
+    "is_deleted": Section.is_deleted,
+    "created_at": Section.created_at,
+    "updated_at": Section.updated_at,
+    "farm_name": Farm.name,
+})
+
+def section_list_statement(page: Page, current_user, farm_id: Optional[int], crop_type: Optional[str], name: Optional[str]):
+    stmt = SECTION_LIST.statement(page).join(Farm, Farm.id == Section.farm_id).where(Section.is_deleted == False)
+    # Tenant admins only see sections in their tenant's farms
+    if current_user.role != "super_admin":
+        stmt = stmt.where(Farm.tenant_id == current_user.tenant_id)
+    if farm_id is not None:
+        stmt = stmt.where(Section.farm_id == farm_id)
+    if crop_type:
+        stmt = stmt.where(Section.crop_type == crop_type)
+    if name:
+        stmt = stmt.where(Section.name.startswith(name, autoescape=True))
+    return stmt
+
+SECTION_LIST_ADAPTER = TypeAdapter(List[SectionOut])
+
+def section_list_version(current_user) -> List[VersionPart]:
+    """What the section list reads for this caller: sections of their farms, and the farms (names, tenant)."""
+    if current_user.role == "super_admin":
+        return [VersionPart(Section), VersionPart(Farm)]
+    tenant_farms = select(Farm.id).where(Farm.tenant_id == current_user.tenant_id)
+    return [VersionPart(Section, (Section.farm_id.in_(tenant_farms),)), VersionPart(Farm, (Farm.tenant_id == current_user.tenant_id,))]
+
 @router.get("/", response_model=List[SectionOut])
-def list_sections(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def list_sections(
+    response: Response,
+    farm_id: Optional[int] = Query(None),
+    crop_type: Optional[str] = Query(None),
+    name: Optional[str] = Query(None, description="Name prefix"),
+    page: Page = Depends(page_params),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
     if current_user.role not in ["tenant_admin", "super_admin"]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    if current_user.role == "super_admin":
-        # Super admin can see all sections with farm names
-        sections = db.query(Section).options(joinedload(Section.farm)).filter(Section.is_deleted == False).all()
-        # Add farm_name to each section object
-        for section in sections:
-            section.farm_name = section.farm.name if section.farm else None
-        return sections
-    else:
-        # Tenant admin can only see sections in their tenant's farms
-        sections = db.query(Section).options(joinedload(Section.farm)).join(Farm).filter(
-            Farm.tenant_id == current_user.tenant_id,
-            Section.is_deleted == False
-        ).all()
-        # Add farm_name to each section object
-        for section in sections:
-            section.farm_name = section.farm.name if section.farm else None
-        return sections
+    view = CachedView(page.request, current_user, "sections", section_list_version(current_user))
+    cached = view.lookup(db)
+    if cached is not None:
+        return cached
+    rows = db.execute(section_list_statement(page, current_user, farm_id, crop_type, name)).mappings()
+    return view.respond(page_response(rows, page, response), SECTION_LIST_ADAPTER, response.headers)
 
 @router.get("/farm/{farm_id}", response_model=List[SectionOut])
-def list_sections_by_farm(farm_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def list_sections_by_farm(
+    farm_id: int,
+    response: Response,
+    crop_type: Optional[str] = Query(None),
+    name: Optional[str] = Query(None, description="Name prefix"),
+    page: Page = Depends(page_params),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
     if current_user.role not in ["tenant_admin", "super_admin"]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
@@ -47,16 +94,8 @@ def list_sections_by_farm(farm_id: int, db: Session = Depends(get_db), current_u
     if current_user.role == "tenant_admin" and farm.tenant_id != current_user.tenant_id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    sections = db.query(Section).filter(
-        Section.farm_id == farm_id,
-        Section.is_deleted == False
-    ).all()
-    
-    # Add farm_name to each section object
-    for section in sections:
-        section.farm_name = farm.name
-    
-    return sections
+    rows = db.execute(section_list_statement(page, current_user, farm_id, crop_type, name)).mappings()
+    return page_response(rows, page, response)
 
 @router.post("/", response_model=SectionOut)
 def create_section(section_in: SectionCreate, db: Session = Depends(get_db), current_user=Depends(require_admin)):
@@ -171,17 +210,11 @@ def delete_section(section_id: int, db: Session = Depends(get_db), current_user=
     if current_user.role == "tenant_admin" and section.farm.tenant_id != current_user.tenant_id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    # Soft delete
-    setattr(section, "is_deleted", True)
-    # Soft delete all peripherals and their schedules linked to this section
-    peripherals = db.query(PeripheralMapping).filter(PeripheralMapping.section_id == section_id, PeripheralMapping.is_deleted == False).all()
-    for peripheral in peripherals:
-        setattr(peripheral, 'is_deleted', True)
-        schedules = db.query(Schedule).filter(Schedule.peripheral_mapping_id == peripheral.id, Schedule.is_deleted == False).all()
-        for schedule in schedules:
-            setattr(schedule, 'is_deleted', True)
+    # Soft delete the section with its peripherals and their schedules
+    soft_delete_section(db, section_id)
     db.commit()
     db.refresh(section)
+    exclusivity_contexts.invalidate(section.farm_id)
     
     # Add farm_name
     section.farm_name = section.farm.name if section.farm else None
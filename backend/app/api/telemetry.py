@@ -0,0 +1,70 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.models.device import Device
+from app.models.farm import Farm
+from app.api.deps import get_db, get_current_user
+from app.schemas.telemetry import TelemetryOut, TelemetryHourlyOut
+from app.services.telemetry_service import TELEMETRY_KINDS, query_telemetry, query_telemetry_hourly
+from typing import List, Optional, Union
+from datetime import datetime, timedelta
+
+router = APIRouter(prefix="/telemetry", tags=["telemetry"])
+
+MAX_LIMIT = 10000
+
+def check_farm_access(db: Session, farm_id: int, current_user):
+    if current_user.role not in ["tenant_admin", "super_admin"]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    farm = db.query(Farm).filter(Farm.id == farm_id, Farm.deleted == False).first()
+    if not farm:
+        raise HTTPException(status_code=404, detail="Farm not found")
+    if current_user.role == "tenant_admin" and farm.tenant_id != current_user.tenant_id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+def resolve_range(start: Optional[datetime], end: Optional[datetime], kind: Optional[str], limit: int):
+    if kind is not None and kind not in TELEMETRY_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(TELEMETRY_KINDS)}")
+    if limit < 1 or limit > MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_LIMIT}")
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return start, end
+
+@router.get("/devices/{device_id}", response_model=Union[List[TelemetryOut], List[TelemetryHourlyOut]])
+def device_telemetry(
+    device_id: int,
+    start: Optional[datetime] = Query(None, description="Defaults to 24h before end (UTC)"),
+    end: Optional[datetime] = Query(None, description="Defaults to now (UTC)"),
+    kind: Optional[str] = Query(None),
+    resolution: str = Query("raw", pattern="^(raw|hourly)$"),
+    limit: int = Query(1000),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    device = db.query(Device).filter(Device.id == device_id).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    check_farm_access(db, device.farm_id, current_user)
+    start, end = resolve_range(start, end, kind, limit)
+    if resolution == "hourly":
+        return query_telemetry_hourly(db, start, end, device_id=device_id, kind=kind, limit=limit)
+    return query_telemetry(db, start, end, device_id=device_id, kind=kind, limit=limit)
+
+@router.get("/farms/{farm_id}", response_model=Union[List[TelemetryOut], List[TelemetryHourlyOut]])
+def farm_telemetry(
+    farm_id: int,
+    start: Optional[datetime] = Query(None, description="Defaults to 24h before end (UTC)"),
+    end: Optional[datetime] = Query(None, description="Defaults to now (UTC)"),
+    kind: Optional[str] = Query(None),
+    resolution: str = Query("raw", pattern="^(raw|hourly)$"),
+    limit: int = Query(1000),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    check_farm_access(db, farm_id, current_user)
+    start, end = resolve_range(start, end, kind, limit)
+    if resolution == "hourly":
+        return query_telemetry_hourly(db, start, end, farm_id=farm_id, kind=kind, limit=limit)
+    return query_telemetry(db, start, end, farm_id=farm_id, kind=kind, limit=limit)
@@ -1,17 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from app.db.session import SessionLocal
 from app.models.tenant import Tenant
 from app.api.deps import get_db, get_current_user
+from app.api.pagination import ListSpec, Page, page_params, page_response
 from app.schemas.tenant import TenantRead, TenantCreate
 
 router = APIRouter(prefix="/tenants", tags=["tenants"])
 
+TENANT_LIST = ListSpec(Tenant, {
+    "id": Tenant.id,
+    "name": Tenant.name,
+    "description": Tenant.description,
+    "active": Tenant.active,
+})
+
 @router.get("/", response_model=list[TenantRead])
-def list_tenants(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def list_tenants(
+    response: Response,
+    active: Optional[bool] = Query(None),
+    name: Optional[str] = Query(None, description="Name prefix"),
+    page: Page = Depends(page_params),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
     if current_user.role != "super_admin":
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    return db.query(Tenant).all()
+    stmt = TENANT_LIST.statement(page)
+    if active is not None:
+        stmt = stmt.where(Tenant.active == active)
+    if name:
+        stmt = stmt.where(Tenant.name.startswith(name, autoescape=True))
+    return page_response(db.execute(stmt).mappings(), page, response)
 
 @router.post("/", response_model=TenantRead)
 def create_tenant(data: TenantCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
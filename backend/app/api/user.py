@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.orm import Session
 from app.schemas.user import UserCreate, UserOut, UserLogin, UserUpdate
 from app.services.user_service import create_user, authenticate_user, get_password_hash
+from app.services.principal_cache_service import principal_cache
 from app.api.deps import get_db, require_admin, get_current_user
+from app.api.pagination import ListSpec, Page, page_params, page_response
 from jose import jwt
 from datetime import timedelta, datetime
 from app.core.config import settings
 from app.models.user import User
+from app.models.tenant import Tenant
 from app.db.session import SessionLocal
 from pydantic import BaseModel
 
@@ -51,29 +55,48 @@ def login(user_in: UserLogin, db: Session = Depends(get_db)):
         "first_name": user.first_name,
         "last_name": user.last_name,
         "email": user.email,
+        "iat": datetime.utcnow(),
         "exp": datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     }, SECRET_KEY, algorithm=ALGORITHM)
     return {"access_token": access_token, "token_type": "bearer"}
 
+USER_LIST = ListSpec(User, {
+    "id": User.id,
+    "username": User.username,
+    "email": User.email,
+    "role": User.role,
+    "status": User.status,
+    "tenant_id": User.tenant_id,
+    "first_name": User.first_name,
+    "last_name": User.last_name,
+    "deleted": User.deleted,
+    "tenant_name": Tenant.name,
+})
+
 @router.get("/", response_model=list[UserOut])
-def list_users(db: Session = Depends(get_db), current_user=Depends(require_admin)):
-    if current_user.role == "super_admin":
-        # Super admin can see all users with tenant names
-        users = db.query(User).options(joinedload(User.tenant)).filter(User.deleted == False).all()
-        # Add tenant_name to each user object
-        for user in users:
-            user.tenant_name = user.tenant.name if user.tenant else None
-        return users
-    else:
-        # Tenant admin: only see users in their own tenant
-        users = db.query(User).options(joinedload(User.tenant)).filter(
-            User.tenant_id == current_user.tenant_id,
-            User.deleted == False
-        ).all()
-        # Add tenant_name to each user object for consistency
-        for user in users:
-            user.tenant_name = user.tenant.name if user.tenant else None
-        return users
+def list_users(
+    response: Response,
+    role: Optional[str] = Query(None),
+    tenant_id: Optional[int] = Query(None),
+    user_status: Optional[str] = Query(None, alias="status"),
+    username: Optional[str] = Query(None, description="Username prefix"),
+    page: Page = Depends(page_params),
+    db: Session = Depends(get_db),
+    current_user=Depends(require_admin),
+):
+    stmt = USER_LIST.statement(page).outerjoin(Tenant, Tenant.id == User.tenant_id).where(User.deleted == False)
+    # Tenant admin: only see users in their own tenant
+    if current_user.role != "super_admin":
+        stmt = stmt.where(User.tenant_id == current_user.tenant_id)
+    if role:
+        stmt = stmt.where(User.role == role)
+    if tenant_id is not None:
+        stmt = stmt.where(User.tenant_id == tenant_id)
+    if user_status:
+        stmt = stmt.where(User.status == user_status)
+    if username:
+        stmt = stmt.where(User.username.startswith(username, autoescape=True))
+    return page_response(db.execute(stmt).mappings(), page, response)
 
 @router.put("/me", response_model=UserUpdateResponse)
 def update_me(user_in: UserUpdate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
@@ -90,6 +113,7 @@ def update_me(user_in: UserUpdate, db: Session = Depends(get_db), current_user=D
             setattr(user, key, value)
     db.commit()
     db.refresh(user)
+    principal_cache.invalidate(user.username)
     access_token = jwt.encode({
         "sub": user.username,
         "role": user.role,
@@ -97,6 +121,7 @@ def update_me(user_in: UserUpdate, db: Session = Depends(get_db), current_user=D
         "first_name": user.first_name,
         "last_name": user.last_name,
         "email": user.email,
+        "iat": datetime.utcnow(),
         "exp": datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     }, SECRET_KEY, algorithm=ALGORITHM)
     return {"access_token": access_token, "user": UserOut.model_validate(user)}
@@ -112,6 +137,7 @@ def update_user(user_id: int, user_in: UserUpdate, db: Session = Depends(get_db)
         if user.tenant_id != current_user.tenant_id:
             raise HTTPException(status_code=403, detail="Cannot update users from another tenant")
         user_in.tenant_id = current_user.tenant_id
+    old_username = user.username
     for key, value in user_in.dict(exclude_unset=True).items():
         if key == "password":
             setattr(user, "password_hash", get_password_hash(value))
@@ -119,6 +145,8 @@ def update_user(user_id: int, user_in: UserUpdate, db: Session = Depends(get_db)
             setattr(user, key, value)
     db.commit()
     db.refresh(user)
+    principal_cache.invalidate(old_username)
+    principal_cache.invalidate(user.username)
     return user
 
 @router.put("/{user_id}/disable", response_model=UserOut)
@@ -134,4 +162,11 @@ def disable_user(user_id: int, db: Session = Depends(get_db), current_user=Depen
     setattr(user, "deleted", True)
     db.commit()
     db.refresh(user)
-    return user 
\ No newline at end of file
+    principal_cache.invalidate(user.username)
+    return user
+
+@router.get("/principal-cache/stats")
+def principal_cache_stats(current_user=Depends(get_current_user)):
+    if current_user.role != "super_admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return principal_cache.stats() 
\ No newline at end of file
@@ -11,6 +11,8 @@ class Settings(BaseSettings):
     SECRET_KEY: str = secrets.token_urlsafe(32)  # Should be overridden by env
     ALGORITHM: str = "HS256"  # Should be overridden by env
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30  # Should be overridden by env
+    principal_cache_ttl_seconds: float = Field(60.0, description="How long an authenticated user is served from memory before being re-read")
+    principal_cache_max_entries: int = Field(10000, description="Max (username, token) principals kept in the LRU")
     
     # Database
     MYSQL_USER: str = "root"
@@ -18,6 +20,26 @@ class Settings(BaseSettings):
     MYSQL_HOST: str = "localhost"
     MYSQL_PORT: int = 3306
     MYSQL_DB: str = "farm_automation"
+    DATABASE_URL: str = Field("", description="Override the sync engine URL built from MYSQL_* (e.g. sqlite:///./dev.db)")
+    ASYNC_DATABASE_URL: str = Field("", description="Override the async engine URL built from MYSQL_* (e.g. sqlite+aiosqlite:///./dev.db)")
+    api_db_mode: str = Field("sync", description="Hot list endpoints: 'sync' (pymysql on the threadpool) or 'async' (aiomysql on the event loop)")
+    db_pool_size: int = Field(5, description="Connections kept open per API process, for either engine")
+    db_max_overflow: int = Field(10, description="Extra connections opened under load beyond db_pool_size")
+
+    # List endpoints
+    list_default_limit: int = Field(500, description="Rows per page when a list request has no limit")
+    list_max_limit: int = Field(1000, description="Largest limit a list request may ask for")
+    provisioning_max_items: int = Field(1000, description="Max items in one /batch provisioning request")
+    export_batch_size: int = Field(1000, description="Rows fetched from the server-side cursor and encoded per chunk in /exports")
+    response_cache_enabled: bool = Field(True, description="ETag / 304 and cached bodies for the polled dashboard GETs")
+    response_cache_max_entries: int = Field(5000, description="Cached response bodies kept in the LRU")
+    response_cache_max_bytes: int = Field(64 * 1024 * 1024, description="Total bytes of cached response bodies")
+    response_cache_version_ttl_seconds: float = Field(2.0, description="How long a view's version is reused before re-querying; bounds staleness after another process's write")
+
+    # Per-request SQL instrumentation
+    sql_instrumentation: bool = Field(True, description="Count queries and DB time per request; log them and add a Server-Timing header")
+    sql_server_timing_header: bool = Field(True, description="Send the per-request DB time and query count in Server-Timing")
+    sql_repeat_threshold: int = Field(10, description="Warn (possible N+1) when one statement shape runs more than this many times in a request")
     
     # MQTT
     MQTT_BROKER: str = "localhost"
@@ -35,8 +57,54 @@ class Settings(BaseSettings):
     # Environment
     ENVIRONMENT: str = "development"
     DEBUG: bool = True
+    LOG_LEVEL: str = "INFO"
     
     offline_threshold_minutes: int = Field(10, description="Minutes after which a device is considered offline")
+    heartbeat_offline_factor: float = Field(2.5, description="A device that announces its max heartbeat interval is offline after this many intervals without a status")
+    heartbeat_max_interval_seconds: int = Field(3600, description="Cap on the heartbeat interval a device may announce")
+    offline_sweep_interval_seconds: int = Field(60, description="How often the worker marks stale devices offline")
+
+    # MQTT status worker
+    status_flush_interval_seconds: float = Field(1.0, description="Max seconds a status update waits in the ingest buffer before being written")
+    status_flush_batch_size: int = Field(500, description="Flush early once this many distinct devices have pending status updates")
+    status_queue_maxsize: int = Field(10000, description="Max queued status messages; further messages are dropped until the flusher catches up")
+    worker_stats_interval_seconds: int = Field(60, description="How often the worker logs its ingestion counters")
+    device_registry_refresh_seconds: float = Field(15.0, description="How often the worker polls devices.updated_at for registry changes")
+    device_registry_negative_ttl_seconds: float = Field(300.0, description="How long an unknown device_uid is rejected without re-checking the DB")
+    device_registry_negative_max: int = Field(10000, description="Max unknown device_uids remembered in the negative cache")
+    mqtt_worker_mode: str = Field("threaded", description="MQTT worker loop: 'threaded' (paho loop_forever) or 'asyncio'")
+    async_status_concurrency: int = Field(4, description="Concurrent status handlers in asyncio mode")
+    async_telemetry_concurrency: int = Field(2, description="Concurrent logs/events handlers in asyncio mode")
+    async_commands_concurrency: int = Field(1, description="Concurrent commands handlers in asyncio mode")
+    async_handler_queue_size: int = Field(1000, description="Per-topic queue size in asyncio mode; when full, batch, logs and events wait for room and other topics are dropped")
+    mqtt_shared_group: str = Field("", description="If set, subscribe via $share/<group>/... so the broker splits messages across worker replicas")
+    worker_partition_count: int = Field(1, description="Number of farm-hash partitions; each replica only processes its own partition")
+    worker_partition_index: int = Field(0, description="This replica's partition, 0 <= index < worker_partition_count")
+    schedule_sync_queue_maxsize: int = Field(10000, description="Max devices with a pending schedule sync request; further requests are dropped (agents retry)")
+    payload_compact_enabled: bool = Field(True, description="Advertise the compact binary payload format to agents (retained on server/payload_formats); JSON is always accepted")
+
+    # Device telemetry (status/logs/events history)
+    telemetry_store_status: bool = Field(True, description="Record every status heartbeat in device_telemetry, not just logs and events")
+    telemetry_flush_interval_seconds: float = Field(1.0, description="Max seconds a telemetry row waits before being inserted")
+    telemetry_batch_size: int = Field(1000, description="Rows per telemetry INSERT batch")
+    telemetry_queue_maxsize: int = Field(50000, description="Max buffered telemetry rows; further rows are dropped until the flusher catches up")
+    telemetry_raw_retention_days: int = Field(14, description="Days of raw telemetry kept (whole daily partitions are dropped)")
+    telemetry_rollup_retention_days: int = Field(365, description="Days of hourly telemetry rollups kept")
+    telemetry_partitions_ahead_days: int = Field(3, description="Daily telemetry partitions created ahead of time")
+    telemetry_maintenance_interval_seconds: int = Field(900, description="How often partitions, rollups and retention are maintained")
+
+    # Exclusive schedule conflict detection
+    schedule_index_horizon_days: int = Field(14, description="How far ahead schedule windows are expanded when checking exclusive schedules for overlap")
+    schedule_index_max_windows: int = Field(20160, description="Max windows expanded per schedule (20160 covers a per-minute cron over 14 days)")
+    exclusivity_cache_ttl_seconds: float = Field(5.0, description="How long a farm's exclusive schedules are cached between schedule writes")
+
+    # Schedule executor
+    schedule_timezone: str = Field("UTC", description="IANA timezone cron expressions are evaluated in, by the executor, the schedule API and device agents")
+    schedule_executor_refresh_seconds: float = Field(10.0, description="How often the executor polls updated_at for schedule, mapping and device changes")
+    schedule_executor_misfire_grace_seconds: float = Field(60.0, description="Starts later than this (e.g. after downtime) are skipped instead of fired")
+    watering_log_flush_interval_seconds: float = Field(1.0, description="Max seconds a watering log write waits before being flushed")
+    watering_log_batch_size: int = Field(1000, description="Watering log rows per INSERT/UPDATE batch")
+    schedule_version_notify: bool = Field(True, description="Publish each device's schedule version (retained) when its schedules change, so agents sync only when behind")
     
     class Config:
         env_file = ".env"
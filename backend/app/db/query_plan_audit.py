@@ -0,0 +1,98 @@
+"""Record the SQL an engine runs and EXPLAIN it to find full table scans.
+
+Attach a QueryPlanAuditor to an engine, drive the code under audit, then call
+findings(): every distinct filtered SELECT/UPDATE/DELETE seen is explained once,
+with the parameters of its first run, and each table it reads end to end is
+reported. Statements without a WHERE clause are skipped, since those read the
+whole table by design. A scan that walks the table in primary-key order under
+`ORDER BY <table>.id LIMIT` (a keyset list page) stops after the page and is
+marked bounded rather than counted as a problem.
+
+On MySQL a full scan is an EXPLAIN row with type=ALL; the optimizer prefers
+those on tiny tables, so audit MySQL against realistically sized data. On
+SQLite it is a plain "SCAN <table>" step in EXPLAIN QUERY PLAN.
+"""
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import event
+
+_AUDITED_VERBS = ("SELECT", "UPDATE", "DELETE")
+_WHERE = re.compile(r"\bWHERE\b", re.IGNORECASE)
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)$")
+_ALIAS_SUFFIX = re.compile(r"_\d+$")  # SQLAlchemy's anonymous aliases: farms_1
+_KEYSET_PAGE = re.compile(r"ORDER BY\s+(\w+)\.id\s+LIMIT", re.IGNORECASE)
+
+
+@dataclass
+class PlanFinding:
+    table: str
+    statement: str
+    detail: str
+    executions: int
+    bounded: bool = False  # Primary-key order scan under LIMIT
+
+    def __str__(self) -> str:
+        statement = " ".join(self.statement.split())
+        kind = "bounded scan" if self.bounded else "full scan"
+        return f"{kind} of {self.table} ({self.executions}x): {self.detail}\n    {statement}"
+
+
+class QueryPlanAuditor:
+    def __init__(self, engine, ignore_tables: Iterable[str] = ()):
+        self.engine = engine
+        self.ignore_tables = set(ignore_tables)
+        self.statements: Dict[str, Tuple[object, int]] = {}  # statement -> (first parameters, executions)
+
+    def attach(self):
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def detach(self):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+    def __enter__(self):
+        return self.attach()
+
+    def __exit__(self, *exc):
+        self.detach()
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().upper().startswith(_AUDITED_VERBS):
+            return
+        if not _WHERE.search(statement):
+            return
+        params, executions = self.statements.get(statement, (parameters, 0))
+        self.statements[statement] = (params, executions + 1)
+
+    def findings(self) -> List[PlanFinding]:
+        """EXPLAIN every recorded statement (once) and return the full scans."""
+        found = []
+        with self.engine.connect() as conn:
+            explain = _explain_mysql if conn.dialect.name == "mysql" else _explain_sqlite
+            for statement, (params, executions) in list(self.statements.items()):
+                page = _KEYSET_PAGE.search(statement)
+                for table, detail, sorted_after in explain(conn, statement, params):
+                    if _ALIAS_SUFFIX.sub("", table) in self.ignore_tables:
+                        continue
+                    bounded = page is not None and page.group(1) == table and not sorted_after
+                    found.append(PlanFinding(table, statement, detail, executions, bounded))
+        return found
+
+
+def _explain_sqlite(conn, statement, params):
+    """(table, detail, whether the rows are sorted afterwards) per full scan."""
+    details = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", params)]
+    sorted_after = any("TEMP B-TREE FOR ORDER BY" in detail for detail in details)
+    for detail in details:
+        match = _SQLITE_SCAN.match(detail)
+        if match:
+            yield match.group(1), detail, sorted_after
+
+
+def _explain_mysql(conn, statement, params):
+    for row in conn.exec_driver_sql(f"EXPLAIN {statement}", params).mappings():
+        if row["type"] == "ALL":
+            detail = f"type=ALL rows={row['rows']} possible_keys={row['possible_keys']}"
+            yield row["table"], detail, "filesort" in (row["Extra"] or "")
@@ -0,0 +1,159 @@
+"""Per-request SQL instrumentation: query count, DB time and repeated statements.
+
+instrument_engine() hooks before/after_cursor_execute on an engine. Statements
+run while a request is in flight are charged to that request's
+RequestQueryStats, found through a context variable that
+QueryStatsMiddleware sets per request (sync handlers run in the threadpool with
+a copy of the context, so they see it too). When the response starts, the
+middleware adds a Server-Timing header. When the request ends, it logs one
+JSON line and warns about any statement shape run more than
+sql_repeat_threshold times, which is the usual sign of an N+1 loop.
+
+Tests can collect the stats of every request made inside capture_query_stats()
+and assert query budgets on them.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+_current: ContextVar[Optional["RequestQueryStats"]] = ContextVar("request_query_stats", default=None)
+_listeners: List[Callable[["RequestQueryStats"], None]] = []
+_listeners_lock = threading.Lock()
+
+_WHITESPACE = re.compile(r"\s+")
+# Expanded IN lists: (?, ?, ?) / (%s, %s) / (%(p_1)s, ...) -> (...)
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*\)")
+
+
+def statement_shape(statement: str) -> str:
+    """The statement with whitespace and expanded IN lists normalised, so repeats group together."""
+    return _PLACEHOLDER_LIST.sub("(...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+@dataclass
+class RequestQueryStats:
+    method: str
+    path: str
+    status: Optional[int] = None
+    queries: int = 0
+    db_ms: float = 0.0
+    shapes: Counter = field(default_factory=Counter)
+
+    def record(self, statement: str, elapsed_ms: float):
+        self.queries += 1
+        self.db_ms += elapsed_ms
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        """Statement shapes run more than threshold times."""
+        return {shape: count for shape, count in self.shapes.items() if count > threshold}
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"'
+
+    def as_dict(self, repeat_threshold: int) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "queries": self.queries,
+            "db_ms": round(self.db_ms, 1),
+            "distinct_statements": len(self.shapes),
+            "repeated": self.repeated(repeat_threshold),
+        }
+
+
+def current_query_stats() -> Optional[RequestQueryStats]:
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_stats_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_stats_started"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, (time.perf_counter() - started) * 1000)
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute doesn't run for a failed statement; drop its start time
+    started = exception_context.connection.info.get("query_stats_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine):
+    """Charge the engine's statements to the current request (pass async_engine.sync_engine for async engines)."""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+@contextmanager
+def capture_query_stats() -> Iterator[List[RequestQueryStats]]:
+    """Collect the stats of every request that finishes inside the block, in order."""
+    captured: List[RequestQueryStats] = []
+    with _listeners_lock:
+        _listeners.append(captured.append)
+    try:
+        yield captured
+    finally:
+        with _listeners_lock:
+            _listeners.remove(captured.append)
+
+
+class QueryStatsMiddleware:
+    """ASGI middleware that scopes query stats to each HTTP request."""
+
+    def __init__(self, app, repeat_threshold: int = 10, server_timing: bool = True):
+        self.app = app
+        self.repeat_threshold = repeat_threshold
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestQueryStats(scope["method"], scope["path"])
+        token = _current.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                stats.status = message["status"]
+                # Streamed bodies keep querying after this; the log line has the final numbers
+                if self.server_timing:
+                    MutableHeaders(scope=message).append("Server-Timing", stats.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self.finish(stats)
+
+    def finish(self, stats: RequestQueryStats):
+        if stats.queries:
+            logger.info(json.dumps(stats.as_dict(self.repeat_threshold)))
+        for shape, count in stats.repeated(self.repeat_threshold).items():
+            logger.warning(f"Possible N+1 in {stats.method} {stats.path}: statement ran {count} times: {shape[:300]}")
+        with _listeners_lock:
+            listeners = list(_listeners)
+        for listener in listeners:
+            listener(stats)
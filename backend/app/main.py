@@ -1,7 +1,13 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import user_router, tenant_router, farm_router, section_router, device_router, peripheral_router, schedule_router
+from app.api import user_router, tenant_router, farm_router, section_router, device_router, peripheral_router, schedule_router, telemetry_router, export_router, async_list_router
 from app.core.config import settings
+from app.db.query_stats import QueryStatsMiddleware, instrument_engine
+from app.db.session import SessionLocal, engine
+from app.services.response_cache_service import track_writes
+import logging
+
+logging.basicConfig(level=settings.LOG_LEVEL)
 
 app = FastAPI(title="Farm Automation Platform")
 
@@ -12,8 +18,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link", "Server-Timing", "ETag"],
 )
 
+# Commits through the API's sessions invalidate the cached list versions they touch
+if settings.response_cache_enabled:
+    track_writes(SessionLocal)
+
+if settings.sql_instrumentation:
+    instrument_engine(engine)
+    if settings.api_db_mode == "async":
+        from app.db.async_session import async_engine
+
+        instrument_engine(async_engine.sync_engine)
+    app.add_middleware(
+        QueryStatsMiddleware,
+        repeat_threshold=settings.sql_repeat_threshold,
+        server_timing=settings.sql_server_timing_header,
+    )
+
+# Registered first so the async list handlers take over those paths from the sync routers
+if settings.api_db_mode == "async":
+    app.include_router(async_list_router, prefix="/api/v1")
 app.include_router(user_router, prefix="/api/v1")
 app.include_router(tenant_router, prefix="/api/v1")
 app.include_router(farm_router, prefix="/api/v1")
@@ -21,6 +47,8 @@ app.include_router(section_router, prefix="/api/v1")
 app.include_router(device_router, prefix="/api/v1")
 app.include_router(peripheral_router, prefix="/api/v1")
 app.include_router(schedule_router, prefix="/api/v1")
+app.include_router(telemetry_router, prefix="/api/v1")
+app.include_router(export_router, prefix="/api/v1")
 
 @app.get("/")
 def read_root():
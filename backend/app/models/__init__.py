@@ -2,8 +2,9 @@ from .tenant import Tenant
 from .user import User
 from .farm import Farm
 from .section import Section
-from .device import Device
+from .device import Device, DeviceGpioPin
 from .schedule import Schedule
 from .watering_log import WateringLog
 from .device_status import DeviceStatus
+from .telemetry import DeviceTelemetry, DeviceTelemetryHourly, DeviceTelemetryLateHour
 from .peripheral import PeripheralType, PeripheralMapping 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.sql import func
 from app.db.base import Base
 
@@ -6,11 +6,30 @@ class Device(Base):
     __tablename__ = "devices"
     id = Column(Integer, primary_key=True, index=True)
     farm_id = Column(Integer, ForeignKey("farms.id"), nullable=False)
-    device_uid = Column(String(100), nullable=False)
+    device_uid = Column(String(100), nullable=False, index=True)
     status = Column(String(50), default="offline")
     firmware_version = Column(String(50))
     last_seen = Column(DateTime)
+    # last_seen plus a multiple of the heartbeat interval the agent announced; NULL: the global offline threshold applies
+    offline_after = Column(DateTime, nullable=True)
     created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), index=True)
     is_deleted = Column(Boolean, default=False, nullable=False)  # type: ignore
-    available_gpio_pins = Column(String(255), nullable=True)  # Comma-separated pins 
\ No newline at end of file
+    available_gpio_pins = Column(String(255), nullable=True)  # Comma-separated pins, mirrored in device_gpio_pins
+
+    __table_args__ = (
+        # Serves the offline sweeper: is_deleted = 0 AND last_seen < :cutoff AND status <> 'offline'
+        Index("ix_devices_offline_sweep", "is_deleted", "last_seen", "status"),
+        # ... and its per-device branch: is_deleted = 0 AND offline_after < :now AND status <> 'offline'
+        Index("ix_devices_offline_after", "is_deleted", "offline_after", "status"),
+        # The farm's device: lists, exports and the one-device-per-farm check
+        Index("ix_devices_farm_deleted", "farm_id", "is_deleted"),
+    )
+
+# One row per pin a device exposes, kept in sync with Device.available_gpio_pins
+# (app.services.gpio_pin_service). Lets availability be an indexed anti-join
+# against the active peripheral mappings instead of parsing the string.
+class DeviceGpioPin(Base):
+    __tablename__ = "device_gpio_pins"
+    device_id = Column(Integer, ForeignKey("devices.id"), primary_key=True)
+    gpio_pin = Column(Integer, primary_key=True, autoincrement=False)
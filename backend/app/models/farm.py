@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Float
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Float, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.db.base import Base
@@ -21,4 +21,9 @@ class Farm(Base):
     tenant = relationship("Tenant", back_populates="farms")
     
     # Relationship to Sections
-    sections = relationship("Section", back_populates="farm") 
\ No newline at end of file
+    sections = relationship("Section", back_populates="farm")
+
+    __table_args__ = (
+        # Tenant-scoped farm lists and access checks: tenant_id = ? AND deleted = 0
+        Index("ix_farms_tenant_deleted", "tenant_id", "deleted"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime, Computed, Index
 from sqlalchemy.sql import func
 from app.db.base import Base
 
@@ -19,4 +19,15 @@ class PeripheralMapping(Base):
     gpio_pin = Column(Integer, nullable=False)
     is_deleted = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now()) 
\ No newline at end of file
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), index=True)
+    # gpio_pin while the mapping is active, NULL once deleted. MySQL has no partial
+    # indexes, so the unique index below on (device_id, active_gpio_pin) stands in for
+    # UNIQUE (device_id, gpio_pin) WHERE NOT is_deleted: NULLs never collide.
+    active_gpio_pin = Column(Integer, Computed("CASE WHEN is_deleted = 0 THEN gpio_pin END"))
+
+    __table_args__ = (
+        Index("ux_peripheral_mappings_device_active_pin", "device_id", "active_gpio_pin", unique=True),
+        # Mappings of a section or a farm, and the one-per-type checks
+        Index("ix_peripheral_mappings_section_deleted", "section_id", "is_deleted"),
+        Index("ix_peripheral_mappings_farm_deleted", "farm_id", "is_deleted"),
+    )
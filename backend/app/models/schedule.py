@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from app.db.base import Base
 
@@ -10,4 +10,9 @@ class Schedule(Base):
     duration_minutes = Column(Integer, nullable=False)
     is_deleted = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now()) 
\ No newline at end of file
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), index=True)
+
+    __table_args__ = (
+        # Schedules of a mapping, exclusivity contexts and cascade deletes
+        Index("ix_schedules_mapping_deleted", "peripheral_mapping_id", "is_deleted"),
+    )
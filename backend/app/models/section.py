@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Boolean, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.db.base import Base
@@ -19,4 +19,9 @@ class Section(Base):
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
     # Relationship to Farm
-    farm = relationship("Farm", back_populates="sections") 
\ No newline at end of file
+    farm = relationship("Farm", back_populates="sections")
+
+    __table_args__ = (
+        # Sections of a farm, its cascade delete and the section_code duplicate check
+        Index("ix_sections_farm_deleted", "farm_id", "is_deleted"),
+    )
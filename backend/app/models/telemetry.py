@@ -0,0 +1,46 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Text, Index
+from app.db.base import Base
+
+# Append-only device history for the status, logs and events MQTT topics.
+# On MySQL the table is RANGE-partitioned by day on ts (see migration 4d2f8a1c6e70),
+# which requires ts in the primary key and rules out foreign keys.
+class DeviceTelemetry(Base):
+    __tablename__ = "device_telemetry"
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    device_id = Column(Integer, nullable=False)
+    farm_id = Column(Integer, nullable=False)
+    kind = Column(String(20), nullable=False)  # status, log, event
+    code = Column(String(50))  # status for 'status', level for 'log', event type for 'event'
+    message = Column(String(1000))
+    data = Column(Text)  # Remaining payload fields as JSON
+    ts = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_device_telemetry_device_ts", "device_id", "ts"),
+        Index("ix_device_telemetry_farm_ts", "farm_id", "ts"),
+        Index("ix_device_telemetry_ts", "ts"),  # hourly rollups
+    )
+
+# Hourly downsample of device_telemetry, kept much longer than the raw rows.
+class DeviceTelemetryHourly(Base):
+    __tablename__ = "device_telemetry_hourly"
+    id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(Integer, nullable=False)
+    farm_id = Column(Integer, nullable=False)
+    kind = Column(String(20), nullable=False)
+    code = Column(String(50))
+    hour = Column(DateTime, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    first_ts = Column(DateTime, nullable=False)
+    last_ts = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_device_telemetry_hourly_device_hour", "device_id", "hour"),
+        Index("ix_device_telemetry_hourly_farm_hour", "farm_id", "hour"),
+    )
+
+# Past hours that received raw rows after their rollup may already have run
+# (late heartbeats, agents uploading a backlog); telemetry maintenance re-rolls them.
+class DeviceTelemetryLateHour(Base):
+    __tablename__ = "device_telemetry_late_hours"
+    hour = Column(DateTime, primary_key=True)
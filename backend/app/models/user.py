@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.db.base import Base
@@ -19,4 +19,9 @@ class User(Base):
     deleted = Column(Boolean, nullable=False, default=False)
     
     # Relationship to Tenant
-    tenant = relationship("Tenant", back_populates="users") 
\ No newline at end of file
+    tenant = relationship("Tenant", back_populates="users")
+
+    __table_args__ = (
+        # Tenant admins' user lists: tenant_id = ? AND deleted = 0 (username lookups use the unique index)
+        Index("ix_users_tenant_deleted", "tenant_id", "deleted"),
+    )
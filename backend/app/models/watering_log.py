@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index
 from sqlalchemy.sql import func
 from app.db.base import Base
 
@@ -7,10 +7,15 @@ class WateringLog(Base):
     id = Column(Integer, primary_key=True, index=True)
     schedule_id = Column(Integer, ForeignKey("schedules.id"), nullable=False)
     device_id = Column(Integer, ForeignKey("devices.id"), nullable=False)
-    section_id = Column(Integer, ForeignKey("sections.id"), nullable=False)
+    section_id = Column(Integer, ForeignKey("sections.id"), nullable=True)  # NULL for farm-level peripherals
     start_time = Column(DateTime, nullable=False)
     end_time = Column(DateTime)
     actual_water_amount = Column(Float)
     status = Column(String(50))
     error_message = Column(String(255))
-    created_at = Column(DateTime, server_default=func.now()) 
\ No newline at end of file
+    created_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        # The schedule executor closes runs by (schedule_id, start_time)
+        Index("ix_watering_logs_schedule_start", "schedule_id", "start_time"),
+    )
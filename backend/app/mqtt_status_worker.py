@@ -1,5 +1,6 @@
 import os
 import json
+import asyncio
 import re
 import time
 from datetime import datetime
@@ -9,6 +10,16 @@ from sqlalchemy.orm import sessionmaker
 from app.models.device import Device
 from app.db.base import Base
 from app.core.config import settings
+from app.services.status_ingest_service import StatusIngestBuffer, normalize_status
+from app.services.device_registry_service import DeviceRegistry
+from app.services.offline_sweeper_service import offline_deadline, sweep_offline_devices
+from app.services.topic_router import TopicRouter, AsyncTopicDispatcher
+from app.services.worker_cluster_service import LeaderLock, shared_topic, owns_farm, farm_id_from_topic
+from app.services.telemetry_service import TelemetryBuffer, run_telemetry_maintenance
+from app.services.payload_codec import (
+    COMPACT_FORMAT, FORMATS_TOPIC, JSON_FORMAT, decode_batch, decode_message, parse_timestamp,
+)
+from app.services.schedule_sync_service import SYNC_TOPIC, ScheduleSyncResponder
 import threading
 
 # MQTT config
@@ -20,28 +31,87 @@ TOPICS = [
     ('farm/+/device/+/logs', 0),
     ('farm/+/device/+/events', 0),
     ('farm/+/device/+/commands', 0),
+    ('farm/+/device/+/batch', 1),
+    (SYNC_TOPIC, 1),
 ]
 
 # Database config
-DB_URL = f"mysql+pymysql://{settings.MYSQL_USER}:{settings.MYSQL_PASSWORD}@{settings.MYSQL_HOST}:{settings.MYSQL_PORT}/{settings.MYSQL_DB}"
+DB_URL = settings.DATABASE_URL or f"mysql+pymysql://{settings.MYSQL_USER}:{settings.MYSQL_PASSWORD}@{settings.MYSQL_HOST}:{settings.MYSQL_PORT}/{settings.MYSQL_DB}"
 engine = create_engine(DB_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Status updates are coalesced per device and written in batches by a background flusher
+status_buffer = StatusIngestBuffer(
+    engine,
+    flush_interval=settings.status_flush_interval_seconds,
+    batch_size=settings.status_flush_batch_size,
+    maxsize=settings.status_queue_maxsize,
+)
+
+# Known devices are resolved in memory; unknown UIDs hit the DB at most once per negative TTL
+device_registry = DeviceRegistry(
+    engine,
+    negative_ttl=settings.device_registry_negative_ttl_seconds,
+    negative_max=settings.device_registry_negative_max,
+)
+
+# Append-only device history for status, logs and events, bulk-inserted in batches
+telemetry_buffer = TelemetryBuffer(
+    engine,
+    flush_interval=settings.telemetry_flush_interval_seconds,
+    batch_size=settings.telemetry_batch_size,
+    maxsize=settings.telemetry_queue_maxsize,
+)
+
+# Agents' schedule sync requests, answered off the MQTT loop
+schedule_sync = ScheduleSyncResponder(engine, device_registry, maxsize=settings.schedule_sync_queue_maxsize)
+
+# Only the replica holding this lock runs the offline sweeper
+sweeper_lock = LeaderLock(engine, "farm_automation.offline_sweeper")
+telemetry_maintenance_lock = LeaderLock(engine, "farm_automation.telemetry_maintenance")
+
+def advertised_formats():
+    """Retained payload for FORMATS_TOPIC: the encodings agents may send (JSON is always decoded)."""
+    formats = [JSON_FORMAT, COMPACT_FORMAT] if settings.payload_compact_enabled else [JSON_FORMAT]
+    return json.dumps({"formats": formats})
+
+def owns_topic(topic):
+    """True if this replica's farm partition covers the topic (always true when unpartitioned)."""
+    farm_id = farm_id_from_topic(topic)
+    return farm_id is not None and owns_farm(farm_id, settings.worker_partition_index, settings.worker_partition_count)
+
 # Regex to extract topic info
 STATUS_REGEX = re.compile(r'farm/([^/]+)/device/([^/]+)/status')
 LOGS_REGEX = re.compile(r'farm/([^/]+)/device/([^/]+)/logs')
 EVENTS_REGEX = re.compile(r'farm/([^/]+)/device/([^/]+)/events')
 COMMANDS_REGEX = re.compile(r'farm/([^/]+)/device/([^/]+)/commands')
+SCHEDULE_SYNC_REGEX = re.compile(r'farm/([^/]+)/device/([^/]+)/schedules/sync$')
+BATCH_REGEX = re.compile(r'farm/([^/]+)/device/([^/]+)/batch$')
+
+# Length of device_telemetry.code
+TELEMETRY_CODE_MAX_LENGTH = 50
+
+# Store-and-forward record type -> (telemetry kind, field stored as code)
+BATCH_RECORD_KINDS = {'status': ('status', 'status'), 'log': ('log', 'level'), 'event': ('event', 'event')}
 
 def on_connect(client, userdata, flags, rc):
     print(f"[WORKER] Connected to MQTT broker with result code {rc}")
     for topic, qos in TOPICS:
+        topic = shared_topic(topic, settings.mqtt_shared_group)
         client.subscribe((topic, qos))
         print(f"[WORKER] Subscribed to topic: {topic}")
+    client.publish(FORMATS_TOPIC, advertised_formats(), qos=1, retain=True)
 
 def on_message(client, userdata, msg):
     topic = msg.topic
-    payload = msg.payload.decode()
+    if not owns_topic(topic):
+        return
+    batch = BATCH_REGEX.match(topic)
+    if batch:
+        ingest_batch(*batch.groups(), msg.payload)
+        return
+    # Raw bytes: compact payloads aren't text, and json.loads takes bytes
+    payload = msg.payload
     if STATUS_REGEX.match(topic):
         handle_status(topic, payload)
     elif LOGS_REGEX.match(topic):
@@ -50,6 +120,8 @@ def on_message(client, userdata, msg):
         handle_events(topic, payload)
     elif COMMANDS_REGEX.match(topic):
         handle_commands(topic, payload)
+    elif SCHEDULE_SYNC_REGEX.match(topic):
+        handle_schedule_sync(topic, payload)
     # else:  # Only log if you want to track unknown topics
     #     print("Unknown topic pattern.")
 
@@ -59,44 +131,151 @@ def handle_status(topic, payload):
         print(f"[WORKER][WARN] Status topic does not match expected pattern: {topic}")
         return
     farm_id, device_id = match.groups()
+    ingest_status(farm_id, device_id, payload)
+
+def device_offline_after(data, last_seen):
+    """Offline deadline for a status that announces the agent's max heartbeat interval, else None."""
+    return offline_deadline(
+        last_seen, data.get('heartbeat_interval'),
+        settings.heartbeat_offline_factor, settings.heartbeat_max_interval_seconds,
+    )
+
+def extra_fields(data, known):
+    extra = {key: value for key, value in data.items() if key not in known}
+    return json.dumps(extra) if extra else None
+
+def code_and_extra_fields(data, code_field, known):
+    """A record's code (status, level or event) and its extra fields.
+
+    A code that isn't a string fitting device_telemetry.code would fail the
+    whole batch insert, so it is stored with the extra fields instead.
+    """
+    code = data.get(code_field)
+    if isinstance(code, str) and len(code) <= TELEMETRY_CODE_MAX_LENGTH:
+        return code, extra_fields(data, known + (code_field,))
+    return None, extra_fields(data, known)
+
+def ingest_status(farm_id, device_id, payload):
     try:
-        data = json.loads(payload)
-        status = data.get('status', 'online')
-        timestamp = data.get('timestamp')
-        if timestamp:
-            last_seen = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-        else:
-            last_seen = datetime.utcnow()
+        data = decode_message(payload)
+        status = normalize_status(data.get('status', 'online'))
+        last_seen = parse_timestamp(data.get('timestamp'))
+        offline_after = device_offline_after(data, last_seen) if status != 'offline' else None
     except Exception as e:
         print(f"[WORKER][ERROR] Error parsing status payload: {e} | payload: {payload}")
         return
-    db = SessionLocal()
+    if status is None:
+        print(f"[WORKER][WARN] Ignoring unknown status from device {device_id} | payload: {payload}")
+        return
+    device = device_registry.lookup(device_id)
+    if device is None:
+        print(f"[WORKER][WARN] Device with device_uid {device_id} not found in DB. (farm: {farm_id})")
+        return
+    device_registry.record_status(device, status, last_seen)
+    if not status_buffer.submit(device.id, status, last_seen, offline_after):
+        print(f"[WORKER][WARN] Status queue full, dropping status for device {device_id}")
+    if settings.telemetry_store_status:
+        telemetry_buffer.append(device.id, device.farm_id, 'status', last_seen, code=status,
+                                data=extra_fields(data, ('type', 'status', 'timestamp', 'heartbeat_interval')))
+
+def ingest_telemetry(kind, code_field, farm_id, device_id, payload):
+    """Record a logs/events message. Payloads that are neither JSON nor compact are stored as the message text."""
     try:
-        device = db.query(Device).filter(Device.device_uid == device_id, Device.is_deleted == False).first()
-        if device:
-            device.status = status
-            setattr(device, 'last_seen', last_seen)
-            db.commit()
-            print(f"[WORKER] Updated device {device_id} status to {status} at {last_seen}")
-        else:
-            print(f"[WORKER][WARN] Device with device_uid {device_id} not found in DB. (topic: {topic})")
-    except Exception as e:
-        print(f"[WORKER][ERROR] DB error: {e}")
-        db.rollback()
-    finally:
-        db.close()
+        data = decode_message(payload)
+        if not isinstance(data, dict):
+            data = {'message': payload if isinstance(payload, str) else payload.decode(errors='replace')}
+        ts = parse_timestamp(data.get('timestamp'))
+    except Exception:
+        data = {'message': payload if isinstance(payload, str) else payload.decode(errors='replace')}
+        ts = datetime.utcnow()
+    device = device_registry.lookup(device_id)
+    if device is None:
+        return
+    message = data.get('message')
+    code, extra = code_and_extra_fields(data, code_field, ('type', 'message', 'timestamp'))
+    if not telemetry_buffer.append(
+        device.id, device.farm_id, kind, ts,
+        code=code,
+        message=str(message) if message is not None else None,
+        data=extra,
+    ):
+        print(f"[WORKER][WARN] Telemetry queue full, dropping {kind} for device {device_id}")
+
+def ingest_batch(farm_id, device_id, payload):
+    """Record a store-and-forward batch from an agent: status, logs and events records, oldest first.
+
+    Every record goes to the telemetry history in one go; only the newest
+    status updates the device row.
+    """
+    try:
+        records = decode_batch(payload)
+    except ValueError as e:
+        print(f"[WORKER][WARN] Dropping batch from device {device_id}: {e}")
+        return
+    device = device_registry.lookup(device_id)
+    if device is None:
+        print(f"[WORKER][WARN] Device with device_uid {device_id} not found in DB. (farm: {farm_id})")
+        return
+    rows = []
+    latest_status = None
+    skipped, skip_reason = 0, None
+    for data in records:
+        kind_and_code = BATCH_RECORD_KINDS.get(data.pop('type', None))
+        if kind_and_code is None:
+            continue
+        kind, code_field = kind_and_code
+        try:
+            ts = parse_timestamp(data.get('timestamp'))
+        except Exception as e:
+            skipped += 1
+            skip_reason = e
+            continue
+        if kind == 'status':
+            status = normalize_status(data.get('status', 'online'))
+            if status is None:
+                skipped += 1
+                skip_reason = f"unknown status {data.get('status')!r}"
+                continue
+            data['status'] = status
+            if latest_status is None or ts >= latest_status[1]:
+                offline_after = device_offline_after(data, ts) if status != 'offline' else None
+                latest_status = (status, ts, offline_after)
+            if not settings.telemetry_store_status:
+                continue
+        message = data.get('message')
+        code, extra = code_and_extra_fields(data, code_field, ('message', 'timestamp', 'heartbeat_interval'))
+        rows.append({
+            "device_id": device.id,
+            "farm_id": device.farm_id,
+            "kind": kind,
+            "code": code,
+            "message": str(message) if message is not None else None,
+            "data": extra,
+            "ts": ts,
+        })
+    if skipped:
+        print(f"[WORKER][WARN] Skipped {skipped} unreadable records in batch from device {device_id}: {skip_reason}")
+    if latest_status is not None:
+        device_registry.record_status(device, *latest_status[:2])
+        if not status_buffer.submit(device.id, *latest_status):
+            print(f"[WORKER][WARN] Status queue full, dropping status for device {device_id}")
+    dropped = telemetry_buffer.extend(rows)
+    if dropped:
+        print(f"[WORKER][WARN] Telemetry queue full, dropped {dropped} of {len(rows)} batch rows from device {device_id}")
 
 def handle_logs(topic, payload):
     match = LOGS_REGEX.match(topic)
     if not match:
         return
-    # Optionally store logs in DB
+    farm_id, device_id = match.groups()
+    ingest_telemetry('log', 'level', farm_id, device_id, payload)
 
 def handle_events(topic, payload):
     match = EVENTS_REGEX.match(topic)
     if not match:
         return
-    # Optionally store events in DB
+    farm_id, device_id = match.groups()
+    ingest_telemetry('event', 'event', farm_id, device_id, payload)
 
 def handle_commands(topic, payload):
     match = COMMANDS_REGEX.match(topic)
@@ -104,34 +283,189 @@ def handle_commands(topic, payload):
         return
     # Optionally log command delivery/ack
 
+def handle_schedule_sync(topic, payload):
+    match = SCHEDULE_SYNC_REGEX.match(topic)
+    if not match:
+        return
+    farm_id, device_id = match.groups()
+    if not schedule_sync.submit(farm_id, device_id, payload):
+        print(f"[WORKER][WARN] Dropping schedule sync request from device {device_id}")
+
+# Asyncio worker mode: one trie lookup per message, then a per-topic queue and worker pool
+router = TopicRouter()
+dispatcher = AsyncTopicDispatcher(router)
+
+@router.route("status", "farm/+/device/+/status", concurrency=settings.async_status_concurrency, queue_size=settings.async_handler_queue_size)
+async def async_handle_status(params, payload):
+    farm_id, device_id = params
+    # Registry misses fall back to the DB, so keep them off the event loop
+    await asyncio.to_thread(ingest_status, farm_id, device_id, payload)
+
+@router.route("logs", "farm/+/device/+/logs", concurrency=settings.async_telemetry_concurrency, queue_size=settings.async_handler_queue_size, durable=True)
+async def async_handle_logs(params, payload):
+    farm_id, device_id = params
+    await asyncio.to_thread(ingest_telemetry, 'log', 'level', farm_id, device_id, payload)
+
+@router.route("events", "farm/+/device/+/events", concurrency=settings.async_telemetry_concurrency, queue_size=settings.async_handler_queue_size, durable=True)
+async def async_handle_events(params, payload):
+    farm_id, device_id = params
+    await asyncio.to_thread(ingest_telemetry, 'event', 'event', farm_id, device_id, payload)
+
+@router.route("commands", "farm/+/device/+/commands", concurrency=settings.async_commands_concurrency, queue_size=settings.async_handler_queue_size)
+async def async_handle_commands(params, payload):
+    pass  # Optionally log command delivery/ack
+
+@router.route("batch", "farm/+/device/+/batch", concurrency=settings.async_telemetry_concurrency, queue_size=settings.async_handler_queue_size, durable=True)
+async def async_handle_batch(params, payload):
+    farm_id, device_id = params
+    await asyncio.to_thread(ingest_batch, farm_id, device_id, payload)
+
+@router.route("schedule_sync", SYNC_TOPIC, concurrency=1, queue_size=settings.async_handler_queue_size)
+async def async_handle_schedule_sync(params, payload):
+    farm_id, device_id = params
+    # Queued for the responder thread, which publishes the reply through the loop
+    if not schedule_sync.submit(farm_id, device_id, payload):
+        print(f"[WORKER][WARN] Dropping schedule sync request from device {device_id}")
+
+async def async_main():
+    import aiomqtt
+    dispatcher.start()
+    while True:
+        try:
+            print(f"[WORKER] Connecting to MQTT broker at {MQTT_BROKER}:{MQTT_PORT} (asyncio mode)...")
+            async with aiomqtt.Client(MQTT_BROKER, MQTT_PORT, keepalive=60) as client:
+                print(f"[WORKER] Connected to MQTT broker at {MQTT_BROKER}:{MQTT_PORT}")
+                loop = asyncio.get_running_loop()
+                schedule_sync.attach(lambda topic, payload: asyncio.run_coroutine_threadsafe(
+                    client.publish(topic, payload, qos=1), loop).result(timeout=10))
+                for topic, qos in TOPICS:
+                    topic = shared_topic(topic, settings.mqtt_shared_group)
+                    await client.subscribe(topic, qos)
+                    print(f"[WORKER] Subscribed to topic: {topic}")
+                await client.publish(FORMATS_TOPIC, advertised_formats(), qos=1, retain=True)
+                async for message in client.messages:
+                    if owns_topic(message.topic.value):
+                        await dispatcher.dispatch(message.topic.value, message.payload)
+        except aiomqtt.MqttError as e:
+            print(f"[WORKER][ERROR] MQTT connection lost: {e}. Reconnecting in 5 seconds...")
+            await asyncio.sleep(5)
+
 def check_and_update_offline_devices():
+    was_leader = False
     while True:
-        db = SessionLocal()
+        is_leader = sweeper_lock.acquire()
+        if is_leader != was_leader:
+            print(f"[WORKER] Offline sweeper leadership {'acquired' if is_leader else 'lost'}")
+            was_leader = is_leader
+        if not is_leader:
+            time.sleep(settings.offline_sweep_interval_seconds)
+            continue
         try:
-            now = datetime.utcnow()
-            threshold_minutes = settings.offline_threshold_minutes
-            devices = db.query(Device).filter(Device.is_deleted == False).all()
-            for device in devices:
-                last_seen = getattr(device, 'last_seen', None)
-                if last_seen is not None:
-                    minutes_since_seen = (now - last_seen).total_seconds() / 60
-                    if minutes_since_seen > threshold_minutes and getattr(device, 'status', None) != 'offline':
-                        print(f"[WORKER] Device {getattr(device, 'device_uid', None)} last seen {minutes_since_seen:.1f} min ago. Marking as offline.")
-                        setattr(device, 'status', 'offline')
-                        db.commit()
+            transitioned = sweep_offline_devices(engine, settings.offline_threshold_minutes)
+            if transitioned:
+                device_registry.mark_offline([device.device_uid for device in transitioned])
+                for device in transitioned:
+                    print(f"[WORKER] Device {device.device_uid} last seen at {device.last_seen}. Marked as offline.")
         except Exception as e:
             print(f"[WORKER][ERROR] Offline check failed: {e}")
-            db.rollback()
-        finally:
-            db.close()
-        time.sleep(60)  # check every minute
+        time.sleep(settings.offline_sweep_interval_seconds)
+
+def maintain_telemetry():
+    while True:
+        if telemetry_maintenance_lock.acquire():
+            try:
+                run_telemetry_maintenance(
+                    engine,
+                    days_ahead=settings.telemetry_partitions_ahead_days,
+                    raw_retention_days=settings.telemetry_raw_retention_days,
+                    rollup_retention_days=settings.telemetry_rollup_retention_days,
+                )
+            except Exception as e:
+                print(f"[WORKER][ERROR] Telemetry maintenance failed: {e}")
+        time.sleep(settings.telemetry_maintenance_interval_seconds)
+
+def log_worker_stats():
+    while True:
+        time.sleep(settings.worker_stats_interval_seconds)
+        stats = status_buffer.stats()
+        registry = device_registry.stats()
+        telemetry = telemetry_buffer.stats()
+        print(
+            f"[WORKER][STATS] msgs={stats['messages_received']} ({stats['messages_per_sec']:.1f}/s) "
+            f"dropped={stats['messages_dropped']} queue={stats['queue_depth']} "
+            f"flushes={stats['flushes']} rows={stats['rows_written']} "
+            f"flush_ms(last/avg)={stats['last_flush_ms']:.1f}/{stats['avg_flush_ms']:.1f} "
+            f"coalescing={stats['coalescing_ratio']:.2f}"
+        )
+        print(
+            f"[WORKER][STATS] registry devices={registry['devices']} hit_rate={registry['hit_rate']:.3f} "
+            f"hits={registry['hits']} misses={registry['misses']} negative_hits={registry['negative_hits']} "
+            f"db_lookups={registry['db_lookups']} negative_cached={registry['negative_cached']}"
+        )
+        print(
+            f"[WORKER][STATS] telemetry rows={telemetry['rows_received']} written={telemetry['rows_written']} "
+            f"dropped={telemetry['rows_dropped']} late={telemetry['late_rows']} queue={telemetry['queue_depth']} "
+            f"avg_flush_ms={telemetry['avg_flush_ms']:.1f} errors={telemetry['flush_errors']}"
+        )
+        sync = schedule_sync.stats()
+        print(
+            f"[WORKER][STATS] schedule_sync requests={sync['requests_received']} coalesced={sync['requests_coalesced']} "
+            f"dropped={sync['requests_dropped']} replies={sync['replies_sent']} full={sync['full_syncs']} "
+            f"rows={sync['rows_sent']} errors={sync['errors']} pending={sync['pending']}"
+        )
+        if settings.mqtt_worker_mode == "asyncio":
+            for name, route in dispatcher.stats().items():
+                print(
+                    f"[WORKER][STATS] route={name} received={route['received']} handled={route['handled']} "
+                    f"dropped={route['dropped']} waits={route['waits']} errors={route['errors']} queue={route['queue_depth']}"
+                )
+
+def start_background_tasks():
+    device_registry.load()
+    threading.Thread(
+        target=device_registry.run_refresh_loop,
+        args=(settings.device_registry_refresh_seconds,),
+        daemon=True,
+    ).start()
+    status_buffer.start()
+    telemetry_buffer.start()
+    schedule_sync.start()
+    threading.Thread(target=check_and_update_offline_devices, daemon=True).start()
+    threading.Thread(target=maintain_telemetry, daemon=True).start()
+    threading.Thread(target=log_worker_stats, daemon=True).start()
+
+def stop_background_tasks():
+    device_registry.stop()
+    status_buffer.stop(timeout=10)
+    telemetry_buffer.stop(timeout=10)
+    schedule_sync.stop(timeout=10)
+    sweeper_lock.release()
+    telemetry_maintenance_lock.release()
 
 def main():
     print(f"[WORKER] Starting MQTT status worker...")
     print(f"[WORKER] MQTT broker: {MQTT_BROKER}:{MQTT_PORT}")
+    if settings.mqtt_shared_group and settings.worker_partition_count > 1:
+        # The broker would hand a message to one replica, which may then drop it as not its partition
+        print(f"[WORKER][ERROR] MQTT_SHARED_GROUP and WORKER_PARTITION_COUNT > 1 are mutually exclusive")
+        return
+    if settings.mqtt_shared_group:
+        print(f"[WORKER] Shared subscription group: {settings.mqtt_shared_group}")
+    if settings.worker_partition_count > 1:
+        print(f"[WORKER] Farm partition {settings.worker_partition_index} of {settings.worker_partition_count}")
+    if settings.mqtt_worker_mode == "asyncio":
+        start_background_tasks()
+        try:
+            asyncio.run(async_main())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop_background_tasks()
+        return
     client = mqtt.Client()
     client.on_connect = on_connect
     client.on_message = on_message
+    schedule_sync.attach(lambda topic, payload: client.publish(topic, payload, qos=1))
     try:
         print(f"[WORKER] Connecting to MQTT broker at {MQTT_BROKER}:{MQTT_PORT}...")
         client.connect(MQTT_BROKER, MQTT_PORT, 60)
@@ -139,8 +473,11 @@ def main():
     except Exception as e:
         print(f"[WORKER][ERROR] Failed to connect to MQTT broker at {MQTT_BROKER}:{MQTT_PORT}: {e}")
         return
-    threading.Thread(target=check_and_update_offline_devices, daemon=True).start()
-    client.loop_forever()
+    start_background_tasks()
+    try:
+        client.loop_forever()
+    finally:
+        stop_background_tasks()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
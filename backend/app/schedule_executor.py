@@ -0,0 +1,92 @@
+import threading
+import time
+import paho.mqtt.client as mqtt
+from sqlalchemy import create_engine
+from app.core.config import settings
+from app.services.schedule_executor_service import ScheduleExecutor, WateringLogWriter
+from app.services.schedule_sync_service import ScheduleVersionNotifier
+from app.services.worker_cluster_service import LeaderLock
+
+# MQTT config
+MQTT_BROKER = settings.MQTT_BROKER
+MQTT_PORT = settings.MQTT_PORT
+
+# Database config
+DB_URL = settings.DATABASE_URL or f"mysql+pymysql://{settings.MYSQL_USER}:{settings.MYSQL_PASSWORD}@{settings.MYSQL_HOST}:{settings.MYSQL_PORT}/{settings.MYSQL_DB}"
+engine = create_engine(DB_URL)
+
+client = mqtt.Client()
+
+def publish(topic, payload):
+    result = client.publish(topic, payload, qos=1)
+    if result.rc != mqtt.MQTT_ERR_SUCCESS:
+        raise RuntimeError(f"publish to {topic} failed with rc={result.rc}")
+
+def publish_retained(topic, payload):
+    result = client.publish(topic, payload, qos=1, retain=True)
+    if result.rc != mqtt.MQTT_ERR_SUCCESS:
+        raise RuntimeError(f"publish to {topic} failed with rc={result.rc}")
+
+log_writer = WateringLogWriter(
+    engine,
+    flush_interval=settings.watering_log_flush_interval_seconds,
+    batch_size=settings.watering_log_batch_size,
+)
+
+# Agents run their schedules from a local copy; tell them when theirs changed
+version_notifier = ScheduleVersionNotifier(engine, publish_retained)
+
+executor = ScheduleExecutor(
+    engine,
+    publish,
+    log_writer,
+    refresh_interval=settings.schedule_executor_refresh_seconds,
+    misfire_grace_seconds=settings.schedule_executor_misfire_grace_seconds,
+    on_change=version_notifier.notify if settings.schedule_version_notify else None,
+)
+
+# Only the replica holding this lock fires schedules; the others stand by
+executor_lock = LeaderLock(engine, "farm_automation.schedule_executor")
+
+def on_connect(client, userdata, flags, rc):
+    print(f"[EXECUTOR] Connected to MQTT broker with result code {rc}")
+
+def log_executor_stats():
+    while True:
+        time.sleep(settings.worker_stats_interval_seconds)
+        stats = executor.stats()
+        logs = log_writer.stats()
+        print(
+            f"[EXECUTOR][STATS] schedules={stats['schedules']} starts={stats['starts_fired']} stops={stats['stops_fired']} "
+            f"misfires={stats['misfires']} publish_errors={stats['publish_errors']} max_lag_ms={stats['max_lag_ms']:.1f}"
+        )
+        print(
+            f"[EXECUTOR][STATS] watering_logs inserted={logs['rows_inserted']} updated={logs['rows_updated']} "
+            f"dropped={logs['rows_dropped']} queue={logs['queue_depth']} errors={logs['flush_errors']}"
+        )
+
+def main():
+    print(f"[EXECUTOR] Starting schedule executor...")
+    print(f"[EXECUTOR] MQTT broker: {MQTT_BROKER}:{MQTT_PORT}")
+    client.on_connect = on_connect
+    try:
+        client.connect(MQTT_BROKER, MQTT_PORT, 60)
+    except Exception as e:
+        print(f"[EXECUTOR][ERROR] Failed to connect to MQTT broker at {MQTT_BROKER}:{MQTT_PORT}: {e}")
+        return
+    # paho reconnects on its own network thread; publishes queue up meanwhile
+    client.loop_start()
+    log_writer.start()
+    threading.Thread(target=log_executor_stats, daemon=True).start()
+    try:
+        executor.run(is_leader=executor_lock.acquire)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.stop()
+        log_writer.stop(timeout=10)
+        executor_lock.release()
+        client.loop_stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class BatchItemResult(BaseModel):
+    index: int  # Position in the request's items
+    ok: bool
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class BatchResult(BaseModel):
+    created: int
+    failed: int
+    results: List[BatchItemResult]
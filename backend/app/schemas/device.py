@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from datetime import datetime
 
 class DeviceCreate(BaseModel):
@@ -22,4 +22,7 @@ class DeviceOut(BaseModel):
     is_deleted: bool
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+class DeviceBatchCreate(BaseModel):
+    items: List[DeviceCreate] = Field(..., min_length=1)
+    atomic: bool = False  # If any item fails, insert none
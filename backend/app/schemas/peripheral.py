@@ -0,0 +1,13 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+class PeripheralMappingCreate(BaseModel):
+    device_id: int
+    peripheral_type_id: int
+    gpio_pin: int
+    section_id: Optional[int] = None  # Exactly one of section_id / farm_id
+    farm_id: Optional[int] = None
+
+class PeripheralMappingBatchCreate(BaseModel):
+    items: List[PeripheralMappingCreate] = Field(..., min_length=1)
+    atomic: bool = False  # If any item fails, insert none
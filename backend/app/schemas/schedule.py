@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
 class ScheduleBase(BaseModel):
     cron_expression: str
@@ -17,4 +17,10 @@ class ScheduleOut(ScheduleBase):
     peripheral_mapping_id: int
     is_deleted: bool
     class Config:
-        orm_mode = True 
\ No newline at end of file
+        orm_mode = True 
+class ScheduleBatchItem(ScheduleBase):
+    peripheral_mapping_id: int
+
+class ScheduleBatchCreate(BaseModel):
+    items: List[ScheduleBatchItem] = Field(..., min_length=1)
+    atomic: bool = False  # If any item fails, insert none
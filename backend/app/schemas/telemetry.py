@@ -0,0 +1,29 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+class TelemetryOut(BaseModel):
+    id: int
+    device_id: int
+    farm_id: int
+    kind: str
+    code: Optional[str] = None
+    message: Optional[str] = None
+    data: Optional[str] = None
+    ts: datetime
+
+    class Config:
+        from_attributes = True
+
+class TelemetryHourlyOut(BaseModel):
+    device_id: int
+    farm_id: int
+    kind: str
+    code: Optional[str] = None
+    hour: datetime
+    message_count: int
+    first_ts: datetime
+    last_ts: datetime
+
+    class Config:
+        from_attributes = True
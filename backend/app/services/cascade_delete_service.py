@@ -0,0 +1,76 @@
+"""Set-based cascade soft-delete of a farm, section or peripheral mapping.
+
+Each level is one `UPDATE ... WHERE <parent> IN (subquery)`, deepest level
+first, so the cost is a fixed handful of statements however many mappings and
+schedules hang off the tree. Every flipped row gets a fresh updated_at so the
+schedule executor's updated_at poll drops the affected schedules. The caller
+owns the transaction and commits.
+"""
+import logging
+from dataclasses import asdict, dataclass
+
+from sqlalchemy import func, or_, select, update
+
+from app.models.farm import Farm
+from app.models.peripheral import PeripheralMapping
+from app.models.schedule import Schedule
+from app.models.section import Section
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CascadeDeleteResult:
+    """Rows flipped to deleted at each level (already-deleted rows aren't counted)."""
+    farms: int = 0
+    sections: int = 0
+    peripheral_mappings: int = 0
+    schedules: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _soft_delete(db, model, flag, *criteria) -> int:
+    stmt = (
+        update(model)
+        .where(flag == False, *criteria)
+        .values({flag: True, model.updated_at: func.now()})
+        .execution_options(synchronize_session=False)
+    )
+    return db.execute(stmt).rowcount
+
+
+def _soft_delete_schedules(db, mapping_ids) -> int:
+    return _soft_delete(db, Schedule, Schedule.is_deleted, Schedule.peripheral_mapping_id.in_(mapping_ids))
+
+
+def soft_delete_mapping(db, mapping_id: int) -> CascadeDeleteResult:
+    result = CascadeDeleteResult()
+    result.schedules = _soft_delete_schedules(db, [mapping_id])
+    result.peripheral_mappings = _soft_delete(db, PeripheralMapping, PeripheralMapping.is_deleted, PeripheralMapping.id == mapping_id)
+    return result
+
+
+def soft_delete_section(db, section_id: int) -> CascadeDeleteResult:
+    mapping_ids = select(PeripheralMapping.id).where(PeripheralMapping.section_id == section_id)
+    result = CascadeDeleteResult()
+    result.schedules = _soft_delete_schedules(db, mapping_ids)
+    result.peripheral_mappings = _soft_delete(db, PeripheralMapping, PeripheralMapping.is_deleted, PeripheralMapping.section_id == section_id)
+    result.sections = _soft_delete(db, Section, Section.is_deleted, Section.id == section_id)
+    logger.info(f"Soft-deleted section {section_id}: {result.as_dict()}")
+    return result
+
+
+def soft_delete_farm(db, farm_id: int) -> CascadeDeleteResult:
+    section_ids = select(Section.id).where(Section.farm_id == farm_id)
+    # Farm-level mappings carry farm_id; section-level ones hang off the farm's sections
+    in_farm = or_(PeripheralMapping.farm_id == farm_id, PeripheralMapping.section_id.in_(section_ids))
+    mapping_ids = select(PeripheralMapping.id).where(in_farm)
+    result = CascadeDeleteResult()
+    result.schedules = _soft_delete_schedules(db, mapping_ids)
+    result.peripheral_mappings = _soft_delete(db, PeripheralMapping, PeripheralMapping.is_deleted, in_farm)
+    result.sections = _soft_delete(db, Section, Section.is_deleted, Section.farm_id == farm_id)
+    result.farms = _soft_delete(db, Farm, Farm.deleted, Farm.id == farm_id)
+    logger.info(f"Soft-deleted farm {farm_id}: {result.as_dict()}")
+    return result
@@ -0,0 +1,243 @@
+"""Exact overlap test for (cron_expression, duration_minutes) schedules.
+
+A 5-field cron fires on every (day, minute-of-day) where the day matches the
+month/day-of-month/day-of-week fields and the minute-of-day matches the
+hour/minute fields. The two parts are independent, so a schedule is held as two
+bitsets: 1440 bits of minute-of-day and one bit per day of the 400-year
+Gregorian cycle (146097 days, a whole number of weeks, so every calendar
+pattern repeats with it and it is the LCM period of any two schedules).
+
+Two windows [a, a + da) and [b, b + db) overlap iff b - a lies in
+[1 - db, da - 1]. Writing b - a = 1440 * k + (mb - ma), the schedules can
+overlap iff for some day shift k both the day bitsets intersect after rotating
+one by k and the minute bitsets intersect after shifting/dilating one by the
+allowed offsets. Nothing is enumerated; each k is a handful of big-int ops.
+
+Syntax outside plain 5-field cron (L, W, #, seconds, years, hashed H, reversed
+ranges) raises UnsupportedCronExpression so callers can fall back to
+expanding occurrences.
+"""
+import calendar
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+MINUTES_PER_DAY = 1440
+CYCLE_DAYS = 146097  # 400 Gregorian years; date.toordinal() 1 is 0001-01-01, a Monday
+FULL_DAYS = (1 << CYCLE_DAYS) - 1
+
+MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+MONTH_NAMES = {name.lower(): i for i, name in enumerate(calendar.month_abbr) if name}
+DOW_NAMES = {"sun": 0, "mon": 1, "tue": 2, "wed": 3, "thu": 4, "fri": 5, "sat": 6}
+
+# (min, max, names) for minute, hour, day-of-month, month, day-of-week
+FIELDS = (
+    (0, 59, {}),
+    (0, 23, {}),
+    (1, 31, {}),
+    (1, 12, MONTH_NAMES),
+    (0, 7, DOW_NAMES),  # 7 is Sunday too
+)
+
+ITEM_RE = re.compile(r"^(\*|[0-9a-z]+)(?:-([0-9a-z]+))?(?:/([0-9]+))?$")
+
+
+class UnsupportedCronExpression(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class CronSet:
+    minutes: int  # Bit m set if the cron fires at minute-of-day m
+    days: int  # Bit d set if the cron fires on cycle day d (ordinal - 1) % CYCLE_DAYS
+
+
+def _value(token: str, names: Dict[str, int]) -> int:
+    if token.isdigit():
+        return int(token)
+    if token in names:
+        return names[token]
+    raise UnsupportedCronExpression(f"Unsupported cron token '{token}'")
+
+
+def _parse_field(expr: str, index: int) -> Tuple[List[int], bool]:
+    """Values matched by one field, and whether it was written as a bare * or ?."""
+    low, high, names = FIELDS[index]
+    if expr in ("*", "?"):
+        return list(range(low, min(high, 6) + 1 if index == 4 else high + 1)), True
+    values = set()
+    for item in expr.lower().split(","):
+        match = ITEM_RE.match(item)
+        if not match:
+            raise UnsupportedCronExpression(f"Unsupported cron field '{expr}'")
+        start_token, end_token, step_token = match.groups()
+        step = int(step_token) if step_token else 1
+        if start_token == "*":
+            if end_token:
+                raise UnsupportedCronExpression(f"Unsupported cron field '{expr}'")
+            start, end = low, high
+        else:
+            start = _value(start_token, names)
+            # "a/n" means a through the field max
+            end = _value(end_token, names) if end_token else (high if step_token else start)
+        if step < 1 or start < low or end > high or start > end:
+            raise UnsupportedCronExpression(f"Unsupported cron field '{expr}'")
+        values.update(range(start, end + 1, step))
+    if index == 4 and 7 in values:
+        values.discard(7)
+        values.add(0)
+    return sorted(values), False
+
+
+@lru_cache(maxsize=1)
+def _calendar_masks() -> Tuple[List[int], List[int], List[int]]:
+    """Per-month (1-12), per-day-of-month (1-31) and per-weekday (0=Sun) day bitsets over one cycle."""
+    months = [bytearray(CYCLE_DAYS // 8 + 1) for _ in range(13)]
+    doms = [bytearray(CYCLE_DAYS // 8 + 1) for _ in range(32)]
+    dows = [bytearray(CYCLE_DAYS // 8 + 1) for _ in range(7)]
+    day = 0
+    for year in range(1, 401):
+        for month in range(1, 13):
+            for dom in range(1, calendar.monthrange(year, month)[1] + 1):
+                byte, bit = day >> 3, 1 << (day & 7)
+                months[month][byte] |= bit
+                doms[dom][byte] |= bit
+                dows[(day + 1) % 7][byte] |= bit
+                day += 1
+    as_int = lambda masks: [int.from_bytes(mask, "little") for mask in masks]
+    return as_int(months), as_int(doms), as_int(dows)
+
+
+@lru_cache(maxsize=4096)
+def parse_cron(cron_expression: str) -> CronSet:
+    expr = MACROS.get(cron_expression.strip().lower(), cron_expression)
+    fields = expr.split()
+    if len(fields) != 5:
+        raise UnsupportedCronExpression(f"Expected 5 cron fields, got '{cron_expression}'")
+    (minutes, _), (hours, _), (doms, dom_star), (months, _), (dows, dow_star) = (
+        _parse_field(field, index) for index, field in enumerate(fields)
+    )
+    minute_bits = 0
+    for hour in hours:
+        for minute in minutes:
+            minute_bits |= 1 << (hour * 60 + minute)
+    # Like croniter (and vixie cron), a field listing every value counts as *
+    # unless the other day field has no * in it
+    dom_star = dom_star or (len(doms) == 31 and "*" in fields[4])
+    dow_star = dow_star or (len(dows) == 7 and "*" in fields[2])
+    month_masks, dom_masks, dow_masks = _calendar_masks()
+    month_bits = 0
+    for month in months:
+        month_bits |= month_masks[month]
+    dom_bits = 0
+    for dom in doms:
+        dom_bits |= dom_masks[dom]
+    dow_bits = 0
+    for dow in dows:
+        dow_bits |= dow_masks[dow]
+    if dom_star or dow_star:
+        day_bits = month_bits & dom_bits & dow_bits
+    else:
+        day_bits = month_bits & (dom_bits | dow_bits)
+    return CronSet(minute_bits, day_bits)
+
+
+def _shift(bits: int, offset: int) -> int:
+    return bits << offset if offset >= 0 else bits >> -offset
+
+
+def _dilate(bits: int, width: int) -> int:
+    """bits | bits << 1 | ... | bits << width, in O(log width) operations."""
+    span = 1
+    while span <= width:
+        step = min(span, width + 1 - span)
+        bits |= bits << step
+        span += step
+    return bits
+
+
+def _rotate_days(bits: int, k: int) -> int:
+    """Bit d of the result is bit (d + k) mod CYCLE_DAYS of bits."""
+    k %= CYCLE_DAYS
+    if k == 0:
+        return bits
+    return ((bits >> k) | (bits << (CYCLE_DAYS - k))) & FULL_DAYS
+
+
+def _next_bit(bits: int, position: int) -> int:
+    """Lowest set bit at or after position (bits must be non-zero), wrapping past the cycle end."""
+    rest = bits >> position
+    if rest:
+        return position + (rest & -rest).bit_length() - 1
+    return CYCLE_DAYS + (bits & -bits).bit_length() - 1
+
+
+def _candidates(a: CronSet, duration_a: int, b: CronSet, duration_b: int):
+    """Yield (k, minutes_a, days_a): day shifts k where an a-window starting at a minute in
+    minutes_a on a day in days_a overlaps a b-window starting k days later."""
+    if duration_a <= 0 or duration_b <= 0 or not (a.minutes and a.days and b.minutes and b.days):
+        return
+    low, high = 1 - duration_b, duration_a - 1  # Allowed b_start - a_start
+    first_k = -((MINUTES_PER_DAY - 1 - low) // MINUTES_PER_DAY)
+    last_k = (high + MINUTES_PER_DAY - 1) // MINUTES_PER_DAY
+    for k in range(first_k, last_k + 1):
+        # a minute ma has a partner iff some mb in b.minutes has mb + 1440k - ma in [low, high]
+        offset = MINUTES_PER_DAY * k - high
+        minutes_a = a.minutes & _shift(_dilate(b.minutes, high - low), offset)
+        if not minutes_a:
+            continue
+        days_a = a.days & _rotate_days(b.days, k)
+        if days_a:
+            yield k, minutes_a, days_a
+
+
+def windows_can_overlap(cron_a: str, duration_a: int, cron_b: str, duration_b: int) -> bool:
+    """True if some window of schedule a ever overlaps some window of schedule b."""
+    for _ in _candidates(parse_cron(cron_a), duration_a, parse_cron(cron_b), duration_b):
+        return True
+    return False
+
+
+def first_overlap(cron_a: str, duration_a: int, cron_b: str, duration_b: int,
+                  after: datetime) -> Optional[Tuple[Tuple[datetime, datetime], Tuple[datetime, datetime]]]:
+    """((a_start, a_end), (b_start, b_end)) for the earliest a-window starting at or after
+    `after` that overlaps a b-window, or None if the schedules can never overlap."""
+    a, b = parse_cron(cron_a), parse_cron(cron_b)
+    after = after.replace(second=0, microsecond=0) + (timedelta(minutes=1) if after.second or after.microsecond else timedelta())
+    today = after.toordinal() - 1
+    cycle_today = today % CYCLE_DAYS
+    after_minute = after.hour * 60 + after.minute
+    best = None
+    for k, minutes_a, days_a in _candidates(a, duration_a, b, duration_b):
+        later_today = minutes_a >> after_minute
+        if later_today and (days_a >> cycle_today) & 1:
+            day, minute_a = today, after_minute + (later_today & -later_today).bit_length() - 1
+        else:
+            day = today + _next_bit(days_a, cycle_today + 1) - cycle_today
+            minute_a = (minutes_a & -minutes_a).bit_length() - 1
+        start = day * MINUTES_PER_DAY + minute_a
+        if best is None or start < best[0]:
+            best = (start, day, minute_a, k)
+    if best is None:
+        return None
+    _, day, minute_a, k = best
+    low, high = 1 - duration_b, duration_a - 1
+    # Earliest b start on day + k whose window overlaps
+    offset = minute_a - MINUTES_PER_DAY * k
+    first_mb = max(0, offset + low)
+    partners = (b.minutes >> first_mb) & ((1 << (offset + high - first_mb + 1)) - 1)
+    minute_b = first_mb + (partners & -partners).bit_length() - 1
+    a_start = datetime.combine(date.fromordinal(day + 1), datetime.min.time()) + timedelta(minutes=minute_a)
+    b_start = datetime.combine(date.fromordinal(day + k + 1), datetime.min.time()) + timedelta(minutes=minute_b)
+    return (a_start, a_start + timedelta(minutes=duration_a)), (b_start, b_start + timedelta(minutes=duration_b))
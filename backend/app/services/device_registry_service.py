@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+
+from app.models.device import Device
+
+
+@dataclass
+class DeviceEntry:
+    id: int
+    farm_id: int
+    device_uid: str
+    status: Optional[str]
+    last_seen: Optional[datetime]
+
+
+class DeviceRegistry:
+    """Warm in-process map of device_uid -> DeviceEntry for the MQTT worker.
+
+    Loaded in bulk at startup and refreshed incrementally by polling
+    devices.updated_at. Unknown UIDs are remembered in a bounded negative cache
+    so a misbehaving agent costs at most one DB lookup per negative_ttl.
+    """
+
+    # Re-read rows updated within this window of the watermark, since
+    # DATETIME columns only have second precision.
+    REFRESH_OVERLAP = timedelta(seconds=2)
+
+    def __init__(self, engine, negative_ttl: float = 300.0, negative_max: int = 10000):
+        self.engine = engine
+        self.negative_ttl = negative_ttl
+        self.negative_max = negative_max
+        self._by_uid: Dict[str, DeviceEntry] = {}
+        self._uid_by_id: Dict[int, str] = {}
+        self._negative: "OrderedDict[str, float]" = OrderedDict()
+        self._watermark: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.db_lookups = 0
+        self.refreshes = 0
+
+    def _columns(self):
+        devices = Device.__table__
+        return select(
+            devices.c.id,
+            devices.c.farm_id,
+            devices.c.device_uid,
+            devices.c.status,
+            devices.c.last_seen,
+            devices.c.updated_at,
+            devices.c.is_deleted,
+        )
+
+    def _apply(self, row):
+        """Upsert or evict a single device row. Caller holds the lock."""
+        if row.updated_at is not None and (self._watermark is None or row.updated_at > self._watermark):
+            self._watermark = row.updated_at
+        old_uid = self._uid_by_id.get(row.id)
+        if old_uid is not None and (row.is_deleted or old_uid != row.device_uid):
+            self._uid_by_id.pop(row.id, None)
+            if self._by_uid.get(old_uid) is not None and self._by_uid[old_uid].id == row.id:
+                del self._by_uid[old_uid]
+        if row.is_deleted:
+            return
+        existing = self._by_uid.get(row.device_uid)
+        # device_uid is not unique; like the old .first() lookup, keep a single device per uid
+        if existing is not None and existing.id < row.id:
+            return
+        self._by_uid[row.device_uid] = DeviceEntry(row.id, row.farm_id, row.device_uid, row.status, row.last_seen)
+        self._uid_by_id[row.id] = row.device_uid
+        self._negative.pop(row.device_uid, None)
+
+    def load(self):
+        """Bulk load every non-deleted device."""
+        stmt = self._columns().where(Device.__table__.c.is_deleted == False).order_by(Device.__table__.c.id)
+        with self.engine.connect() as conn:
+            rows = conn.execute(stmt).all()
+        with self._lock:
+            self._by_uid.clear()
+            self._uid_by_id.clear()
+            self._negative.clear()
+            self._watermark = None
+            for row in rows:
+                self._apply(row)
+        print(f"[WORKER] Device registry loaded {len(self._by_uid)} devices")
+
+    def refresh(self):
+        """Pull devices created, edited or deleted since the last watermark."""
+        devices = Device.__table__
+        stmt = self._columns().order_by(devices.c.id)
+        if self._watermark is not None:
+            stmt = stmt.where(devices.c.updated_at >= self._watermark - self.REFRESH_OVERLAP)
+        with self.engine.connect() as conn:
+            rows = conn.execute(stmt).all()
+        with self._lock:
+            for row in rows:
+                self._apply(row)
+            self.refreshes += 1
+
+    def run_refresh_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[WORKER][ERROR] Device registry refresh failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+    def lookup(self, device_uid: str) -> Optional[DeviceEntry]:
+        """Resolve a device_uid, falling back to the DB at most once per negative_ttl for unknown UIDs."""
+        with self._lock:
+            entry = self._by_uid.get(device_uid)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            expires_at = self._negative.get(device_uid)
+            if expires_at is not None:
+                if expires_at > time.monotonic():
+                    self.negative_hits += 1
+                    return None
+                del self._negative[device_uid]
+        devices = Device.__table__
+        stmt = (
+            self._columns()
+            .where(devices.c.device_uid == device_uid, devices.c.is_deleted == False)
+            .order_by(devices.c.id)
+            .limit(1)
+        )
+        with self.engine.connect() as conn:
+            row = conn.execute(stmt).first()
+        with self._lock:
+            self.db_lookups += 1
+            if row is None:
+                self._negative[device_uid] = time.monotonic() + self.negative_ttl
+                self._negative.move_to_end(device_uid)
+                while len(self._negative) > self.negative_max:
+                    self._negative.popitem(last=False)
+                return None
+            self._apply(row)
+            return self._by_uid.get(device_uid)
+
+    def record_status(self, entry: DeviceEntry, status: str, last_seen: datetime):
+        with self._lock:
+            entry.status = status
+            if entry.last_seen is None or last_seen >= entry.last_seen:
+                entry.last_seen = last_seen
+
+    def mark_offline(self, device_uids: List[str]):
+        with self._lock:
+            for device_uid in device_uids:
+                entry = self._by_uid.get(device_uid)
+                if entry is not None:
+                    entry.status = "offline"
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "devices": len(self._by_uid),
+                "negative_cached": len(self._negative),
+                "hits": self.hits,
+                "misses": self.misses,
+                "negative_hits": self.negative_hits,
+                "db_lookups": self.db_lookups,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "refreshes": self.refreshes,
+            }
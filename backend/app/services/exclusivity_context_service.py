@@ -0,0 +1,109 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, or_, select
+
+from app.core.config import settings
+from app.models.peripheral import PeripheralMapping, PeripheralType
+from app.models.schedule import Schedule
+from app.models.section import Section
+
+
+@dataclass(frozen=True)
+class ExclusiveSchedule:
+    id: int
+    peripheral_mapping_id: int
+    cron_expression: str
+    duration_minutes: int
+
+
+@dataclass(frozen=True)
+class FarmExclusivityContext:
+    farm_id: int
+    schedules: Tuple[ExclusiveSchedule, ...]
+
+
+def load_mapping_scope(db, mapping_id: int) -> Optional[Tuple[PeripheralMapping, bool, Optional[int]]]:
+    """(mapping, exclusive_schedule, farm_id) for an active mapping in one query; farm_id falls back to the section's farm."""
+    row = (
+        db.query(
+            PeripheralMapping,
+            PeripheralType.exclusive_schedule,
+            func.coalesce(PeripheralMapping.farm_id, Section.farm_id),
+        )
+        .join(PeripheralType, PeripheralType.id == PeripheralMapping.peripheral_type_id)
+        .outerjoin(Section, Section.id == PeripheralMapping.section_id)
+        .filter(PeripheralMapping.id == mapping_id, PeripheralMapping.is_deleted == False)
+        .first()
+    )
+    if row is None:
+        return None
+    mapping, exclusive, farm_id = row
+    return mapping, bool(exclusive), farm_id
+
+
+def query_exclusive_schedules(db, farm_id: int) -> List[ExclusiveSchedule]:
+    """Active schedules on active exclusive-type mappings attached to the farm or any of its sections."""
+    stmt = (
+        select(Schedule.id, Schedule.peripheral_mapping_id, Schedule.cron_expression, Schedule.duration_minutes)
+        .join(PeripheralMapping, PeripheralMapping.id == Schedule.peripheral_mapping_id)
+        .join(PeripheralType, PeripheralType.id == PeripheralMapping.peripheral_type_id)
+        .where(
+            Schedule.is_deleted == False,
+            PeripheralMapping.is_deleted == False,
+            PeripheralType.exclusive_schedule == True,
+            # Both branches on peripheral_mappings columns, so each can use its (farm_id|section_id, is_deleted) index
+            or_(
+                PeripheralMapping.farm_id == farm_id,
+                PeripheralMapping.section_id.in_(select(Section.id).where(Section.farm_id == farm_id)),
+            ),
+        )
+        .order_by(Schedule.id)
+    )
+    return [ExclusiveSchedule(*row) for row in db.execute(stmt)]
+
+
+class ExclusivityContextCache:
+    """Short-TTL per-farm cache of FarmExclusivityContext.
+
+    Writes in this process invalidate the farm explicitly; the TTL bounds how
+    long another API process can see a stale context.
+    """
+
+    def __init__(self, ttl_seconds: float = 5.0):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[int, Tuple[float, FarmExclusivityContext]] = {}
+        self._lock = threading.Lock()
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db, farm_id: int) -> FarmExclusivityContext:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(farm_id)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        context = FarmExclusivityContext(farm_id, tuple(query_exclusive_schedules(db, farm_id)))
+        with self._lock:
+            self._entries[farm_id] = (now + self.ttl_seconds, context)
+        return context
+
+    def invalidate(self, farm_id: Optional[int] = None):
+        with self._lock:
+            if farm_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(farm_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"farms": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Shared by the schedule and peripheral endpoints so mapping writes can invalidate it too
+exclusivity_contexts = ExclusivityContextCache(ttl_seconds=settings.exclusivity_cache_ttl_seconds)
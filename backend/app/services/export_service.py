@@ -0,0 +1,83 @@
+"""Streamed NDJSON/CSV exports.
+
+Rows are read through a server-side cursor (stream_results + yield_per) on a
+session owned by the generator, encoded a batch at a time and optionally
+gzipped on the fly, so memory stays bounded by one batch regardless of how
+many rows the export covers.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from typing import Iterator, List, Optional
+
+from app.db.session import SessionLocal
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_ndjson(rows: List[dict]) -> str:
+    return "".join(json.dumps(dict(row), default=_json_default) + "\n" for row in rows)
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_csv(rows: List[dict], columns: List[str], header: bool) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_csv_value(row[c]) for c in columns])
+    return buffer.getvalue()
+
+
+def stream_export(stmt, export_format: str, compress: bool = False, batch_size: int = 1000,
+                  session_factory=SessionLocal) -> Iterator[bytes]:
+    """Yield the encoded (and optionally gzipped) rows of stmt, one batch at a time."""
+    columns = [c.name for c in stmt.selected_columns]
+    gzip = zlib.compressobj(wbits=31) if compress else None  # 31: gzip container
+    db = session_factory()
+    try:
+        result = db.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+        first = True
+        for partition in result.mappings().partitions():
+            if export_format == "csv":
+                chunk = encode_csv(partition, columns, header=first)
+            else:
+                chunk = encode_ndjson(partition)
+            first = False
+            data = chunk.encode()
+            if gzip is not None:
+                data = gzip.compress(data)
+            if data:
+                yield data
+        if first and export_format == "csv":
+            # No rows: still send the header
+            data = encode_csv([], columns, header=True).encode()
+            yield gzip.compress(data) if gzip is not None else data
+        if gzip is not None:
+            yield gzip.flush()
+    finally:
+        db.close()
+
+
+def export_filename(name: str, export_format: str, compress: bool, now: Optional[datetime] = None) -> str:
+    stamp = (now or datetime.utcnow()).strftime("%Y%m%dT%H%M%SZ")
+    return f"{name}-{stamp}.{export_format}" + (".gz" if compress else "")
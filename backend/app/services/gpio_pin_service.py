@@ -0,0 +1,92 @@
+"""Per-device GPIO pin inventory and race-free pin allocation.
+
+Device.available_gpio_pins stays the API representation; device_gpio_pins holds
+the same pins one row per pin and is rewritten whenever the string changes.
+Free pins are an anti-join of that table against the active mappings, and
+allocation relies on the unique (device_id, active_gpio_pin) index on
+peripheral_mappings rather than a read-then-insert check, so two concurrent
+attaches can't both take a pin.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, exists, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from app.models.device import DeviceGpioPin
+from app.models.peripheral import PeripheralMapping
+
+
+class PinInUseError(Exception):
+    """The pin already has an active mapping on the device."""
+
+
+def parse_pins(available_gpio_pins: Optional[str]) -> List[int]:
+    return sorted({int(pin.strip()) for pin in (available_gpio_pins or '').split(',') if pin.strip().isdigit()})
+
+
+def sync_device_pins(db, pins_by_device: Dict[int, Optional[str]]):
+    """Rewrite the inventory of each device from its available_gpio_pins string; the caller commits."""
+    if not pins_by_device:
+        return
+    db.execute(delete(DeviceGpioPin).where(DeviceGpioPin.device_id.in_(pins_by_device)))
+    rows = [
+        {"device_id": device_id, "gpio_pin": pin}
+        for device_id, pins in pins_by_device.items()
+        for pin in parse_pins(pins)
+    ]
+    if rows:
+        db.execute(insert(DeviceGpioPin), rows)
+
+
+def _pin_mapped():
+    return exists().where(
+        PeripheralMapping.device_id == DeviceGpioPin.device_id,
+        PeripheralMapping.active_gpio_pin == DeviceGpioPin.gpio_pin,
+    )
+
+
+def available_pins(db, device_id: int) -> List[int]:
+    """Pins on the device with no active mapping: one anti-join over two indexes."""
+    stmt = (
+        select(DeviceGpioPin.gpio_pin)
+        .where(DeviceGpioPin.device_id == device_id, ~_pin_mapped())
+        .order_by(DeviceGpioPin.gpio_pin)
+    )
+    return list(db.execute(stmt).scalars())
+
+
+def device_pin_inventory(db, device_ids: Iterable[int]) -> Dict[int, set]:
+    pins: Dict[int, set] = {device_id: set() for device_id in device_ids}
+    for device_id, pin in db.execute(
+        select(DeviceGpioPin.device_id, DeviceGpioPin.gpio_pin).where(DeviceGpioPin.device_id.in_(pins))
+    ):
+        pins[device_id].add(pin)
+    return pins
+
+
+def pin_on_device(db, device_id: int, gpio_pin: int) -> bool:
+    return db.get(DeviceGpioPin, (device_id, gpio_pin)) is not None
+
+
+def pin_in_use(db, device_id: int, gpio_pin: int) -> bool:
+    return db.execute(
+        select(PeripheralMapping.id).where(PeripheralMapping.device_id == device_id, PeripheralMapping.active_gpio_pin == gpio_pin)
+    ).first() is not None
+
+
+def allocate_mapping(db, **values) -> PeripheralMapping:
+    """Insert an active mapping, claiming its pin atomically.
+
+    The unique index decides who gets the pin; on a clash the session is
+    rolled back and PinInUseError raised. Any other integrity error propagates.
+    """
+    mapping = PeripheralMapping(**values)
+    db.add(mapping)
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        if pin_in_use(db, values["device_id"], values["gpio_pin"]):
+            raise PinInUseError("This GPIO pin is already in use on this device.")
+        raise
+    return mapping
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import and_, or_, select
+
+from app.models.device import Device
+from app.services.device_registry_service import DeviceEntry
+
+
+def offline_deadline(last_seen: datetime, heartbeat_interval, factor: float, max_interval: float) -> Optional[datetime]:
+    """When a device that announced heartbeat_interval (seconds) counts as offline; None if it announced none.
+
+    The interval is capped at max_interval so a device can't opt out of the sweep.
+    """
+    try:
+        interval = float(heartbeat_interval)
+    except (TypeError, ValueError):
+        return None
+    if not interval > 0:  # Also NaN
+        return None
+    return last_seen + timedelta(seconds=min(interval, max_interval) * factor)
+
+
+def sweep_offline_devices(engine, threshold_minutes: int, now: Optional[datetime] = None) -> List[DeviceEntry]:
+    """Mark every device past its offline deadline as offline.
+
+    A device's deadline is its offline_after, from the heartbeat interval its
+    agent announces; devices that announce none get last_seen plus
+    threshold_minutes. Runs a fixed two statements per sweep in one
+    transaction, regardless of fleet size: lock the stale rows (served by
+    ix_devices_offline_sweep and ix_devices_offline_after), then flip them
+    with a single set-based UPDATE. Returns the transitioned devices so
+    callers can alert on them without re-querying.
+    """
+    devices = Device.__table__
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(minutes=threshold_minutes)
+    stale = and_(
+        devices.c.is_deleted == False,
+        or_(
+            and_(devices.c.offline_after.is_(None), devices.c.last_seen < cutoff),
+            devices.c.offline_after < now,
+        ),
+        or_(devices.c.status != "offline", devices.c.status.is_(None)),
+    )
+    with engine.begin() as conn:
+        rows = conn.execute(
+            select(devices.c.id, devices.c.farm_id, devices.c.device_uid, devices.c.last_seen)
+            .where(stale)
+            .with_for_update()
+        ).all()
+        if not rows:
+            return []
+        conn.execute(
+            devices.update()
+            .where(stale, devices.c.id.in_([row.id for row in rows]))
+            # Like heartbeats, a status flip is not a metadata edit
+            .values(status="offline", updated_at=devices.c.updated_at)
+        )
+    return [DeviceEntry(row.id, row.farm_id, row.device_uid, "offline", row.last_seen) for row in rows]
@@ -0,0 +1,243 @@
+"""Compact binary encoding of device telemetry records, shared by the device agent and the status worker.
+
+This module only uses the standard library: build_deb.sh copies it into the
+agent package as-is.
+
+A compact record (format 1) is a fixed header, big-endian:
+
+    version:u8  type:u8  flags:u8  timestamp:u32  code:u8
+
+type is 1 status, 2 event, 3 log. timestamp is UTC epoch seconds (0: none).
+code is the record's status/event/level as 1 + its index in CODES (0: none,
+or a value outside CODES, which then travels in the extra fields). The flags
+say which optional parts follow, in this order:
+
+- FLAG_INTS: the type's INT_FIELDS as i32 each (NO_INT for a missing field)
+- FLAG_MESSAGE: message, u16 byte length then UTF-8
+- FLAG_EXTRA: every other field as compact JSON, to the end of the record
+
+A compact batch is the version byte followed by records, each prefixed with
+its u32 length, zlib-compressed like the JSON-lines batch it replaces.
+
+JSON stays the fallback: payloads are told apart by their first byte (a
+compact record starts with FORMAT_VERSION, JSON with "{", zlib with 0x78).
+The worker advertises the formats it decodes, retained, on FORMATS_TOPIC;
+an agent only switches to compact once it has seen it there.
+"""
+import json
+import struct
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional
+
+FORMAT_VERSION = 1
+JSON_FORMAT = "json"
+COMPACT_FORMAT = f"compact-v{FORMAT_VERSION}"
+FORMATS_TOPIC = "server/payload_formats"
+
+# Largest decompressed store-and-forward batch accepted from an agent
+MAX_BATCH_BYTES = 8 * 1024 * 1024
+
+TYPES = ("status", "event", "log")
+CODE_FIELDS = {"status": "status", "event": "event", "log": "level"}
+CODES = {
+    "status": ("online", "offline", "error"),
+    "event": ("watering_started", "watering_completed"),
+    "log": ("debug", "info", "warning", "error", "critical"),
+}
+INT_FIELDS = {"event": ("schedule_id", "peripheral_mapping_id", "gpio_pin")}
+
+FLAG_INTS = 1
+FLAG_MESSAGE = 2
+FLAG_EXTRA = 4
+
+NO_INT = -2 ** 31
+HEADER = struct.Struct("!BBBIB")
+MESSAGE_LENGTH = struct.Struct("!H")
+FRAME_LENGTH = struct.Struct("!I")
+_INT_STRUCTS = {record_type: struct.Struct(f"!{len(fields)}i") for record_type, fields in INT_FIELDS.items()}
+_CODE_INDEX = {record_type: {code: i + 1 for i, code in enumerate(codes)} for record_type, codes in CODES.items()}
+_VERSION_BYTE = bytes([FORMAT_VERSION])
+_EPOCH = datetime(1970, 1, 1)
+# Epoch seconds a naive datetime can hold (years 1 to 9999)
+MIN_EPOCH = int((datetime.min - _EPOCH).total_seconds())
+MAX_EPOCH = int((datetime.max - _EPOCH).total_seconds())
+
+
+def is_compact(payload: bytes) -> bool:
+    return payload[:1] == _VERSION_BYTE
+
+
+def to_epoch(timestamp) -> Optional[int]:
+    """UTC epoch seconds of an ISO string, datetime or number; None if it can't be read."""
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        return int(timestamp) if MIN_EPOCH <= timestamp <= MAX_EPOCH else None
+    try:
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        if isinstance(timestamp, datetime):
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+            return int((timestamp - _EPOCH).total_seconds())
+    except (ValueError, OverflowError):
+        pass
+    return None
+
+
+def parse_timestamp(timestamp) -> datetime:
+    """Naive UTC datetime of a record's timestamp (ISO string or epoch seconds); now if it has none.
+
+    Raises ValueError for anything else: another type, a string that isn't
+    ISO 8601, or an epoch outside what datetime can hold.
+    """
+    if timestamp is None or timestamp == "" or timestamp == 0:
+        return datetime.utcnow()
+    if isinstance(timestamp, bool) or not isinstance(timestamp, (int, float, str)):
+        raise ValueError(f"timestamp must be an ISO 8601 string or epoch seconds, got {type(timestamp).__name__}")
+    if not isinstance(timestamp, str):
+        # Also rejects NaN and infinities
+        if not MIN_EPOCH <= timestamp <= MAX_EPOCH:
+            raise ValueError(f"epoch timestamp out of range: {timestamp}")
+        return _EPOCH + timedelta(seconds=timestamp)
+    try:
+        parsed = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        if parsed.tzinfo is not None:
+            # Timestamps are stored as naive UTC, same as datetime.utcnow()
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    except OverflowError as e:
+        raise ValueError(f"timestamp out of range: {timestamp}") from e
+    return parsed
+
+
+def encode_record(record: dict) -> bytes:
+    """Compact form of a {"type", "timestamp", <code field>, ...} record. Raises ValueError for an unknown type."""
+    record_type = record.get("type")
+    if record_type not in CODE_FIELDS:
+        raise ValueError(f"unknown record type {record_type!r}")
+    extra = {key: value for key, value in record.items() if key != "type"}
+    flags = 0
+
+    epoch = to_epoch(extra.get("timestamp"))
+    if epoch is not None and 0 < epoch < 2 ** 32:
+        del extra["timestamp"]
+    else:
+        epoch = 0
+
+    code = _CODE_INDEX[record_type].get(extra.get(CODE_FIELDS[record_type]), 0)
+    if code:
+        del extra[CODE_FIELDS[record_type]]
+
+    parts = []
+    int_fields = INT_FIELDS.get(record_type)
+    if int_fields:
+        values = []
+        for field in int_fields:
+            value = extra.get(field)
+            if isinstance(value, int) and not isinstance(value, bool) and NO_INT < value < 2 ** 31:
+                values.append(value)
+                del extra[field]
+            else:
+                values.append(NO_INT)  # Missing, or sent as-is in the extra fields
+        if any(value != NO_INT for value in values):
+            flags |= FLAG_INTS
+            parts.append(_INT_STRUCTS[record_type].pack(*values))
+
+    message = extra.get("message")
+    if isinstance(message, str):
+        encoded = message.encode()
+        if len(encoded) < 2 ** 16:
+            flags |= FLAG_MESSAGE
+            parts.append(MESSAGE_LENGTH.pack(len(encoded)) + encoded)
+            del extra["message"]
+
+    if extra:
+        flags |= FLAG_EXTRA
+        parts.append(json.dumps(extra, separators=(",", ":")).encode())
+
+    return HEADER.pack(FORMAT_VERSION, TYPES.index(record_type) + 1, flags, epoch, code) + b"".join(parts)
+
+
+def decode_record(data: bytes) -> dict:
+    """The record a compact payload encodes, with its timestamp as epoch seconds. Raises ValueError if malformed."""
+    try:
+        version, type_index, flags, epoch, code = HEADER.unpack_from(data)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"unsupported payload format {version}")
+        record_type = TYPES[type_index - 1]
+        record = {"type": record_type}
+        if epoch:
+            record["timestamp"] = epoch
+        if code:
+            record[CODE_FIELDS[record_type]] = CODES[record_type][code - 1]
+        offset = HEADER.size
+        if flags & FLAG_INTS:
+            ints = _INT_STRUCTS[record_type]
+            for field, value in zip(INT_FIELDS[record_type], ints.unpack_from(data, offset)):
+                if value != NO_INT:
+                    record[field] = value
+            offset += ints.size
+        if flags & FLAG_MESSAGE:
+            (length,) = MESSAGE_LENGTH.unpack_from(data, offset)
+            offset += MESSAGE_LENGTH.size
+            record["message"] = data[offset:offset + length].decode()
+            offset += length
+        if flags & FLAG_EXTRA:
+            record.update(json.loads(data[offset:]))
+    except (struct.error, IndexError, KeyError, TypeError) as e:
+        raise ValueError(f"malformed compact record: {e}")
+    return record
+
+
+def decode_message(payload):
+    """A status/logs/events payload, compact or JSON. Raises ValueError if it is neither."""
+    if isinstance(payload, (bytes, bytearray)) and is_compact(payload):
+        return decode_record(bytes(payload))
+    return json.loads(payload)
+
+
+def encode_batch(records: Iterable[dict]) -> bytes:
+    """A zlib-compressed compact batch of records, oldest first."""
+    frames = [_VERSION_BYTE]
+    for record in records:
+        encoded = encode_record(record)
+        frames.append(FRAME_LENGTH.pack(len(encoded)))
+        frames.append(encoded)
+    return zlib.compress(b"".join(frames))
+
+
+def decode_batch(payload) -> List[dict]:
+    """Records of an agent's store-and-forward batch: compact or JSON lines, zlib-compressed or plain.
+
+    Raises ValueError for a corrupt or oversized payload; JSON lines that
+    aren't objects are skipped.
+    """
+    if isinstance(payload, str):
+        payload = payload.encode()
+    if payload[:1] == b"\x78":  # zlib header
+        decompressor = zlib.decompressobj()
+        try:
+            payload = decompressor.decompress(payload, MAX_BATCH_BYTES)
+        except zlib.error as e:
+            raise ValueError(f"corrupt batch: {e}")
+        if decompressor.unconsumed_tail:
+            raise ValueError(f"batch larger than {MAX_BATCH_BYTES} bytes")
+    records = []
+    if is_compact(payload):
+        offset = 1
+        while offset < len(payload):
+            try:
+                (length,) = FRAME_LENGTH.unpack_from(payload, offset)
+            except struct.error:
+                raise ValueError("truncated compact batch")
+            offset += FRAME_LENGTH.size
+            records.append(decode_record(payload[offset:offset + length]))
+            offset += length
+        return records
+    for line in payload.splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict):
+            records.append(record)
+    return records
@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Set, Tuple
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as seen by route handlers; detached from any DB session."""
+    id: int
+    username: str
+    role: str
+    tenant_id: Optional[int]
+    email: Optional[str]
+    first_name: Optional[str]
+    last_name: Optional[str]
+    status: Optional[str]
+    deleted: bool
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            role=user.role,
+            tenant_id=user.tenant_id,
+            email=user.email,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            status=user.status,
+            deleted=bool(user.deleted),
+        )
+
+
+class PrincipalCache:
+    """LRU of Principal keyed by (username, token iat), each entry valid for ttl_seconds.
+
+    User writes in this process invalidate every entry of that username; the
+    TTL bounds how long another API process can serve a stale principal.
+    """
+
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[float, Principal]]" = OrderedDict()
+        self._keys_by_username: Dict[str, Set[Tuple[str, int]]] = {}
+        self._lock = threading.Lock()
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, username: str, issued_at: int) -> Optional[Principal]:
+        key = (username, issued_at)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= time.monotonic():
+                self._drop(key)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, issued_at: int, principal: Principal):
+        key = (principal.username, issued_at)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, principal)
+            self._entries.move_to_end(key)
+            self._keys_by_username.setdefault(principal.username, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, key: Tuple[str, int]):
+        """Caller holds the lock."""
+        self._entries.pop(key, None)
+        keys = self._keys_by_username.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_username[key[0]]
+
+    def invalidate(self, username: str):
+        with self._lock:
+            for key in list(self._keys_by_username.get(username, ())):
+                self._drop(key)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_username.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+principal_cache = PrincipalCache(
+    ttl_seconds=settings.principal_cache_ttl_seconds,
+    max_entries=settings.principal_cache_max_entries,
+)
@@ -0,0 +1,245 @@
+"""Batch provisioning of devices, peripheral mappings and schedules.
+
+Each batch preloads everything its rules look at (farms, sections, devices and
+their pin inventory, peripheral types, active mappings) in a few IN (...) queries, then
+validates items in order against those in-memory sets, updating them as items
+are accepted so rules also hold within the batch. Accepted rows go in with a
+single executemany INSERT per table; the caller commits.
+"""
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Set, Tuple
+
+from croniter import croniter
+from fastapi import HTTPException
+from sqlalchemy import func, insert, or_, select
+
+from app.models.device import Device
+from app.models.farm import Farm
+from app.models.peripheral import PeripheralMapping, PeripheralType
+from app.models.schedule import Schedule
+from app.models.section import Section
+from app.services.exclusivity_context_service import ExclusiveSchedule, exclusivity_contexts
+from app.services.gpio_pin_service import device_pin_inventory, sync_device_pins
+
+
+class ItemError(Exception):
+    """An item failed validation; the message is returned for that item."""
+
+
+@dataclass
+class BatchOutcome:
+    results: List[dict] = field(default_factory=list)
+    farm_ids: Set[int] = field(default_factory=set)  # Farms whose caches should be invalidated
+
+    @property
+    def created(self) -> int:
+        return sum(1 for r in self.results if r["ok"])
+
+    def as_dict(self) -> dict:
+        return {"created": self.created, "failed": len(self.results) - self.created, "results": self.results}
+
+
+def can_access(current_user, tenant_id: int) -> bool:
+    return current_user.role == "super_admin" or tenant_id == current_user.tenant_id
+
+
+def insert_many(db, model, rows: List[dict], key: Tuple[str, ...]) -> List[int]:
+    """executemany INSERT of rows, returning their ids in order.
+
+    MySQL has no INSERT ... RETURNING, so ids are read back with one SELECT of
+    rows above the pre-insert max id, matched to the inserted rows on key. The
+    transaction's snapshot hides other sessions' concurrent inserts.
+    """
+    if not rows:
+        return []
+    before = db.execute(select(func.coalesce(func.max(model.id), 0))).scalar()
+    db.execute(insert(model), rows)
+    key_columns = [getattr(model, name) for name in key]
+    ids_by_key: Dict[tuple, deque] = defaultdict(deque)
+    for row in db.execute(select(model.id, *key_columns).where(model.id > before).order_by(model.id)):
+        ids_by_key[tuple(row[1:])].append(row[0])
+    return [ids_by_key[tuple(row[name] for name in key)].popleft() for row in rows]
+
+
+def run_batch(items, validate: Callable[[int, object], dict], atomic: bool) -> Tuple[List[dict], List[Tuple[int, dict]]]:
+    """Validate items in order: (results, [(result index, row to insert)])."""
+    results: List[dict] = []
+    accepted: List[Tuple[int, dict]] = []
+    for index, item in enumerate(items):
+        try:
+            row = validate(index, item)
+        except ItemError as e:
+            results.append({"index": index, "ok": False, "id": None, "error": str(e)})
+            continue
+        results.append({"index": index, "ok": True, "id": None, "error": None})
+        accepted.append((index, row))
+    if atomic and len(accepted) < len(items):
+        for index, _ in accepted:
+            results[index].update(ok=False, error="Not created: another item in the batch failed")
+        accepted = []
+    return results, accepted
+
+
+def finish_batch(db, model, results: List[dict], accepted: List[Tuple[int, dict]], key: Tuple[str, ...]):
+    ids = insert_many(db, model, [row for _, row in accepted], key)
+    for (index, _), new_id in zip(accepted, ids):
+        results[index]["id"] = new_id
+
+
+def provision_devices(db, items, current_user, atomic: bool = False) -> BatchOutcome:
+    farm_ids = {item.farm_id for item in items}
+    farms = {f.id: f for f in db.execute(select(Farm.id, Farm.tenant_id).where(Farm.id.in_(farm_ids), Farm.deleted == False))}
+    # Only one non-deleted device per farm
+    farms_with_device = set(db.execute(
+        select(Device.farm_id).where(Device.farm_id.in_(farm_ids), Device.is_deleted == False)
+    ).scalars())
+
+    def validate(index, item):
+        farm = farms.get(item.farm_id)
+        if farm is None:
+            raise ItemError("Farm not found")
+        if not can_access(current_user, farm.tenant_id):
+            raise ItemError("Not enough permissions")
+        if item.farm_id in farms_with_device:
+            raise ItemError("A device already exists for this farm. Only one non-deleted device is allowed per farm.")
+        farms_with_device.add(item.farm_id)
+        # Every row needs the same keys for executemany, so defaults are filled in here
+        return {"is_deleted": False, **item.dict()}
+
+    results, accepted = run_batch(items, validate, atomic)
+    finish_batch(db, Device, results, accepted, key=("farm_id", "device_uid"))
+    sync_device_pins(db, {results[index]["id"]: row["available_gpio_pins"] for index, row in accepted})
+    return BatchOutcome(results)
+
+
+def provision_peripheral_mappings(db, items, current_user, atomic: bool = False) -> BatchOutcome:
+    section_ids = {item.section_id for item in items if item.section_id is not None}
+    farm_ids = {item.farm_id for item in items if item.farm_id is not None}
+    device_ids = {item.device_id for item in items}
+    sections = {s.id: s for s in db.execute(
+        select(Section.id, Section.farm_id, Farm.tenant_id)
+        .join(Farm, Farm.id == Section.farm_id)
+        .where(Section.id.in_(section_ids), Section.is_deleted == False)
+    )}
+    farms = {f.id: f for f in db.execute(select(Farm.id, Farm.tenant_id).where(Farm.id.in_(farm_ids), Farm.deleted == False))}
+    pins_by_device = device_pin_inventory(db, db.execute(
+        select(Device.id).where(Device.id.in_(device_ids), Device.is_deleted == False)
+    ).scalars().all())
+    type_scopes = dict(db.execute(select(PeripheralType.id, PeripheralType.scope)).all())
+    # Active mappings the rules can collide with: per (section, type), (farm, type) and (device, pin)
+    section_types: Set[Tuple[int, int]] = set()
+    farm_types: Set[Tuple[int, int]] = set()
+    device_pins: Set[Tuple[int, int]] = set()
+    for m in db.execute(
+        select(PeripheralMapping.device_id, PeripheralMapping.section_id, PeripheralMapping.farm_id,
+               PeripheralMapping.peripheral_type_id, PeripheralMapping.gpio_pin)
+        .where(PeripheralMapping.is_deleted == False, or_(
+            PeripheralMapping.device_id.in_(device_ids),
+            PeripheralMapping.section_id.in_(section_ids),
+            PeripheralMapping.farm_id.in_(farm_ids),
+        ))
+    ):
+        device_pins.add((m.device_id, m.gpio_pin))
+        if m.section_id is not None:
+            section_types.add((m.section_id, m.peripheral_type_id))
+        if m.farm_id is not None:
+            farm_types.add((m.farm_id, m.peripheral_type_id))
+    outcome = BatchOutcome()
+
+    def validate(index, item):
+        if (item.section_id is None) == (item.farm_id is None):
+            raise ItemError("Exactly one of section_id and farm_id is required")
+        if item.section_id is not None:
+            section = sections.get(item.section_id)
+            if section is None:
+                raise ItemError("Section not found")
+            tenant_id, farm_id, scope = section.tenant_id, section.farm_id, "section"
+            attached, attached_key = section_types, (item.section_id, item.peripheral_type_id)
+        else:
+            farm = farms.get(item.farm_id)
+            if farm is None:
+                raise ItemError("Farm not found")
+            tenant_id, farm_id, scope = farm.tenant_id, farm.id, "farm"
+            attached, attached_key = farm_types, (item.farm_id, item.peripheral_type_id)
+        if not can_access(current_user, tenant_id):
+            raise ItemError("Not enough permissions")
+        if attached_key in attached:
+            raise ItemError(f"A peripheral of this type is already attached to this {scope}.")
+        if (item.device_id, item.gpio_pin) in device_pins:
+            raise ItemError("This GPIO pin is already in use on this device.")
+        if type_scopes.get(item.peripheral_type_id) != scope:
+            raise ItemError(f"Invalid peripheral type for {scope}.")
+        pins = pins_by_device.get(item.device_id)
+        if pins is None:
+            raise ItemError("Device not found")
+        if item.gpio_pin not in pins:
+            raise ItemError("GPIO pin not available on this device.")
+        attached.add(attached_key)
+        device_pins.add((item.device_id, item.gpio_pin))
+        outcome.farm_ids.add(farm_id)
+        return {
+            "device_id": item.device_id,
+            "section_id": item.section_id,
+            "farm_id": item.farm_id,
+            "peripheral_type_id": item.peripheral_type_id,
+            "gpio_pin": item.gpio_pin,
+            "is_deleted": False,
+        }
+
+    outcome.results, accepted = run_batch(items, validate, atomic)
+    finish_batch(db, PeripheralMapping, outcome.results, accepted, key=("device_id", "gpio_pin"))
+    return outcome
+
+
+def provision_schedules(db, items, current_user, check_overlap: Callable, atomic: bool = False) -> BatchOutcome:
+    """check_overlap(farm_id, schedules, cron_expression, duration_minutes) raises HTTPException on a conflict."""
+    mapping_ids = {item.peripheral_mapping_id for item in items}
+    mappings = {m.id: m for m in db.execute(
+        select(
+            PeripheralMapping.id,
+            PeripheralType.exclusive_schedule,
+            func.coalesce(PeripheralMapping.farm_id, Section.farm_id).label("farm_id"),
+            Farm.tenant_id,
+        )
+        .join(PeripheralType, PeripheralType.id == PeripheralMapping.peripheral_type_id)
+        .outerjoin(Section, Section.id == PeripheralMapping.section_id)
+        .outerjoin(Farm, Farm.id == func.coalesce(PeripheralMapping.farm_id, Section.farm_id))
+        .where(PeripheralMapping.id.in_(mapping_ids), PeripheralMapping.is_deleted == False)
+    )}
+    # Existing exclusive schedules per farm, plus the ones this batch has accepted so far
+    exclusive: Dict[int, List[ExclusiveSchedule]] = {}
+    outcome = BatchOutcome()
+
+    def validate(index, item):
+        mapping = mappings.get(item.peripheral_mapping_id)
+        if mapping is None:
+            raise ItemError("Peripheral mapping not found")
+        if mapping.tenant_id is not None and not can_access(current_user, mapping.tenant_id):
+            raise ItemError("Not enough permissions")
+        if item.duration_minutes <= 0:
+            raise ItemError("duration_minutes must be positive")
+        if not croniter.is_valid(item.cron_expression):
+            raise ItemError("Invalid cron expression")
+        if mapping.exclusive_schedule and mapping.farm_id is not None:
+            if mapping.farm_id not in exclusive:
+                exclusive[mapping.farm_id] = list(exclusivity_contexts.get(db, mapping.farm_id).schedules)
+            schedules = exclusive[mapping.farm_id]
+            try:
+                check_overlap(mapping.farm_id, schedules, item.cron_expression, item.duration_minutes)
+            except HTTPException as e:
+                raise ItemError(e.detail)
+            # Not inserted yet, so stand in with a negative id
+            schedules.append(ExclusiveSchedule(-(index + 1), item.peripheral_mapping_id, item.cron_expression, item.duration_minutes))
+        if mapping.farm_id is not None:
+            outcome.farm_ids.add(mapping.farm_id)
+        return {
+            "peripheral_mapping_id": item.peripheral_mapping_id,
+            "cron_expression": item.cron_expression,
+            "duration_minutes": item.duration_minutes,
+            "is_deleted": False,
+        }
+
+    outcome.results, accepted = run_batch(items, validate, atomic)
+    finish_batch(db, Schedule, outcome.results, accepted, key=("peripheral_mapping_id", "cron_expression", "duration_minutes"))
+    return outcome
@@ -0,0 +1,201 @@
+"""Versioned cache of serialized GET responses for the polled dashboard endpoints.
+
+A cached view is identified by a version key: its resource, the caller's
+scope and its path ids. The version comes from one cheap aggregate query
+(row count, max(updated_at), max(id)) per table the view reads, including
+soft-deleted rows, so inserts, edits and soft deletes all change it. It is
+prefixed with a per-table generation counter. The version is cached for
+response_cache_version_ttl_seconds.
+
+Commits in this process bump the generation of every table they wrote, via
+session hooks installed by track_writes(). A client then sees its own write
+on the next poll. The TTL bounds how long a write from another process goes
+unseen.
+
+Serialized bodies are kept in an LRU bounded by entry count and total bytes,
+one entry per (version key, URL). An entry is only served while its version
+is current.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+from sqlalchemy import event, func, select
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class VersionPart:
+    """Rows of one table a view reads: model plus WHERE criteria."""
+    model: type
+    criteria: tuple = ()
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    etag: str
+    body: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+def version_statement(parts: Iterable[VersionPart]):
+    """One SELECT of (count, max(updated_at), max(id)) per part, as scalar subqueries."""
+    columns = []
+    for part in parts:
+        model = part.model
+        for aggregate in (func.count(model.id), func.max(model.updated_at), func.max(model.id)):
+            columns.append(select(aggregate).where(*part.criteria).scalar_subquery())
+    return select(*columns)
+
+
+def make_etag(key, version: str) -> str:
+    digest = hashlib.sha1(f"{key!r}|{version}".encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # Weak comparison, as If-None-Match requires
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 5000, max_bytes: int = 64 * 1024 * 1024, version_ttl_seconds: float = 2.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version_ttl_seconds = version_ttl_seconds
+        self._generations: Dict[str, int] = {}
+        self._versions: Dict[tuple, Tuple[float, FrozenSet[str], str]] = {}  # version key -> (expires, tables, db version)
+        self._entries: "OrderedDict[tuple, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Counters
+        self.hits = 0
+        self.not_modified = 0
+        self.misses = 0
+        self.version_queries = 0
+        self.evictions = 0
+
+    def _generation(self, tables: FrozenSet[str]) -> str:
+        return ".".join(str(self._generations.get(table, 0)) for table in sorted(tables))
+
+    def cached_version(self, version_key: tuple) -> Optional[str]:
+        with self._lock:
+            entry = self._versions.get(version_key)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            return f"{self._generation(entry[1])}|{entry[2]}"
+
+    def store_version(self, version_key: tuple, tables: FrozenSet[str], row) -> str:
+        db_version = ",".join("" if value is None else str(value) for value in row)
+        with self._lock:
+            self.version_queries += 1
+            self._versions[version_key] = (time.monotonic() + self.version_ttl_seconds, tables, db_version)
+            return f"{self._generation(tables)}|{db_version}"
+
+    def note_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def get(self, key: tuple, etag: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.etag != etag:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: tuple, response: CachedResponse):
+        size = len(response.body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.body)
+            self._entries[key] = response
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+                self.evictions += 1
+
+    def invalidate_tables(self, tables: Iterable[str]):
+        """Writes committed to these tables: new generation, and re-query their versions."""
+        tables = set(tables)
+        if not tables:
+            return
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+            for version_key in [k for k, (_, deps, _) in self._versions.items() if deps & tables]:
+                del self._versions[version_key]
+
+    def clear(self):
+        with self._lock:
+            self._versions.clear()
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "versions": len(self._versions),
+                "hits": self.hits,
+                "not_modified": self.not_modified,
+                "misses": self.misses,
+                "version_queries": self.version_queries,
+                "evictions": self.evictions,
+            }
+
+
+response_cache = ResponseCache(
+    max_entries=settings.response_cache_max_entries,
+    max_bytes=settings.response_cache_max_bytes,
+    version_ttl_seconds=settings.response_cache_version_ttl_seconds,
+)
+
+
+def _written(session) -> set:
+    return session.info.setdefault("response_cache_written_tables", set())
+
+
+def _after_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, "__table__", None)
+        if table is not None:
+            _written(session).add(table.name)
+
+
+def _do_orm_execute(orm_execute_state):
+    # Bulk INSERT/UPDATE/DELETE statements (executemany provisioning, cascade soft-deletes)
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None:
+            _written(orm_execute_state.session).add(table.name)
+
+
+def _after_commit(session):
+    response_cache.invalidate_tables(session.info.pop("response_cache_written_tables", ()))
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop("response_cache_written_tables", None)
+
+
+def track_writes(session_factory):
+    """Invalidate cached versions for the tables each committed transaction of session_factory wrote."""
+    event.listen(session_factory, "after_flush", _after_flush)
+    event.listen(session_factory, "do_orm_execute", _do_orm_execute)
+    event.listen(session_factory, "after_commit", _after_commit)
+    event.listen(session_factory, "after_soft_rollback", _after_soft_rollback)
@@ -0,0 +1,31 @@
+"""The clock cron expressions run on.
+
+Every schedule fires in one timezone, SCHEDULE_TIMEZONE: in the schedule
+executor, in the schedule API's overlap checks and on device agents, which
+receive it with every schedule sync. Cron times are naive wall-clock times in
+that timezone, which is what croniter works with.
+"""
+from datetime import datetime, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+from app.core.config import settings
+
+
+@lru_cache(maxsize=None)
+def _zone(name: str) -> ZoneInfo:
+    return ZoneInfo(name)
+
+
+def schedule_timezone() -> ZoneInfo:
+    return _zone(settings.schedule_timezone)
+
+
+def schedule_now() -> datetime:
+    """Current wall-clock time in the schedule timezone, naive."""
+    return datetime.now(schedule_timezone()).replace(tzinfo=None)
+
+
+def to_utc(wall: datetime) -> datetime:
+    """Naive UTC of a schedule wall-clock time; timestamps are stored as naive UTC."""
+    return wall.replace(tzinfo=schedule_timezone()).astimezone(timezone.utc).replace(tzinfo=None)
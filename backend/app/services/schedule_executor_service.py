@@ -0,0 +1,468 @@
+import heapq
+import itertools
+import json
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from croniter import croniter
+from sqlalchemy import and_, bindparam, select
+
+from app.models.device import Device
+from app.models.peripheral import PeripheralMapping
+from app.models.schedule import Schedule
+from app.models.watering_log import WateringLog
+from app.services.schedule_clock import schedule_now, to_utc
+
+START = "start"
+STOP = "stop"
+
+
+@dataclass(frozen=True)
+class ScheduleTarget:
+    schedule_id: int
+    cron_expression: str
+    duration_minutes: int
+    peripheral_mapping_id: int
+    gpio_pin: int
+    section_id: Optional[int]
+    device_id: int
+    device_uid: str
+    farm_id: int
+
+    @property
+    def command_topic(self) -> str:
+        return f"farm/{self.farm_id}/device/{self.device_uid}/commands"
+
+
+def command_payload(action: str, target: ScheduleTarget, fire_time: datetime) -> str:
+    return json.dumps({
+        "action": action,
+        "schedule_id": target.schedule_id,
+        "peripheral_mapping_id": target.peripheral_mapping_id,
+        "gpio_pin": target.gpio_pin,
+        "duration_minutes": target.duration_minutes,
+        "timestamp": to_utc(fire_time).isoformat() + "Z",
+    })
+
+
+class ScheduleHeap:
+    """Min-heap of pending start/stop firings keyed on fire time.
+
+    Each schedule has exactly one live start entry. Changing or removing a
+    schedule bumps its version instead of searching the heap; stale entries
+    are discarded when they reach the top. The next start is computed with
+    croniter only after the previous one fires (see advance()).
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int, str, int, int, ScheduleTarget]] = []
+        self._targets: Dict[int, Tuple[ScheduleTarget, int]] = {}
+        self._versions = itertools.count()
+        self._seq = itertools.count()
+        self._fired: List[Tuple[datetime, int, int, ScheduleTarget]] = []
+
+    def __len__(self) -> int:
+        return len(self._targets)
+
+    def _push(self, fire_time: datetime, action: str, target: ScheduleTarget, version: int):
+        heapq.heappush(self._heap, (fire_time, next(self._seq), action, target.schedule_id, version, target))
+
+    @staticmethod
+    def next_fire(cron_expression: str, base: datetime, memo: Optional[Dict[Tuple[str, datetime], datetime]] = None) -> datetime:
+        """croniter's next fire time; memo shares the result between schedules with the same cron and base."""
+        if memo is None:
+            return croniter(cron_expression, base).get_next(datetime)
+        key = (cron_expression, base)
+        fire_time = memo.get(key)
+        if fire_time is None:
+            fire_time = memo[key] = croniter(cron_expression, base).get_next(datetime)
+        return fire_time
+
+    def upsert(self, target: ScheduleTarget, now: datetime, memo: Optional[Dict[Tuple[str, datetime], datetime]] = None):
+        current = self._targets.get(target.schedule_id)
+        if current is not None and current[0] == target:
+            return
+        try:
+            fire_time = self.next_fire(target.cron_expression, now, memo)
+        except Exception as e:
+            print(f"[EXECUTOR][ERROR] Invalid cron '{target.cron_expression}' for schedule {target.schedule_id}: {e}")
+            self._targets.pop(target.schedule_id, None)
+            return
+        version = next(self._versions)
+        self._targets[target.schedule_id] = (target, version)
+        self._push(fire_time, START, target, version)
+
+    def remove(self, schedule_id: int):
+        self._targets.pop(schedule_id, None)
+
+    def clear(self):
+        self._heap.clear()
+        self._targets.clear()
+        self._fired.clear()
+
+    def next_fire_time(self) -> Optional[datetime]:
+        while self._heap:
+            fire_time, _, action, schedule_id, version, _ = self._heap[0]
+            if action == STOP or self._is_live(schedule_id, version):
+                return fire_time
+            heapq.heappop(self._heap)
+        return None
+
+    def _is_live(self, schedule_id: int, version: int) -> bool:
+        current = self._targets.get(schedule_id)
+        return current is not None and current[1] == version
+
+    def pop_due(self, now: datetime, misfire_grace: Optional[timedelta] = None) -> Tuple[List[Tuple[str, ScheduleTarget, datetime]], int]:
+        """Pop every firing due at or before now, queueing the stop of each start.
+
+        Starts later than misfire_grace are skipped. Call advance() afterwards to
+        queue the next start of the popped schedules, so publishing a burst of
+        due commands is not held up by croniter.
+        """
+        due = []
+        misfired = 0
+        while self._heap and self._heap[0][0] <= now:
+            fire_time, _, action, schedule_id, version, target = heapq.heappop(self._heap)
+            if action == STOP:
+                # Stops are sent even if the schedule was edited or deleted mid-run
+                due.append((STOP, target, fire_time))
+                continue
+            if not self._is_live(schedule_id, version):
+                continue
+            self._fired.append((fire_time, schedule_id, version, target))
+            if misfire_grace is not None and now - fire_time > misfire_grace:
+                misfired += 1
+                continue
+            due.append((START, target, fire_time))
+            self._push(fire_time + timedelta(minutes=target.duration_minutes), STOP, target, version)
+        return due, misfired
+
+    def advance(self, now: datetime):
+        """Queue the next start after each start popped by pop_due, unless the schedule changed since."""
+        fired, self._fired = self._fired, []
+        memo: Dict[Tuple[str, datetime], datetime] = {}
+        for fire_time, schedule_id, version, target in fired:
+            if self._is_live(schedule_id, version):
+                # Skip occurrences already in the past (e.g. after a long pause)
+                self._push(self.next_fire(target.cron_expression, max(fire_time, now), memo), START, target, version)
+
+
+class WateringLogWriter:
+    """Batches watering log writes: one INSERT per batch of starts, one executemany UPDATE per batch of stops."""
+
+    def __init__(self, engine, flush_interval: float = 1.0, batch_size: int = 1000, maxsize: int = 100000):
+        self.engine = engine
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[Tuple[str, dict]]" = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # Counters
+        self.rows_inserted = 0
+        self.rows_updated = 0
+        self.rows_dropped = 0
+        self.flush_errors = 0
+
+    def started(self, target: ScheduleTarget, fire_time: datetime):
+        self._put(START, {
+            "schedule_id": target.schedule_id,
+            "device_id": target.device_id,
+            "section_id": target.section_id,
+            "start_time": to_utc(fire_time),
+            "status": "running",
+        })
+
+    def stopped(self, target: ScheduleTarget, start_time: datetime, end_time: datetime):
+        self._put(STOP, {
+            "b_schedule_id": target.schedule_id,
+            "b_start_time": to_utc(start_time),
+            "b_end_time": to_utc(end_time),
+        })
+
+    def _put(self, kind: str, row: dict):
+        try:
+            self._queue.put_nowait((kind, row))
+        except queue.Full:
+            with self._lock:
+                self.rows_dropped += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="watering-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self.flush(batch)
+        while True:
+            batch = self._collect_batch(block=False)
+            if not batch:
+                break
+            self.flush(batch)
+
+    def _collect_batch(self, block: bool = True) -> List[Tuple[str, dict]]:
+        batch: List[Tuple[str, dict]] = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                if block:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self, batch: List[Tuple[str, dict]]):
+        logs = WateringLog.__table__
+        inserts = [row for kind, row in batch if kind == START]
+        updates = [row for kind, row in batch if kind == STOP]
+        try:
+            with self.engine.begin() as conn:
+                # Inserts first, so a run that starts and stops within one batch is closed too
+                if inserts:
+                    conn.execute(logs.insert(), inserts)
+                if updates:
+                    conn.execute(
+                        logs.update()
+                        .where(and_(logs.c.schedule_id == bindparam("b_schedule_id"), logs.c.start_time == bindparam("b_start_time")))
+                        .values(end_time=bindparam("b_end_time"), status="completed"),
+                        updates,
+                    )
+        except Exception as e:
+            print(f"[EXECUTOR][ERROR] Watering log flush of {len(batch)} rows failed: {e}")
+            with self._lock:
+                self.flush_errors += 1
+            return
+        with self._lock:
+            self.rows_inserted += len(inserts)
+            self.rows_updated += len(updates)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rows_inserted": self.rows_inserted,
+                "rows_updated": self.rows_updated,
+                "rows_dropped": self.rows_dropped,
+                "flush_errors": self.flush_errors,
+                "queue_depth": self._queue.qsize(),
+            }
+
+
+class ScheduleExecutor:
+    """Fires active schedules: publishes start/stop commands and records watering logs.
+
+    Schedules are loaded once with a single joined query and then refreshed
+    incrementally by polling updated_at on schedules, peripheral_mappings and
+    devices, like the worker's device registry. on_change, if given, is called
+    with the ids of the devices whose rows changed (None after a full load).
+    """
+
+    # Re-read rows updated within this window of the watermark, since
+    # DATETIME columns only have second precision.
+    REFRESH_OVERLAP = timedelta(seconds=2)
+
+    def __init__(self, engine, publish: Callable[[str, str], None], log_writer: WateringLogWriter,
+                 refresh_interval: float = 10.0, misfire_grace_seconds: float = 60.0,
+                 on_change: Optional[Callable[[Optional[Set[int]]], None]] = None):
+        self.engine = engine
+        self.publish = publish
+        self.log_writer = log_writer
+        self.refresh_interval = refresh_interval
+        self.misfire_grace = timedelta(seconds=misfire_grace_seconds)
+        self.on_change = on_change
+        self.heap = ScheduleHeap()
+        self._watermark: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        # Counters
+        self.starts_fired = 0
+        self.stops_fired = 0
+        self.misfires = 0
+        self.publish_errors = 0
+        self.max_lag_ms = 0.0
+
+    def _columns(self):
+        schedules = Schedule.__table__
+        mappings = PeripheralMapping.__table__
+        devices = Device.__table__
+        return (
+            select(
+                schedules.c.id,
+                schedules.c.cron_expression,
+                schedules.c.duration_minutes,
+                schedules.c.is_deleted,
+                schedules.c.updated_at,
+                mappings.c.id.label("mapping_id"),
+                mappings.c.gpio_pin,
+                mappings.c.section_id,
+                mappings.c.is_deleted.label("mapping_deleted"),
+                mappings.c.updated_at.label("mapping_updated_at"),
+                devices.c.id.label("device_id"),
+                devices.c.device_uid,
+                devices.c.farm_id,
+                devices.c.is_deleted.label("device_deleted"),
+                devices.c.updated_at.label("device_updated_at"),
+            )
+            .join(mappings, mappings.c.id == schedules.c.peripheral_mapping_id)
+            .join(devices, devices.c.id == mappings.c.device_id)
+        )
+
+    def _apply(self, row, now: datetime, memo: dict):
+        """Upsert or drop a single schedule row. Caller holds the lock."""
+        for updated_at in (row.updated_at, row.mapping_updated_at, row.device_updated_at):
+            if updated_at is not None and (self._watermark is None or updated_at > self._watermark):
+                self._watermark = updated_at
+        if row.is_deleted or row.mapping_deleted or row.device_deleted:
+            self.heap.remove(row.id)
+            return
+        self.heap.upsert(ScheduleTarget(
+            schedule_id=row.id,
+            cron_expression=row.cron_expression,
+            duration_minutes=row.duration_minutes,
+            peripheral_mapping_id=row.mapping_id,
+            gpio_pin=row.gpio_pin,
+            section_id=row.section_id,
+            device_id=row.device_id,
+            device_uid=row.device_uid,
+            farm_id=row.farm_id,
+        ), now, memo)
+
+    def load(self):
+        """Bulk load every active schedule and compute its next start."""
+        schedules = Schedule.__table__
+        stmt = self._columns().where(
+            schedules.c.is_deleted == False,
+            PeripheralMapping.__table__.c.is_deleted == False,
+            Device.__table__.c.is_deleted == False,
+        )
+        with self.engine.connect() as conn:
+            rows = conn.execute(stmt).all()
+        # Whole minutes, so schedules sharing a cron expression share one croniter call
+        now = schedule_now().replace(second=0, microsecond=0)
+        memo: dict = {}
+        with self._lock:
+            self.heap.clear()
+            self._watermark = None
+            for row in rows:
+                self._apply(row, now, memo)
+        self._wake.set()
+        print(f"[EXECUTOR] Loaded {len(self.heap)} active schedules")
+        self._notify(None)
+
+    def refresh(self):
+        """Pull schedules whose schedule, mapping or device row changed since the last watermark."""
+        if self._watermark is None:
+            return self.load()
+        since = self._watermark - self.REFRESH_OVERLAP
+        # One query per table, so each is a range scan on its own updated_at index;
+        # an OR across the join can't use them. A schedule may come back more than once.
+        by_id = {}
+        with self.engine.connect() as conn:
+            for table in (Schedule.__table__, PeripheralMapping.__table__, Device.__table__):
+                for row in conn.execute(self._columns().where(table.c.updated_at >= since)):
+                    by_id[row.id] = row
+        rows = list(by_id.values())
+        now = schedule_now().replace(second=0, microsecond=0)
+        memo: dict = {}
+        previous = self._watermark
+        with self._lock:
+            for row in rows:
+                self._apply(row, now, memo)
+        if rows:
+            self._wake.set()
+            # The overlap window re-reads rows already seen; only newer edits change a device's version
+            changed = {
+                row.device_id for row in rows
+                if any(t is not None and t > previous for t in (row.updated_at, row.mapping_updated_at, row.device_updated_at))
+            }
+            if changed:
+                self._notify(changed)
+
+    def _notify(self, device_ids: Optional[Set[int]]):
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(device_ids)
+        except Exception as e:
+            print(f"[EXECUTOR][ERROR] Schedule change notification failed: {e}")
+
+    def fire_due(self, now: Optional[datetime] = None):
+        now = now or schedule_now()
+        with self._lock:
+            due, misfired = self.heap.pop_due(now, self.misfire_grace)
+            self.misfires += misfired
+        for action, target, fire_time in due:
+            self.max_lag_ms = max(self.max_lag_ms, (now - fire_time).total_seconds() * 1000)
+            try:
+                self.publish(target.command_topic, command_payload(action, target, fire_time))
+            except Exception as e:
+                print(f"[EXECUTOR][ERROR] Failed to publish {action} for schedule {target.schedule_id}: {e}")
+                self.publish_errors += 1
+                continue
+            if action == START:
+                self.starts_fired += 1
+                self.log_writer.started(target, fire_time)
+            else:
+                self.stops_fired += 1
+                self.log_writer.stopped(target, fire_time - timedelta(minutes=target.duration_minutes), fire_time)
+        with self._lock:
+            self.heap.advance(now)
+
+    def run(self, is_leader: Callable[[], bool] = lambda: True):
+        """Fire schedules until stop(); refreshes every refresh_interval and only fires while leader."""
+        leading = False
+        next_refresh = time.monotonic()
+        while not self._stop.is_set():
+            if time.monotonic() >= next_refresh:
+                next_refresh = time.monotonic() + self.refresh_interval
+                now_leading = is_leader()
+                if now_leading != leading:
+                    print(f"[EXECUTOR] Leadership {'acquired' if now_leading else 'lost'}")
+                    leading = now_leading
+                    if leading:
+                        self._watermark = None
+                try:
+                    if leading:
+                        self.refresh()
+                except Exception as e:
+                    print(f"[EXECUTOR][ERROR] Schedule refresh failed: {e}")
+            if leading:
+                self.fire_due()
+            with self._lock:
+                next_fire = self.heap.next_fire_time() if leading else None
+            timeout = next_refresh - time.monotonic()
+            if next_fire is not None:
+                timeout = min(timeout, (next_fire - schedule_now()).total_seconds())
+            self._wake.wait(max(timeout, 0))
+            self._wake.clear()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "schedules": len(self.heap),
+                "starts_fired": self.starts_fired,
+                "stops_fired": self.stops_fired,
+                "misfires": self.misfires,
+                "publish_errors": self.publish_errors,
+                "max_lag_ms": self.max_lag_ms,
+            }
@@ -0,0 +1,154 @@
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from croniter import croniter
+
+from app.services.schedule_clock import schedule_now
+
+
+@dataclass
+class Conflict:
+    schedule_id: int
+    start: datetime  # Existing window
+    end: datetime
+    new_start: datetime  # Window of the schedule being checked
+    new_end: datetime
+
+
+def expand_windows(cron_expression: str, duration_minutes: int, base: datetime, until: datetime,
+                   max_windows: int) -> List[Tuple[datetime, datetime]]:
+    """[start, end) windows of a schedule that intersect [base, until)."""
+    duration = timedelta(minutes=duration_minutes)
+    # Start one duration early so a window already running at base is included
+    itr = croniter(cron_expression, base - duration)
+    windows = []
+    while len(windows) < max_windows:
+        start = itr.get_next(datetime)
+        if start >= until:
+            break
+        windows.append((start, start + duration))
+    return windows
+
+
+class FarmOccurrenceIndex:
+    """Expanded [start, end) windows of a farm's exclusive schedules over [base, base + horizon).
+
+    Windows are kept sorted by start along with a running max of end (and the
+    best end from a different schedule), so "does anything overlap [s, e)" is a
+    single bisect. Only schedules whose cron or duration changed are re-expanded
+    by sync(); the sorted arrays are rebuilt lazily on the next query.
+    """
+
+    def __init__(self, base: datetime, horizon: timedelta, max_windows: int):
+        self.base = base
+        self.until = base + horizon
+        self.max_windows = max_windows
+        self._schedules: Dict[int, Tuple[str, int, List[Tuple[datetime, datetime]]]] = {}
+        self._dirty = True
+        self._starts: List[datetime] = []
+        self._windows: List[Tuple[datetime, datetime, int]] = []
+        self._best: List[Tuple[datetime, int]] = []  # Max end in prefix, and its window index
+        self._runner_up: List[Optional[Tuple[datetime, int]]] = []  # Max end in prefix from another schedule
+        # Counters
+        self.expansions = 0
+
+    def expand(self, cron_expression: str, duration_minutes: int) -> List[Tuple[datetime, datetime]]:
+        return expand_windows(cron_expression, duration_minutes, self.base, self.until, self.max_windows)
+
+    def sync(self, schedules: Iterable[Tuple[int, str, int]]):
+        """Make the index match (schedule_id, cron_expression, duration_minutes) rows."""
+        seen = set()
+        for schedule_id, cron_expression, duration_minutes in schedules:
+            seen.add(schedule_id)
+            current = self._schedules.get(schedule_id)
+            if current is not None and current[0] == cron_expression and current[1] == duration_minutes:
+                continue
+            self._schedules[schedule_id] = (cron_expression, duration_minutes, self.expand(cron_expression, duration_minutes))
+            self.expansions += 1
+            self._dirty = True
+        for schedule_id in [sid for sid in self._schedules if sid not in seen]:
+            del self._schedules[schedule_id]
+            self._dirty = True
+
+    def _rebuild(self):
+        windows = sorted(
+            (start, end, schedule_id)
+            for schedule_id, (_, _, expanded) in self._schedules.items()
+            for start, end in expanded
+        )
+        best: List[Tuple[datetime, int]] = []
+        runner_up: List[Optional[Tuple[datetime, int]]] = []
+        top: Optional[Tuple[datetime, int]] = None
+        second: Optional[Tuple[datetime, int]] = None
+        for i, (_, end, schedule_id) in enumerate(windows):
+            if top is None or end > top[0]:
+                if top is not None and windows[top[1]][2] != schedule_id:
+                    second = top
+                top = (end, i)
+            elif schedule_id != windows[top[1]][2] and (second is None or end > second[0]):
+                second = (end, i)
+            best.append(top)
+            runner_up.append(second)
+        self._windows = windows
+        self._starts = [w[0] for w in windows]
+        self._best = best
+        self._runner_up = runner_up
+        self._dirty = False
+
+    def find_overlap(self, windows: Iterable[Tuple[datetime, datetime]], exclude_id: Optional[int] = None) -> Optional[Conflict]:
+        """First indexed window overlapping any of the given windows, ignoring schedule exclude_id."""
+        if self._dirty:
+            self._rebuild()
+        for new_start, new_end in windows:
+            idx = bisect_left(self._starts, new_end)
+            if idx == 0:
+                continue
+            candidate = self._best[idx - 1]
+            if self._windows[candidate[1]][2] == exclude_id:
+                candidate = self._runner_up[idx - 1]
+            if candidate is not None and candidate[0] > new_start:
+                start, end, schedule_id = self._windows[candidate[1]]
+                return Conflict(schedule_id, start, end, new_start, new_end)
+        return None
+
+
+class ScheduleOccurrenceIndex:
+    """Per-farm FarmOccurrenceIndex registry shared by the schedule endpoints.
+
+    Callers sync a farm with its current exclusive schedules (cheap unless one
+    changed) and then check a candidate schedule against it. Indexes are
+    re-based once they are rebase_after old, so the horizon keeps moving forward.
+    """
+
+    def __init__(self, horizon_days: int = 14, max_windows: int = 20000, rebase_after: timedelta = timedelta(days=1)):
+        self.horizon = timedelta(days=horizon_days)
+        self.max_windows = max_windows
+        self.rebase_after = rebase_after
+        self._farms: Dict[int, FarmOccurrenceIndex] = {}
+        self._lock = threading.Lock()
+
+    def _farm_index(self, farm_id: int, now: datetime) -> FarmOccurrenceIndex:
+        index = self._farms.get(farm_id)
+        if index is None or now - index.base >= self.rebase_after:
+            index = FarmOccurrenceIndex(now, self.horizon, self.max_windows)
+            self._farms[farm_id] = index
+        return index
+
+    def check(self, farm_id: int, schedules: Iterable[Tuple[int, str, int]], cron_expression: str, duration_minutes: int,
+              exclude_id: Optional[int] = None, now: Optional[datetime] = None) -> Optional[Conflict]:
+        """Sync the farm's index with schedules and return the first window overlapping the candidate, if any."""
+        now = now or schedule_now()
+        with self._lock:
+            index = self._farm_index(farm_id, now)
+            index.sync(schedules)
+            return index.find_overlap(index.expand(cron_expression, duration_minutes), exclude_id=exclude_id)
+
+    def invalidate(self, farm_id: Optional[int] = None):
+        with self._lock:
+            if farm_id is None:
+                self._farms.clear()
+            else:
+                self._farms.pop(farm_id, None)
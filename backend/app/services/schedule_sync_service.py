@@ -0,0 +1,276 @@
+"""Delta sync of each device's schedules to its agent, over MQTT.
+
+Agents keep their schedules in a local store and run them without the broker.
+A device's schedule version is the newest updated_at (epoch seconds) across
+its device row, its peripheral mappings and their schedules, soft-deleted rows
+included. Edits and soft deletes both raise it.
+
+- The schedule executor's leader publishes the version, retained, to
+  farm/{farm_id}/device/{device_uid}/schedules/version whenever its updated_at
+  poll sees a device's rows change (ScheduleVersionNotifier). A reconnecting
+  agent gets the retained version from the broker and only asks for a sync if
+  it is behind, so a fleet reconnecting after an outage costs no queries for
+  devices that are already current.
+- An agent asks on .../schedules/sync with {"since": <its version or null>}.
+  The MQTT worker answers on .../schedules with the rows changed since then
+  (ScheduleSyncResponder), or every active schedule when since is null.
+  Every answer carries SCHEDULE_TIMEZONE, the timezone the agent evaluates
+  cron expressions in, so agent and executor fire at the same moments.
+"""
+import calendar
+import json
+import queue
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func, or_, select
+
+from app.core.config import settings
+from app.models.device import Device
+from app.models.peripheral import PeripheralMapping
+from app.models.schedule import Schedule
+
+SYNC_TOPIC = "farm/+/device/+/schedules/sync"
+
+# Re-send rows updated within this window of the agent's version, since
+# DATETIME columns only have second precision.
+SYNC_OVERLAP_SECONDS = 2
+
+
+def schedules_topic(farm_id, device_uid: str) -> str:
+    return f"farm/{farm_id}/device/{device_uid}/schedules"
+
+
+def version_topic(farm_id, device_uid: str) -> str:
+    return f"farm/{farm_id}/device/{device_uid}/schedules/version"
+
+
+def to_version(updated_at: Optional[datetime]) -> int:
+    return calendar.timegm(updated_at.timetuple()) if updated_at is not None else 0
+
+
+def from_version(version: int) -> datetime:
+    return datetime(1970, 1, 1) + timedelta(seconds=version)
+
+
+def device_schedule_delta(conn, device_id: int, since: Optional[int]) -> dict:
+    """The device's schedules changed since its agent's version, or all active ones when since is None.
+
+    Returns {"version", "full", "schedules": [...], "deleted": [schedule ids]}.
+    A full sync replaces the agent's schedules; a delta is applied on top.
+    """
+    devices = Device.__table__
+    mappings = PeripheralMapping.__table__
+    schedules = Schedule.__table__
+    stmt = (
+        select(
+            devices.c.is_deleted.label("device_deleted"),
+            devices.c.updated_at.label("device_updated_at"),
+            mappings.c.id.label("mapping_id"),
+            mappings.c.gpio_pin,
+            mappings.c.is_deleted.label("mapping_deleted"),
+            mappings.c.updated_at.label("mapping_updated_at"),
+            schedules.c.id,
+            schedules.c.cron_expression,
+            schedules.c.duration_minutes,
+            schedules.c.is_deleted,
+            schedules.c.updated_at,
+        )
+        .select_from(devices)
+        .outerjoin(mappings, mappings.c.device_id == devices.c.id)
+        .outerjoin(schedules, schedules.c.peripheral_mapping_id == mappings.c.id)
+        .where(devices.c.id == device_id)
+    )
+    full = since is None
+    if not full:
+        cutoff = from_version(since - SYNC_OVERLAP_SECONDS)
+        stmt = stmt.where(or_(
+            devices.c.updated_at >= cutoff,
+            mappings.c.updated_at >= cutoff,
+            schedules.c.updated_at >= cutoff,
+        ))
+    version = since or 0
+    active, deleted = [], []
+    for row in conn.execute(stmt):
+        for updated_at in (row.device_updated_at, row.mapping_updated_at, row.updated_at):
+            version = max(version, to_version(updated_at))
+        if row.id is None:
+            continue
+        if row.is_deleted or row.mapping_deleted or row.device_deleted:
+            deleted.append(row.id)
+            continue
+        active.append({
+            "id": row.id,
+            "cron_expression": row.cron_expression,
+            "duration_minutes": row.duration_minutes,
+            "gpio_pin": row.gpio_pin,
+            "peripheral_mapping_id": row.mapping_id,
+        })
+    return {"version": version, "full": full, "timezone": settings.schedule_timezone,
+            "schedules": active, "deleted": [] if full else deleted}
+
+
+def device_versions(conn, device_ids: Optional[Iterable[int]] = None) -> Dict[int, Tuple[int, str, int]]:
+    """device id -> (farm_id, device_uid, schedule version) for the given (or all) non-deleted devices."""
+    devices = Device.__table__
+    mappings = PeripheralMapping.__table__
+    schedules = Schedule.__table__
+    device_filter = [devices.c.is_deleted == False]
+    mapping_filter = []
+    if device_ids is not None:
+        device_ids = list(device_ids)
+        device_filter.append(devices.c.id.in_(device_ids))
+        mapping_filter.append(mappings.c.device_id.in_(device_ids))
+    versions: Dict[int, Tuple[int, str, int]] = {}
+    for row in conn.execute(select(devices.c.id, devices.c.farm_id, devices.c.device_uid, devices.c.updated_at).where(*device_filter)):
+        versions[row.id] = (row.farm_id, row.device_uid, to_version(row.updated_at))
+    # Newest mapping and schedule edit per device, one grouped query each
+    for stmt in (
+        select(mappings.c.device_id, func.max(mappings.c.updated_at)).where(*mapping_filter).group_by(mappings.c.device_id),
+        select(mappings.c.device_id, func.max(schedules.c.updated_at))
+        .join(mappings, mappings.c.id == schedules.c.peripheral_mapping_id)
+        .where(*mapping_filter)
+        .group_by(mappings.c.device_id),
+    ):
+        for device_id, updated_at in conn.execute(stmt):
+            if device_id in versions:
+                farm_id, device_uid, version = versions[device_id]
+                versions[device_id] = (farm_id, device_uid, max(version, to_version(updated_at)))
+    return versions
+
+
+class ScheduleVersionNotifier:
+    """Publishes devices' schedule versions as retained messages; the executor calls notify() after each poll."""
+
+    def __init__(self, engine, publish_retained: Callable[[str, str], None]):
+        self.engine = engine
+        self.publish_retained = publish_retained
+        self._lock = threading.Lock()
+        # Counters
+        self.versions_published = 0
+        self.publish_errors = 0
+
+    def notify(self, device_ids: Optional[Iterable[int]] = None):
+        """Publish the version of these devices, or of every device when device_ids is None."""
+        with self.engine.connect() as conn:
+            versions = device_versions(conn, device_ids)
+        published = errors = 0
+        for farm_id, device_uid, version in versions.values():
+            try:
+                self.publish_retained(version_topic(farm_id, device_uid), json.dumps({"version": version}))
+                published += 1
+            except Exception as e:
+                print(f"[EXECUTOR][ERROR] Failed to publish schedule version for device {device_uid}: {e}")
+                errors += 1
+        with self._lock:
+            self.versions_published += published
+            self.publish_errors += errors
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"versions_published": self.versions_published, "publish_errors": self.publish_errors}
+
+
+class ScheduleSyncResponder:
+    """Answers agents' schedule sync requests from a background thread, off the MQTT loop.
+
+    Requests are coalesced per device while queued: a device asking twice
+    before it is answered gets one reply, computed from the older of the two
+    versions.
+    """
+
+    def __init__(self, engine, device_registry, maxsize: int = 10000):
+        self.engine = engine
+        self.device_registry = device_registry
+        self.maxsize = maxsize
+        self.publish: Optional[Callable[[str, str], None]] = None
+        self._pending: Dict[str, Tuple[str, Optional[int]]] = {}  # device_uid -> (farm_id, since)
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # Counters
+        self.requests_received = 0
+        self.requests_coalesced = 0
+        self.requests_dropped = 0
+        self.replies_sent = 0
+        self.full_syncs = 0
+        self.rows_sent = 0
+        self.errors = 0
+
+    def attach(self, publish: Callable[[str, str], None]):
+        """Set how replies are published (the worker's MQTT client)."""
+        self.publish = publish
+
+    def submit(self, farm_id: str, device_uid: str, payload) -> bool:
+        """Queue a sync request. Returns False if it was malformed or the queue is full."""
+        try:
+            since = json.loads(payload).get("since")
+            since = int(since) if since is not None else None
+        except (ValueError, TypeError, AttributeError):
+            print(f"[WORKER][WARN] Bad schedule sync request from {device_uid}: {payload!r}")
+            return False
+        with self._lock:
+            self.requests_received += 1
+            if device_uid in self._pending:
+                self.requests_coalesced += 1
+                _, queued_since = self._pending[device_uid]
+                if queued_since is not None and (since is None or since < queued_since):
+                    self._pending[device_uid] = (farm_id, since)
+                return True
+            if len(self._pending) >= self.maxsize:
+                self.requests_dropped += 1
+                return False
+            self._pending[device_uid] = (farm_id, since)
+        self._queue.put(device_uid)
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="schedule-sync-responder", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            device_uid = self._queue.get()
+            if device_uid is None:
+                continue
+            with self._lock:
+                farm_id, since = self._pending.pop(device_uid)
+            try:
+                self.reply(farm_id, device_uid, since)
+            except Exception as e:
+                print(f"[WORKER][ERROR] Schedule sync for device {device_uid} failed: {e}")
+                with self._lock:
+                    self.errors += 1
+
+    def reply(self, farm_id: str, device_uid: str, since: Optional[int]):
+        device = self.device_registry.lookup(device_uid)
+        if device is None or self.publish is None:
+            return
+        with self.engine.connect() as conn:
+            delta = device_schedule_delta(conn, device.id, since)
+        self.publish(schedules_topic(farm_id, device_uid), json.dumps(delta))
+        with self._lock:
+            self.replies_sent += 1
+            self.full_syncs += delta["full"]
+            self.rows_sent += len(delta["schedules"]) + len(delta["deleted"])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests_received": self.requests_received,
+                "requests_coalesced": self.requests_coalesced,
+                "requests_dropped": self.requests_dropped,
+                "replies_sent": self.replies_sent,
+                "full_syncs": self.full_syncs,
+                "rows_sent": self.rows_sent,
+                "errors": self.errors,
+                "pending": len(self._pending),
+            }
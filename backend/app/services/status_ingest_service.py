@@ -0,0 +1,164 @@
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, or_
+
+from app.models.device import Device
+
+# Statuses a device row can hold; agents report the first and the broker's LWT the second
+DEVICE_STATUSES = ("online", "offline", "error")
+
+
+def normalize_status(status) -> Optional[str]:
+    """A reported status as stored on the device row, or None if it isn't one of DEVICE_STATUSES."""
+    if not isinstance(status, str):
+        return None
+    status = status.strip().lower()
+    return status if status in DEVICE_STATUSES else None
+
+
+class StatusIngestBuffer:
+    """Bounded queue of decoded status messages, flushed to the DB in coalesced batches.
+
+    Only the latest status per device is kept within a flush window, and each
+    window is written with a single executemany UPDATE keyed on the primary key,
+    which skips devices whose stored last_seen is already newer.
+    Each status carries the device's offline deadline (None for devices that
+    don't announce a heartbeat interval).
+    """
+
+    def __init__(self, engine, flush_interval: float = 1.0, batch_size: int = 500, maxsize: int = 10000):
+        self.engine = engine
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[Tuple[int, str, datetime, Optional[datetime]]]" = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+        # Counters
+        self.messages_received = 0
+        self.messages_dropped = 0
+        self.rows_written = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def submit(self, device_id: int, status: str, last_seen: datetime, offline_after: Optional[datetime] = None) -> bool:
+        """Queue a status update. Returns False if the queue is full and the message was dropped.
+
+        status must already be normalized (see normalize_status): one bad
+        value would fail the UPDATE for every device in its flush window.
+        """
+        try:
+            self._queue.put_nowait((device_id, status, last_seen, offline_after))
+        except queue.Full:
+            with self._lock:
+                self.messages_dropped += 1
+            return False
+        with self._lock:
+            self.messages_received += 1
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="status-ingest-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            pending = self._collect_window()
+            if pending:
+                self.flush(pending)
+        # Drain whatever is left on shutdown
+        while True:
+            pending = self._collect_window(block=False)
+            if not pending:
+                break
+            self.flush(pending)
+
+    def _collect_window(self, block: bool = True) -> Dict[int, Tuple[str, datetime, Optional[datetime]]]:
+        """Collect messages until the flush interval elapses or batch_size distinct devices are pending."""
+        pending: Dict[int, Tuple[str, datetime, Optional[datetime]]] = {}
+        deadline = time.monotonic() + self.flush_interval
+        while len(pending) < self.batch_size:
+            try:
+                if block:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    device_id, status, last_seen, offline_after = self._queue.get(timeout=remaining)
+                else:
+                    device_id, status, last_seen, offline_after = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            current = pending.get(device_id)
+            # Keep the newest status per device, even if messages arrive out of order
+            if current is None or last_seen >= current[1]:
+                pending[device_id] = (status, last_seen, offline_after)
+        return pending
+
+    def flush(self, pending: Dict[int, Tuple[str, datetime, Optional[datetime]]]):
+        devices = Device.__table__
+        stmt = (
+            devices.update()
+            .where(and_(
+                devices.c.id == bindparam("b_id"),
+                devices.c.is_deleted == False,
+                # Another replica may already have written a newer status (e.g. an
+                # online heartbeat that overtook the broker's LWT offline)
+                or_(devices.c.last_seen.is_(None), devices.c.last_seen <= bindparam("b_last_seen")),
+            ))
+            # Heartbeats are not edits: leave updated_at alone so the device registry
+            # only re-reads rows whose metadata actually changed.
+            .values(
+                status=bindparam("b_status"),
+                last_seen=bindparam("b_last_seen"),
+                offline_after=bindparam("b_offline_after"),
+                updated_at=devices.c.updated_at,
+            )
+        )
+        params = [
+            {"b_id": device_id, "b_status": status, "b_last_seen": last_seen, "b_offline_after": offline_after}
+            for device_id, (status, last_seen, offline_after) in pending.items()
+        ]
+        started = time.perf_counter()
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(stmt, params)
+        except Exception as e:
+            print(f"[WORKER][ERROR] Status flush of {len(params)} devices failed: {e}")
+            with self._lock:
+                self.flush_errors += 1
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.flushes += 1
+            self.rows_written += len(params)
+            self.last_flush_ms = elapsed_ms
+            self.total_flush_ms += elapsed_ms
+
+    def stats(self) -> dict:
+        with self._lock:
+            uptime = max(time.monotonic() - self._started_at, 1e-9)
+            return {
+                "messages_received": self.messages_received,
+                "messages_dropped": self.messages_dropped,
+                "messages_per_sec": self.messages_received / uptime,
+                "queue_depth": self._queue.qsize(),
+                "flushes": self.flushes,
+                "flush_errors": self.flush_errors,
+                "rows_written": self.rows_written,
+                "last_flush_ms": self.last_flush_ms,
+                "avg_flush_ms": self.total_flush_ms / self.flushes if self.flushes else 0.0,
+                # messages per row written; > 1 means heartbeats were coalesced
+                "coalescing_ratio": self.messages_received / self.rows_written if self.rows_written else 0.0,
+            }
@@ -0,0 +1,312 @@
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import delete, func, literal, select, text
+
+from app.models.telemetry import DeviceTelemetry, DeviceTelemetryHourly, DeviceTelemetryLateHour
+
+TELEMETRY_KINDS = ("status", "log", "event")
+
+# Marks an hour for re-rollup; the hour may already be marked, by this or another replica
+_MARK_LATE_HOURS = (
+    DeviceTelemetryLateHour.__table__.insert()
+    .prefix_with("IGNORE", dialect="mysql")
+    .prefix_with("OR IGNORE", dialect="sqlite")
+)
+
+
+def hour_of(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+class TelemetryBuffer:
+    """Bounded in-memory buffer of telemetry rows, bulk-inserted in batches.
+
+    Rows are appended from the MQTT handlers and written by a background
+    flusher with one executemany INSERT per batch (pymysql turns that into a
+    multi-row INSERT). Rows for an hour that has already ended mark that hour
+    in device_telemetry_late_hours, in the same transaction, so its rollup is
+    recomputed.
+    """
+
+    def __init__(self, engine, flush_interval: float = 1.0, batch_size: int = 1000, maxsize: int = 50000):
+        self.engine = engine
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # Counters
+        self.rows_received = 0
+        self.rows_dropped = 0
+        self.rows_written = 0
+        self.late_rows = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.total_flush_ms = 0.0
+
+    def append(self, device_id: int, farm_id: int, kind: str, ts: datetime,
+               code: Optional[str] = None, message: Optional[str] = None, data: Optional[str] = None) -> bool:
+        row = {
+            "device_id": device_id,
+            "farm_id": farm_id,
+            "kind": kind,
+            "code": code,
+            "message": message[:1000] if message else message,
+            "data": data,
+            "ts": ts,
+        }
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.rows_dropped += 1
+            return False
+        with self._lock:
+            self.rows_received += 1
+        return True
+
+    def extend(self, rows: List[dict]) -> int:
+        """Queue rows built like append()'s (e.g. a whole agent batch). Returns how many were dropped."""
+        accepted = 0
+        for row in rows:
+            if row["message"]:
+                row["message"] = row["message"][:1000]
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                break
+            accepted += 1
+        dropped = len(rows) - accepted
+        with self._lock:
+            self.rows_received += accepted
+            self.rows_dropped += dropped
+        return dropped
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="telemetry-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self.flush(batch)
+        while True:
+            batch = self._collect_batch(block=False)
+            if not batch:
+                break
+            self.flush(batch)
+
+    def _collect_batch(self, block: bool = True) -> List[dict]:
+        batch: List[dict] = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                if block:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self, batch: List[dict]):
+        started = time.perf_counter()
+        current_hour = hour_of(datetime.utcnow())
+        late_hours = {hour_of(row["ts"]) for row in batch if row["ts"] < current_hour}
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(DeviceTelemetry.__table__.insert(), batch)
+                if late_hours:
+                    conn.execute(_MARK_LATE_HOURS, [{"hour": hour} for hour in late_hours])
+        except Exception as e:
+            print(f"[WORKER][ERROR] Telemetry flush of {len(batch)} rows failed: {e}")
+            with self._lock:
+                self.flush_errors += 1
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.flushes += 1
+            self.rows_written += len(batch)
+            if late_hours:
+                self.late_rows += sum(1 for row in batch if row["ts"] < current_hour)
+            self.total_flush_ms += elapsed_ms
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rows_received": self.rows_received,
+                "rows_dropped": self.rows_dropped,
+                "rows_written": self.rows_written,
+                "late_rows": self.late_rows,
+                "queue_depth": self._queue.qsize(),
+                "flushes": self.flushes,
+                "flush_errors": self.flush_errors,
+                "avg_flush_ms": self.total_flush_ms / self.flushes if self.flushes else 0.0,
+            }
+
+
+# Partition and retention maintenance
+
+def partition_name(day: datetime) -> str:
+    return f"p{day:%Y%m%d}"
+
+
+def ensure_partitions(engine, days_ahead: int, now: Optional[datetime] = None):
+    """Create daily partitions up to days_ahead by splitting the catch-all pmax partition (MySQL only)."""
+    if engine.dialect.name != "mysql":
+        return
+    today = (now or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+    with engine.begin() as conn:
+        existing = {
+            row[0] for row in conn.execute(text(
+                "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'device_telemetry' AND PARTITION_NAME IS NOT NULL"
+            ))
+        }
+        latest = max((name for name in existing if name != "pmax"), default=None)
+        missing = []
+        for offset in range(days_ahead + 1):
+            day = today + timedelta(days=offset)
+            name = partition_name(day)
+            # Partitions must stay in ascending order, so only append after the latest one
+            if name not in existing and (latest is None or name > latest):
+                missing.append(
+                    f"PARTITION {name} VALUES LESS THAN (TO_DAYS('{(day + timedelta(days=1)):%Y-%m-%d}'))"
+                )
+        if missing:
+            conn.execute(text(
+                f"ALTER TABLE device_telemetry REORGANIZE PARTITION pmax INTO "
+                f"({', '.join(missing)}, PARTITION pmax VALUES LESS THAN MAXVALUE)"
+            ))
+
+
+def drop_expired_telemetry(engine, retention_days: int, now: Optional[datetime] = None) -> int:
+    """Drop raw telemetry older than retention_days. On MySQL whole daily partitions are dropped."""
+    cutoff = (now or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=retention_days)
+    if engine.dialect.name != "mysql":
+        with engine.begin() as conn:
+            return conn.execute(delete(DeviceTelemetry.__table__).where(DeviceTelemetry.ts < cutoff)).rowcount
+    expired_before = partition_name(cutoff)
+    with engine.begin() as conn:
+        expired = [
+            row[0] for row in conn.execute(text(
+                "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'device_telemetry' AND PARTITION_NAME IS NOT NULL"
+            ))
+            if row[0] != "pmax" and row[0] < expired_before
+        ]
+        if expired:
+            conn.execute(text(f"ALTER TABLE device_telemetry DROP PARTITION {', '.join(expired)}"))
+    return len(expired)
+
+
+def rollup_hour(engine, hour: datetime):
+    """(Re)compute the hourly downsample for one hour. Idempotent, so late rows can be re-rolled."""
+    with engine.begin() as conn:
+        _rollup_hour(conn, hour)
+
+
+def _rollup_hour(conn, hour: datetime):
+    hour = hour_of(hour)
+    raw = DeviceTelemetry.__table__
+    hourly = DeviceTelemetryHourly.__table__
+    source = (
+        select(
+            raw.c.device_id,
+            raw.c.farm_id,
+            raw.c.kind,
+            raw.c.code,
+            literal(hour, hourly.c.hour.type),
+            func.count(),
+            func.min(raw.c.ts),
+            func.max(raw.c.ts),
+        )
+        .where(raw.c.ts >= hour, raw.c.ts < hour + timedelta(hours=1))
+        .group_by(raw.c.device_id, raw.c.farm_id, raw.c.kind, raw.c.code)
+    )
+    conn.execute(delete(hourly).where(hourly.c.hour == hour))
+    conn.execute(hourly.insert().from_select(
+        ["device_id", "farm_id", "kind", "code", "hour", "message_count", "first_ts", "last_ts"], source
+    ))
+
+
+def rollup_late_hours(engine, before: datetime, raw_since: datetime) -> List[datetime]:
+    """Re-roll the hours before `before` that TelemetryBuffer marked as late. Returns them.
+
+    Hours before raw_since only lose their mark: their raw rows have expired,
+    so re-rolling would throw away the existing rollup.
+    """
+    late = DeviceTelemetryLateHour.__table__
+    with engine.connect() as conn:
+        hours = [row[0] for row in conn.execute(select(late.c.hour).where(late.c.hour < before).order_by(late.c.hour))]
+    for hour in hours:
+        with engine.begin() as conn:
+            # Cleared in the rollup's transaction: rows inserted after it mark the hour again
+            conn.execute(delete(late).where(late.c.hour == hour))
+            if hour >= raw_since:
+                _rollup_hour(conn, hour)
+    return hours
+
+
+def drop_expired_rollups(engine, retention_days: int, now: Optional[datetime] = None) -> int:
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    hourly = DeviceTelemetryHourly.__table__
+    with engine.begin() as conn:
+        return conn.execute(delete(hourly).where(hourly.c.hour < cutoff)).rowcount
+
+
+def run_telemetry_maintenance(engine, days_ahead: int, raw_retention_days: int, rollup_retention_days: int,
+                              rollup_hours: int = 2, now: Optional[datetime] = None):
+    """Create upcoming partitions, roll up the last few complete hours and any hours that
+    received late rows, and apply retention."""
+    now = now or datetime.utcnow()
+    ensure_partitions(engine, days_ahead, now)
+    current_hour = hour_of(now)
+    raw_since = current_hour.replace(hour=0) - timedelta(days=raw_retention_days)
+    rolled = set(rollup_late_hours(engine, current_hour, raw_since))
+    for offset in range(rollup_hours, 0, -1):
+        hour = current_hour - timedelta(hours=offset)
+        if hour not in rolled:
+            rollup_hour(engine, hour)
+    drop_expired_telemetry(engine, raw_retention_days, now)
+    drop_expired_rollups(engine, rollup_retention_days, now)
+
+
+# Range reads; both filters are served by the (device_id, ts) / (farm_id, ts) indexes
+
+def query_telemetry(db, start: datetime, end: datetime, device_id: Optional[int] = None, farm_id: Optional[int] = None,
+                    kind: Optional[str] = None, limit: int = 1000) -> List[DeviceTelemetry]:
+    q = db.query(DeviceTelemetry)
+    if device_id is not None:
+        q = q.filter(DeviceTelemetry.device_id == device_id)
+    if farm_id is not None:
+        q = q.filter(DeviceTelemetry.farm_id == farm_id)
+    if kind is not None:
+        q = q.filter(DeviceTelemetry.kind == kind)
+    return q.filter(DeviceTelemetry.ts >= start, DeviceTelemetry.ts < end).order_by(DeviceTelemetry.ts).limit(limit).all()
+
+
+def query_telemetry_hourly(db, start: datetime, end: datetime, device_id: Optional[int] = None, farm_id: Optional[int] = None,
+                           kind: Optional[str] = None, limit: int = 1000) -> List[DeviceTelemetryHourly]:
+    q = db.query(DeviceTelemetryHourly)
+    if device_id is not None:
+        q = q.filter(DeviceTelemetryHourly.device_id == device_id)
+    if farm_id is not None:
+        q = q.filter(DeviceTelemetryHourly.farm_id == farm_id)
+    if kind is not None:
+        q = q.filter(DeviceTelemetryHourly.kind == kind)
+    return q.filter(DeviceTelemetryHourly.hour >= start, DeviceTelemetryHourly.hour < end).order_by(DeviceTelemetryHourly.hour).limit(limit).all()
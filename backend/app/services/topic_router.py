@@ -0,0 +1,160 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+AsyncHandler = Callable[[List[str], bytes], Awaitable[None]]
+
+
+class Route:
+    """A registered topic pattern with its own bounded queue and worker pool.
+
+    A durable route's messages are never dropped: when its queue is full the
+    dispatcher waits for room instead.
+    """
+
+    def __init__(self, name: str, pattern: str, handler: AsyncHandler, concurrency: int = 1, queue_size: int = 1000,
+                 durable: bool = False):
+        self.name = name
+        self.pattern = pattern
+        self.handler = handler
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.durable = durable
+        self.queue: Optional[asyncio.Queue] = None
+        # Counters
+        self.received = 0
+        self.dropped = 0
+        self.waits = 0  # Times a durable route's full queue held up the read loop
+        self.handled = 0
+        self.errors = 0
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "dropped": self.dropped,
+            "waits": self.waits,
+            "handled": self.handled,
+            "errors": self.errors,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+        }
+
+
+class _Node:
+    __slots__ = ("children", "route")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.route: Optional[Route] = None
+
+
+class TopicRouter:
+    """Segment trie of MQTT topic patterns supporting the single-level '+' wildcard.
+
+    A topic is matched with one split('/') and a walk down the trie; the values
+    captured by each '+' are passed to the handler in order.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self.routes: List[Route] = []
+
+    def add(self, name: str, pattern: str, handler: AsyncHandler, concurrency: int = 1, queue_size: int = 1000,
+            durable: bool = False) -> Route:
+        node = self._root
+        for segment in pattern.split("/"):
+            node = node.children.setdefault(segment, _Node())
+        if node.route is not None:
+            raise ValueError(f"Topic pattern already registered: {pattern}")
+        route = Route(name, pattern, handler, concurrency, queue_size, durable)
+        node.route = route
+        self.routes.append(route)
+        return route
+
+    def route(self, name: str, pattern: str, concurrency: int = 1, queue_size: int = 1000, durable: bool = False):
+        """Decorator form of add()."""
+        def decorator(handler: AsyncHandler) -> AsyncHandler:
+            self.add(name, pattern, handler, concurrency, queue_size, durable)
+            return handler
+        return decorator
+
+    def match(self, topic: str) -> Optional[Tuple[Route, List[str]]]:
+        return self._match(self._root, topic.split("/"), 0, [])
+
+    def _match(self, node: _Node, segments: List[str], index: int, params: List[str]) -> Optional[Tuple[Route, List[str]]]:
+        if index == len(segments):
+            return (node.route, params) if node.route is not None else None
+        segment = segments[index]
+        child = node.children.get(segment)
+        if child is not None:
+            found = self._match(child, segments, index + 1, params)
+            if found is not None:
+                return found
+        child = node.children.get("+")
+        if child is not None:
+            return self._match(child, segments, index + 1, params + [segment])
+        return None
+
+
+class AsyncTopicDispatcher:
+    """Feeds matched messages to per-route asyncio queues drained by per-route workers.
+
+    Each route has its own concurrency limit and bounded queue. When a
+    durable route's queue is full, dispatch() waits for room, slowing the MQTT
+    read loop: those messages are already acknowledged to the publisher, so
+    dropping them would lose them for good. Other routes (e.g. status
+    heartbeats, which the next one supersedes) drop and count their messages
+    instead of stalling the loop. Handler exceptions are logged and counted
+    without affecting other messages or routes.
+    """
+
+    def __init__(self, router: TopicRouter):
+        self.router = router
+        self.unmatched = 0
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        for route in self.router.routes:
+            route.queue = asyncio.Queue(maxsize=route.queue_size)
+            for i in range(route.concurrency):
+                self._tasks.append(asyncio.create_task(self._worker(route), name=f"mqtt-{route.name}-{i}"))
+
+    async def stop(self, drain: bool = True):
+        if drain:
+            for route in self.router.routes:
+                if route.queue is not None:
+                    await route.queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def dispatch(self, topic: str, payload: bytes) -> bool:
+        found = self.router.match(topic)
+        if found is None:
+            self.unmatched += 1
+            return False
+        route, params = found
+        route.received += 1
+        try:
+            route.queue.put_nowait((params, payload))
+        except asyncio.QueueFull:
+            if not route.durable:
+                route.dropped += 1
+                return False
+            route.waits += 1
+            await route.queue.put((params, payload))
+        return True
+
+    async def _worker(self, route: Route):
+        while True:
+            params, payload = await route.queue.get()
+            try:
+                await route.handler(params, payload)
+                route.handled += 1
+            except Exception as e:
+                route.errors += 1
+                print(f"[WORKER][ERROR] {route.name} handler failed: {e}")
+            finally:
+                route.queue.task_done()
+
+    def stats(self) -> dict:
+        return {route.name: route.stats() for route in self.router.routes}
@@ -0,0 +1,91 @@
+import zlib
+from typing import Optional
+
+from sqlalchemy import text
+
+
+def shared_topic(topic: str, group: Optional[str]) -> str:
+    """Wrap a subscription in an MQTT shared subscription so the broker load-balances it across the group."""
+    if not group:
+        return topic
+    return f"$share/{group}/{topic}"
+
+
+def farm_partition(farm_id: str, partition_count: int) -> int:
+    """Deterministic partition for a farm; crc32 is stable across processes, unlike hash()."""
+    return zlib.crc32(str(farm_id).encode()) % partition_count
+
+
+def owns_farm(farm_id: str, partition_index: int, partition_count: int) -> bool:
+    if partition_count <= 1:
+        return True
+    return farm_partition(farm_id, partition_count) == partition_index
+
+
+def farm_id_from_topic(topic: str) -> Optional[str]:
+    """Extract the farm segment from farm/{farm_id}/device/..."""
+    parts = topic.split("/", 2)
+    if len(parts) < 2 or parts[0] != "farm":
+        return None
+    return parts[1]
+
+
+class LeaderLock:
+    """Leader election through a MySQL named lock (GET_LOCK).
+
+    The lock is held by a dedicated connection for as long as this process is
+    leader; MySQL releases it automatically if the connection or process dies,
+    letting another replica take over on its next acquire(). Other dialects
+    have no named locks, so every process is leader (single-replica setups).
+    """
+
+    def __init__(self, engine, name: str):
+        self.engine = engine
+        self.name = name
+        self._conn = None
+
+    @property
+    def supported(self) -> bool:
+        return self.engine.dialect.name == "mysql"
+
+    def acquire(self) -> bool:
+        """Try to become (or confirm we still are) leader without blocking."""
+        if not self.supported:
+            return True
+        try:
+            if self._conn is not None:
+                held = self._conn.execute(
+                    text("SELECT IS_USED_LOCK(:name) = CONNECTION_ID()"), {"name": self.name}
+                ).scalar()
+                self._conn.commit()
+                if held:
+                    return True
+                self._close()
+            self._conn = self.engine.connect()
+            acquired = self._conn.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": self.name}).scalar()
+            self._conn.commit()
+            if acquired == 1:
+                return True
+        except Exception as e:
+            print(f"[WORKER][ERROR] Leader lock {self.name} check failed: {e}")
+        self._close()
+        return False
+
+    def release(self):
+        if self._conn is not None:
+            try:
+                self._conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": self.name})
+            except Exception:
+                pass
+        self._close()
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                # Drop the DBAPI connection rather than returning it to the pool,
+                # so a lock it may still hold can never leak into another checkout
+                self._conn.invalidate()
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
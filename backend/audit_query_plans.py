@@ -0,0 +1,169 @@
+"""Audit the query plans of the SQL the API issues.
+
+Seeds a throwaway SQLite database, drives a representative set of API requests
+in-process as a super admin and as a tenant admin (reads, then writes), and
+EXPLAINs every distinct filtered statement they issued. Full table scans are
+listed and the script exits 1 on any that aren't a bounded keyset list page, so
+it can gate CI against index regressions:
+
+    python audit_query_plans.py --farms 50
+
+To check the real planner, point it at a migrated MySQL copy with production-
+sized data instead; only the read requests run there:
+
+    python audit_query_plans.py --database-url mysql+pymysql://... \\
+        --super-admin admin --tenant-admin acme-admin
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# Tables small enough that a scan is the right plan
+IGNORE_TABLES = ["peripheral_types", "tenants", "alembic_version"]
+
+
+def seed(path: str, farms: int):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from app.models.device import Device, DeviceGpioPin
+    from app.models.peripheral import PeripheralMapping, PeripheralType
+    from app.models.schedule import Schedule
+    from app.models.section import Section
+    from app.models.telemetry import DeviceTelemetry
+    from app.models.user import User
+    from app.models.watering_log import WateringLog
+    from load_test_api_db import seed as seed_farms
+
+    seed_farms(path, farms)
+    engine = create_engine(f"sqlite:///{path}")
+    now = datetime.utcnow()
+    with Session(engine) as db:
+        db.add(User(username="audit-tenant-admin", email="audit@example.com", password_hash="-", role="tenant_admin", tenant_id=1))
+        db.add(PeripheralType(id=2, name="Valve", scope="section", exclusive_schedule=True))
+        db.flush()
+        sections = {s.farm_id: s.id for s in db.query(Section)}
+        for device in db.query(Device):
+            device.available_gpio_pins = "4,5,6,7"
+            db.add_all(DeviceGpioPin(device_id=device.id, gpio_pin=pin) for pin in (4, 5, 6, 7))
+            mapping = PeripheralMapping(device_id=device.id, section_id=sections[device.farm_id], peripheral_type_id=2, gpio_pin=5)
+            db.add(mapping)
+            db.flush()
+            schedule = Schedule(peripheral_mapping_id=mapping.id, cron_expression="0 5 * * *", duration_minutes=10)
+            db.add(schedule)
+            db.flush()
+            db.add(WateringLog(schedule_id=schedule.id, device_id=device.id, section_id=mapping.section_id,
+                               start_time=now - timedelta(hours=2), end_time=now - timedelta(hours=1), status="completed"))
+            db.add(DeviceTelemetry(device_id=device.id, farm_id=device.farm_id, kind="status", code="online", ts=now - timedelta(minutes=5)))
+        db.commit()
+    engine.dispose()
+
+
+def read_requests(farm_id, section_id, device_id, mapping_id, device_uid):
+    return [
+        ("GET", "/api/v1/farms/?name=Farm", None),
+        ("GET", f"/api/v1/farms/{farm_id}", None),
+        ("GET", "/api/v1/sections/", None),
+        ("GET", f"/api/v1/sections/?farm_id={farm_id}", None),
+        ("GET", f"/api/v1/sections/farm/{farm_id}", None),
+        ("GET", f"/api/v1/sections/{section_id}", None),
+        ("GET", "/api/v1/devices/", None),
+        ("GET", f"/api/v1/devices/?farm_id={farm_id}", None),
+        ("GET", f"/api/v1/devices/?device_uid={device_uid}", None),
+        ("GET", "/api/v1/peripherals/types?scope=section", None),
+        ("GET", f"/api/v1/peripherals/devices/{device_id}/available-gpio-pins", None),
+        ("GET", f"/api/v1/peripherals/sections/{section_id}", None),
+        ("GET", f"/api/v1/peripherals/farms/{farm_id}", None),
+        ("GET", f"/api/v1/schedules/peripheral/{mapping_id}", None),
+        ("GET", f"/api/v1/telemetry/devices/{device_id}", None),
+        ("GET", f"/api/v1/telemetry/farms/{farm_id}", None),
+        ("GET", f"/api/v1/exports/devices?farm_id={farm_id}", None),
+        ("GET", f"/api/v1/exports/peripheral-mappings?farm_id={farm_id}", None),
+        ("GET", f"/api/v1/exports/schedules?farm_id={farm_id}", None),
+        ("GET", f"/api/v1/exports/watering-logs?farm_id={farm_id}", None),
+        ("GET", "/api/v1/tenants/", None),
+        ("GET", "/api/v1/users/?role=tenant_admin", None),
+    ]
+
+
+def write_requests(farm_id, section_id, device_id, mapping_id):
+    return [
+        ("POST", f"/api/v1/peripherals/farms/{farm_id}", {"device_id": device_id, "peripheral_type_id": 1, "gpio_pin": 6}),
+        ("POST", f"/api/v1/schedules/peripheral/{mapping_id}", {"cron_expression": "30 22 * * *", "duration_minutes": 5}),
+        ("POST", "/api/v1/sections/", {"farm_id": farm_id, "name": "Audit", "section_code": "AUD", "area": 1}),
+        ("PUT", f"/api/v1/sections/{section_id}", {"notes": "audited"}),
+        ("DELETE", f"/api/v1/sections/{section_id}", None),
+        ("DELETE", f"/api/v1/farms/{farm_id}", None),
+    ]
+
+
+def sample_ids(db):
+    from app.models.device import Device
+    from app.models.peripheral import PeripheralMapping
+    from app.models.section import Section
+
+    mapping = db.query(PeripheralMapping).filter(PeripheralMapping.section_id != None, PeripheralMapping.is_deleted == False).first()
+    section = db.query(Section).filter(Section.id == mapping.section_id).first()
+    device = db.query(Device).filter(Device.id == mapping.device_id).first()
+    return section.farm_id, section.id, device.id, mapping.id, device.device_uid
+
+
+def audit(super_admin: str, tenant_admin: str, writes: bool) -> int:
+    from fastapi.testclient import TestClient
+    from jose import jwt
+    from app.core.config import settings
+    from app.db.query_plan_audit import QueryPlanAuditor
+    from app.db.session import SessionLocal, engine
+    from app.main import app
+
+    def headers(username):
+        token = jwt.encode({"sub": username, "iat": datetime.utcnow(), "exp": datetime.utcnow() + timedelta(hours=1)},
+                           settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+        return {"Authorization": f"Bearer {token}"}
+
+    with SessionLocal() as db:
+        farm_id, section_id, device_id, mapping_id, device_uid = sample_ids(db)
+    requests = read_requests(farm_id, section_id, device_id, mapping_id, device_uid)
+    if writes:
+        requests += write_requests(farm_id, section_id, device_id, mapping_id)
+    client = TestClient(app)
+    auditor = QueryPlanAuditor(engine, ignore_tables=IGNORE_TABLES)
+    with auditor:
+        for username in [tenant_admin, super_admin]:
+            for method, url, body in requests:
+                response = client.request(method, url, json=body, headers=headers(username))
+                if response.status_code >= 500:
+                    print(f"{method} {url} as {username}: {response.status_code}", file=sys.stderr)
+    findings = auditor.findings()
+    full_scans = [f for f in findings if not f.bounded]
+    print(f"{len(requests) * 2} requests, {len(auditor.statements)} distinct filtered statements, "
+          f"{len(full_scans)} full scans, {len(findings) - len(full_scans)} bounded list-page scans")
+    for finding in sorted(findings, key=lambda f: f.bounded):
+        print(finding)
+    return 1 if full_scans else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--farms", type=int, default=50, help="Farms to seed in the throwaway SQLite database")
+    parser.add_argument("--database-url", help="Audit this existing database instead (read requests only)")
+    parser.add_argument("--super-admin", default="loadtest", help="Existing super_admin username (with --database-url)")
+    parser.add_argument("--tenant-admin", default="audit-tenant-admin", help="Existing tenant_admin username (with --database-url)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+        sys.exit(audit(args.super_admin, args.tenant_admin, writes=False))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "audit.db")
+        seed(path, args.farms)
+        # Settings are read when app modules are first imported, so set the URL before that
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+        code = audit(args.super_admin, args.tenant_admin, writes=True)
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
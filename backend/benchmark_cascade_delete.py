@@ -0,0 +1,116 @@
+"""Benchmark farm cascade soft-delete: the old per-row ORM loop vs the set-based service.
+
+Seeds a throwaway SQLite database with one farm (sections x mappings per section,
+plus farm-level mappings, each with a few schedules), deletes it both ways on
+identical copies and reports wall time and SQL statements issued:
+
+    python benchmark_cascade_delete.py --sections 200 --mappings 20 --schedules 3
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import Session
+
+from app.db.base import Base
+from app.models.farm import Farm
+from app.models.peripheral import PeripheralMapping, PeripheralType
+from app.models.schedule import Schedule
+from app.models.section import Section
+from app.models.tenant import Tenant
+from app.models.device import Device
+from app.services.cascade_delete_service import soft_delete_farm
+
+
+def seed(path: str, sections: int, mappings: int, schedules: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add_all([Tenant(id=1, name="Bench"), PeripheralType(id=1, name="Valve", scope="section")])
+        db.add(Farm(id=1, tenant_id=1, name="Farm", farm_code="F1", total_area=1, farm_owner_name="Owner"))
+        db.add(Device(id=1, farm_id=1, device_uid="device-1"))
+        db.flush()
+        mapping_id = 0
+        for section_id in range(1, sections + 2):
+            # The extra last "section" stands for the farm-level mappings
+            farm_level = section_id == sections + 1
+            if not farm_level:
+                db.add(Section(id=section_id, farm_id=1, name=f"S{section_id}", section_code=f"S{section_id}", area=1))
+            rows = []
+            for _ in range(mappings):
+                mapping_id += 1
+                rows.append(PeripheralMapping(
+                    id=mapping_id, device_id=1, peripheral_type_id=1, gpio_pin=mapping_id,
+                    farm_id=1 if farm_level else None, section_id=None if farm_level else section_id,
+                ))
+                rows.extend(Schedule(peripheral_mapping_id=mapping_id, cron_expression="0 6 * * *", duration_minutes=10)
+                            for _ in range(schedules))
+            db.add_all(rows)
+        db.commit()
+    engine.dispose()
+
+
+def legacy_delete_farm(db, farm_id: int):
+    """The previous delete_farm body: load everything, one schedule query per mapping."""
+    farm = db.query(Farm).filter(Farm.id == farm_id).first()
+    setattr(farm, "deleted", True)
+    sections = db.query(Section).filter(Section.farm_id == farm_id, Section.is_deleted == False).all()
+    for section in sections:
+        setattr(section, 'is_deleted', True)
+    peripherals = db.query(PeripheralMapping).filter(PeripheralMapping.farm_id == farm_id, PeripheralMapping.is_deleted == False).all()
+    section_ids = [section.id for section in sections]
+    if section_ids:
+        peripherals += db.query(PeripheralMapping).filter(PeripheralMapping.section_id.in_(section_ids), PeripheralMapping.is_deleted == False).all()
+    for peripheral in peripherals:
+        setattr(peripheral, 'is_deleted', True)
+        schedules = db.query(Schedule).filter(Schedule.peripheral_mapping_id == peripheral.id, Schedule.is_deleted == False).all()
+        for schedule in schedules:
+            setattr(schedule, 'is_deleted', True)
+
+
+def run(path: str, delete) -> dict:
+    engine = create_engine(f"sqlite:///{path}")
+    statements = 0
+
+    def count(*args):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    with Session(engine) as db:
+        started = time.perf_counter()
+        delete(db, 1)
+        db.commit()
+        elapsed = time.perf_counter() - started
+        remaining = sum(
+            db.execute(select(func.count()).select_from(model).where(flag == False)).scalar()
+            for model, flag in [(Section, Section.is_deleted), (PeripheralMapping, PeripheralMapping.is_deleted), (Schedule, Schedule.is_deleted)]
+        )
+    engine.dispose()
+    return {"seconds": elapsed, "statements": statements, "active_rows_left": remaining}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=200)
+    parser.add_argument("--mappings", type=int, default=20, help="Mappings per section, and farm-level mappings")
+    parser.add_argument("--schedules", type=int, default=3, help="Schedules per mapping")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        seeded = os.path.join(tmp, "seed.db")
+        seed(seeded, args.sections, args.mappings, args.schedules)
+        mappings = (args.sections + 1) * args.mappings
+        print(f"farm with {args.sections} sections, {mappings} mappings, {mappings * args.schedules} schedules")
+        for name, delete in [("legacy", legacy_delete_farm), ("set-based", soft_delete_farm)]:
+            path = os.path.join(tmp, f"{name}.db")
+            shutil.copy(seeded, path)
+            r = run(path, delete)
+            print(f"{name:<10} {r['seconds'] * 1000:9.1f} ms {r['statements']:7} statements  active rows left: {r['active_rows_left']}")
+
+
+if __name__ == "__main__":
+    main()
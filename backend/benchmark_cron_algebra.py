@@ -0,0 +1,75 @@
+"""Benchmark the exact cron overlap test in app/services/cron_algebra.py.
+
+Times windows_can_overlap() against sampling the next few croniter
+occurrences of both schedules, over random (cron, duration) pairs:
+
+    python benchmark_cron_algebra.py --pairs 2000 --samples 7
+
+tests/test_cron_algebra.py cross-checks the algebra against brute-force
+croniter enumeration.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from croniter import croniter
+
+from app.services import cron_algebra
+from app.services.cron_algebra import parse_cron, windows_can_overlap
+
+
+def sampled_overlap(cron_a, duration_a, cron_b, duration_b, samples: int) -> bool:
+    """The sampling check the exact test replaced: compare the next few windows of each schedule."""
+    now = datetime.now()
+    occurrences_a, occurrences_b = croniter(cron_a, now), croniter(cron_b, now)
+    starts_a = [occurrences_a.get_next(datetime) for _ in range(samples)]
+    starts_b = [occurrences_b.get_next(datetime) for _ in range(samples)]
+    return any(
+        max(a, b) < min(a + timedelta(minutes=duration_a), b + timedelta(minutes=duration_b))
+        for a in starts_a for b in starts_b
+    )
+
+
+def benchmark(args):
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    cron_algebra._calendar_masks()
+    print(f"calendar masks built in {(time.perf_counter() - started) * 1000:.0f} ms (once per process)")
+
+    crons = [f"{rng.randint(0, 59)} {rng.randint(0, 23)} * * {rng.randint(0, 6)}" for _ in range(200)]
+    crons += [f"{rng.randint(0, 59)} {rng.randint(0, 23)} {rng.randint(1, 28)} * *" for _ in range(200)]
+    pairs = [(rng.choice(crons), 30, rng.choice(crons), 45) for _ in range(args.pairs)]
+
+    started = time.perf_counter()
+    sampled = [sampled_overlap(*pair, samples=args.samples) for pair in pairs]
+    sampling_us = (time.perf_counter() - started) / len(pairs) * 1e6
+
+    parse_cron.cache_clear()
+    started = time.perf_counter()
+    exact = [windows_can_overlap(*pair) for pair in pairs]
+    cold_us = (time.perf_counter() - started) / len(pairs) * 1e6
+    started = time.perf_counter()
+    for pair in pairs:
+        windows_can_overlap(*pair)
+    warm_us = (time.perf_counter() - started) / len(pairs) * 1e6
+
+    missed = sum(1 for s, e in zip(sampled, exact) if e and not s)
+    print(f"{'method':<28}{'us/pair':>10}")
+    print(f"{f'croniter {args.samples}x{args.samples} sampling':<28}{sampling_us:>10.0f}")
+    print(f"{'exact (cold parse cache)':<28}{cold_us:>10.0f}")
+    print(f"{'exact (warm parse cache)':<28}{warm_us:>10.0f}")
+    print(f"overlapping pairs: {sum(exact)} exact, {missed} of them missed by sampling")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", type=int, default=2000, help="Random schedule pairs")
+    parser.add_argument("--samples", type=int, default=7, help="Occurrences per schedule for the sampling check")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    benchmark(args)
+
+
+if __name__ == "__main__":
+    main()
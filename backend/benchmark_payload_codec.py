@@ -0,0 +1,84 @@
+"""Benchmark device payload encodings: JSON with ISO timestamps vs the compact binary format.
+
+For status heartbeats, watering events, log lines and a store-and-forward
+batch of each, reports the bytes per message on the wire and the time the
+status worker spends decoding one message, timestamp parsing included:
+
+    python benchmark_payload_codec.py --messages 20000 --batch 500
+"""
+import argparse
+import json
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from app.services.payload_codec import decode_batch, decode_message, encode_batch, encode_record, parse_timestamp
+
+
+def sample_records(kind: str, count: int):
+    start = datetime(2024, 6, 1, 6, 0, 0)
+    for i in range(count):
+        timestamp = (start + timedelta(seconds=30 * i, microseconds=123456)).isoformat() + "Z"
+        if kind == "status":
+            yield {"type": "status", "status": "online", "timestamp": timestamp}
+        elif kind == "event":
+            yield {"type": "event", "event": "watering_started" if i % 2 == 0 else "watering_completed",
+                   "schedule_id": 1000 + i % 50, "peripheral_mapping_id": 200 + i % 50, "gpio_pin": 4 + i % 20,
+                   "timestamp": timestamp}
+        else:
+            yield {"type": "log", "level": "info", "message": f"Relay on GPIO {4 + i % 20} ON", "timestamp": timestamp}
+
+
+def time_decode(payloads, decode) -> float:
+    """Mean decode time in microseconds per payload."""
+    started = time.perf_counter()
+    for payload in payloads:
+        decode(payload)
+    return (time.perf_counter() - started) / len(payloads) * 1e6
+
+
+def decode_single(payload):
+    record = decode_message(payload)
+    parse_timestamp(record.get("timestamp"))
+
+
+def decode_records(payload):
+    for record in decode_batch(payload):
+        parse_timestamp(record.get("timestamp"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000, help="Single messages per kind")
+    parser.add_argument("--batch", type=int, default=500, help="Records per store-and-forward batch")
+    parser.add_argument("--batches", type=int, default=40, help="Batches per kind")
+    args = parser.parse_args()
+
+    print(f"{'payload':<16}{'format':<10}{'bytes/msg':>12}{'decode us/msg':>16}")
+    for kind in ("status", "event", "log"):
+        records = list(sample_records(kind, args.messages))
+        # Single messages leave without a "type": the topic says what they are
+        single = [{key: value for key, value in record.items() if key != "type"} for record in records]
+        encodings = {
+            "json": [json.dumps(record).encode() for record in single],
+            "compact": [encode_record(record) for record in records],
+        }
+        for name, payloads in encodings.items():
+            size = sum(map(len, payloads)) / len(payloads)
+            print(f"{kind:<16}{name:<10}{size:>12.1f}{time_decode(payloads, decode_single):>16.2f}")
+
+        records = list(sample_records(kind, args.batch * args.batches))
+        chunks = [records[i:i + args.batch] for i in range(0, len(records), args.batch)]
+        encodings = {
+            "json": [zlib.compress(b"\n".join(json.dumps(record, separators=(",", ":")).encode() for record in chunk))
+                     for chunk in chunks],
+            "compact": [encode_batch(chunk) for chunk in chunks],
+        }
+        for name, payloads in encodings.items():
+            size = sum(map(len, payloads)) / len(records)
+            per_record = time_decode(payloads, decode_records) / args.batch
+            print(f"{kind + ' batch':<16}{name:<10}{size:>12.1f}{per_record:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Load test the hot list endpoints on the sync and async DB stacks.
+
+Seeds a throwaway SQLite database, then for each API_DB_MODE starts the app in
+a fresh process (settings are read at import), adds a fixed latency to every
+SQL statement to stand in for a remote MySQL, and drives the list endpoints
+from many concurrent clients in-process over ASGI:
+
+    python load_test_api_db.py --latency-ms 100 --concurrency 200 --requests 2000
+
+Sync handlers share Starlette's threadpool (40 threads by default), so they
+top out near 40 / latency requests per second; async handlers are bounded by
+the connection pool instead (--pool-size).
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ENDPOINTS = [
+    "/api/v1/farms/",
+    "/api/v1/sections/",
+    "/api/v1/devices/",
+    "/api/v1/peripherals/types",
+    "/api/v1/sections/farm/1",
+    "/api/v1/peripherals/farms/1",
+    "/api/v1/schedules/peripheral/1",
+]
+
+
+def seed(path: str, farms: int):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from app.db.base import Base
+    from app.models.device import Device
+    from app.models.farm import Farm
+    from app.models.peripheral import PeripheralMapping, PeripheralType
+    from app.models.schedule import Schedule
+    from app.models.section import Section
+    from app.models.tenant import Tenant
+    from app.models.user import User
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(Tenant(id=1, name="Load test"))
+        db.add(User(username="loadtest", email="loadtest@example.com", password_hash="-", role="super_admin"))
+        db.add(PeripheralType(id=1, name="Pump", scope="farm"))
+        for farm_id in range(1, farms + 1):
+            db.add(Farm(id=farm_id, tenant_id=1, name=f"Farm {farm_id}", farm_code=f"F{farm_id}", total_area=10, farm_owner_name="Owner"))
+            db.add(Section(farm_id=farm_id, name=f"Section {farm_id}", section_code=f"S{farm_id}", area=1))
+            db.add(Device(id=farm_id, farm_id=farm_id, device_uid=f"device-{farm_id}", status="online"))
+            db.add(PeripheralMapping(id=farm_id, device_id=farm_id, farm_id=farm_id, peripheral_type_id=1, gpio_pin=4))
+            db.add(Schedule(peripheral_mapping_id=farm_id, cron_expression="0 6 * * *", duration_minutes=15))
+        db.commit()
+    engine.dispose()
+
+
+def add_latency(mode: str, latency: float):
+    from sqlalchemy import event
+
+    if mode == "async":
+        from sqlalchemy.util import await_only
+        from app.db.async_session import async_engine
+
+        # Runs inside SQLAlchemy's greenlet, so the wait yields to the event loop like a network round trip would
+        event.listen(async_engine.sync_engine, "before_cursor_execute", lambda *args: await_only(asyncio.sleep(latency)))
+    else:
+        from app.db.session import engine
+
+        event.listen(engine, "before_cursor_execute", lambda *args: time.sleep(latency))
+
+
+async def drive(mode: str, latency: float, concurrency: int, total: int) -> dict:
+    import httpx
+    from jose import jwt
+    from app.core.config import settings
+    from app.main import app
+
+    add_latency(mode, latency)
+    token = jwt.encode({"sub": "loadtest", "iat": datetime.utcnow(), "exp": datetime.utcnow() + timedelta(hours=1)},
+                       settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    headers = {"Authorization": f"Bearer {token}"}
+    remaining = iter(range(total))
+    latencies = []
+    errors = 0
+
+    async def client_loop(client):
+        nonlocal errors
+        for i in remaining:
+            started = time.perf_counter()
+            response = await client.get(ENDPOINTS[i % len(ENDPOINTS)], headers=headers)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+        # Warm up the principal cache and both pools
+        await client.get(ENDPOINTS[0], headers=headers)
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    if mode == "async":
+        from app.db.async_session import async_engine
+
+        # aiosqlite connection threads aren't daemons; close them so the process can exit
+        await async_engine.dispose()
+    latencies.sort()
+    return {
+        "mode": mode,
+        "requests": total,
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Added to every SQL statement")
+    parser.add_argument("--concurrency", type=int, default=200, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=2000, help="Total requests per mode")
+    parser.add_argument("--pool-size", type=int, default=200, help="DB_POOL_SIZE for both engines")
+    parser.add_argument("--farms", type=int, default=10, help="Farms (each with a section, device, mapping and schedule) to seed")
+    parser.add_argument("--modes", default="sync,async")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = asyncio.run(drive(args.worker, args.latency_ms / 1000, args.concurrency, args.requests))
+        print(json.dumps(result))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "loadtest.db")
+        seed(path, args.farms)
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{path}",
+            ASYNC_DATABASE_URL=f"sqlite+aiosqlite:///{path}",
+            DB_POOL_SIZE=str(args.pool_size),
+            DB_MAX_OVERFLOW="0",
+            LOG_LEVEL="WARNING",
+        )
+        print(f"{'mode':<6} {'requests':>8} {'errors':>6} {'seconds':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for mode in args.modes.split(","):
+            output = subprocess.run(
+                [sys.executable, __file__, "--worker", mode, "--latency-ms", str(args.latency_ms),
+                 "--concurrency", str(args.concurrency), "--requests", str(args.requests)],
+                env=dict(env, API_DB_MODE=mode), check=True, capture_output=True, text=True,
+            ).stdout
+            r = json.loads(output.strip().splitlines()[-1])
+            print(f"{r['mode']:<6} {r['requests']:>8} {r['errors']:>6} {r['seconds']:>8} {r['rps']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8}")
+
+
+if __name__ == "__main__":
+    main()
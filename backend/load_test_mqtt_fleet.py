@@ -0,0 +1,393 @@
+"""Load test the device MQTT pipeline with a simulated fleet.
+
+Runs --devices virtual agents, multiplexed over --connections MQTT clients,
+against a local broker (docker compose -f docker/docker-compose.yml up -d
+mosquitto). Each device behaves like device-agent/agent.py: it publishes its
+status on farm/{farm}/device/{uid}/status at QoS 1, JSON or compact
+(--format), announcing its heartbeat interval. Keepalives are spread over the
+first interval and jittered, and back off up to --heartbeat-max-interval.
+With --batch-interval it also uploads store-and-forward event batches.
+Disconnect storms (--storm-every) drop a fraction of the connections. Their
+devices go offline, as the broker's Last Will would report them. They come
+back after --storm-downtime and all publish at once, like the agent's
+reconnect.
+
+Unless --database-url is given, the fleet is seeded into a throwaway SQLite
+database and `python -m app.mqtt_status_worker` is started against it.
+End-to-end latency is the time from a heartbeat's publish until a poll of
+devices.last_seen (every --poll-interval) shows it. Throughput is the
+heartbeats published and reflected in the database per second, plus the
+worker's own counters when it was started here. Status timestamps are whole
+seconds, so the poll can match them in either format. Runs with the same
+arguments and --seed publish the same schedule:
+
+    python load_test_mqtt_fleet.py --devices 20000 --connections 20 --heartbeat-interval 30 --duration 120
+    python load_test_mqtt_fleet.py --devices 5000 --format compact --storm-every 30 --json
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.payload_codec import encode_batch, encode_record
+
+WORKER_STATS = re.compile(r"\[WORKER\]\[STATS\] msgs=(\d+) .*?dropped=(\d+) .*?flushes=(\d+) rows=(\d+)")
+
+# A heartbeat that hasn't shown up in devices.last_seen after this long is counted as lost
+LOST_AFTER_SECONDS = 60
+
+
+def device_uid(index: int) -> str:
+    return f"sim-{index:06d}"
+
+
+def seed(url: str, devices: int, farms: int):
+    from sqlalchemy import create_engine
+    from app.db.base import Base
+    from app.models.device import Device
+    from app.models.farm import Farm
+    from app.models.tenant import Tenant
+
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(Tenant.__table__.insert(), [{"id": 1, "name": "Fleet load test"}])
+        conn.execute(Farm.__table__.insert(), [
+            {"id": farm_id, "tenant_id": 1, "name": f"Farm {farm_id}", "farm_code": f"F{farm_id}",
+             "total_area": 10, "farm_owner_name": "Owner", "deleted": False}
+            for farm_id in range(1, farms + 1)
+        ])
+        conn.execute(Device.__table__.insert(), [
+            {"id": i + 1, "farm_id": i % farms + 1, "device_uid": device_uid(i), "status": "offline", "is_deleted": False}
+            for i in range(devices)
+        ])
+    engine.dispose()
+
+
+class LatencyTracker:
+    """Heartbeats published but not yet seen in devices.last_seen, and the latencies of those that were."""
+
+    def __init__(self):
+        self.pending: Dict[str, Deque[Tuple[datetime, float]]] = {}
+        self.latencies: List[float] = []
+        self.published = 0
+        self.lost = 0
+
+    def published_at(self, uid: str, timestamp: datetime, sent: float):
+        self.pending.setdefault(uid, deque()).append((timestamp, sent))
+        self.published += 1
+
+    def oldest_pending(self) -> Optional[datetime]:
+        oldest = [queue[0][0] for queue in self.pending.values() if queue]
+        return min(oldest) if oldest else None
+
+    def observed(self, uid: str, last_seen: datetime, now: float):
+        queue = self.pending.get(uid)
+        while queue and queue[0][0] <= last_seen:
+            self.latencies.append(now - queue.popleft()[1])
+
+    def expire(self, now: float):
+        for queue in self.pending.values():
+            while queue and now - queue[0][1] > LOST_AFTER_SECONDS:
+                queue.popleft()
+                self.lost += 1
+
+
+class Fleet:
+    def __init__(self, args, tracker: LatencyTracker):
+        self.args = args
+        self.tracker = tracker
+        self.random = random.Random(args.seed)  # Storms
+        self.farms = {device_uid(i): i % args.farms + 1 for i in range(args.devices)}
+        uids = list(self.farms)
+        self.groups = [uids[i::args.connections] for i in range(args.connections)]
+        self.storming: List[asyncio.Event] = [asyncio.Event() for _ in self.groups]
+        # One generator per connection, so its schedule doesn't depend on how the tasks interleave
+        self.randoms = [random.Random(args.seed * 1000003 + index) for index in range(len(self.groups))]
+        self.batches_published = 0
+        self.offline_published = 0
+        self.reconnects = 0
+        self.errors = 0
+
+    def jittered(self, rng: random.Random, interval: float) -> float:
+        return interval * rng.uniform(1 - self.args.jitter, 1 + self.args.jitter)
+
+    def status_payload(self, status: str, interval: float, timestamp: datetime) -> bytes:
+        record = {"status": status, "relays_on": []}
+        if status != "offline":
+            record["heartbeat_interval"] = self.args.heartbeat_max_interval or interval
+        if self.args.format == "compact":
+            return encode_record({"type": "status", **record, "timestamp": int((timestamp - datetime(1970, 1, 1)).total_seconds())})
+        return json.dumps({**record, "timestamp": timestamp.isoformat() + "Z"}).encode()
+
+    def batch_payload(self, timestamp: datetime) -> bytes:
+        records = [
+            {"type": "event", "event": "watering_completed", "schedule_id": n + 1, "peripheral_mapping_id": n + 1,
+             "gpio_pin": 4, "timestamp": timestamp.isoformat() + "Z"}
+            for n in range(self.args.batch_records)
+        ]
+        if self.args.format == "compact":
+            return encode_batch(records)
+        return zlib.compress(b"\n".join(json.dumps(record, separators=(",", ":")).encode() for record in records))
+
+    async def run_connection(self, index: int, stop: asyncio.Event):
+        import aiomqtt
+
+        uids = self.groups[index]
+        rng = self.randoms[index]
+        interval = self.args.heartbeat_interval
+        max_interval = max(self.args.heartbeat_max_interval or interval, interval)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        # (due, uid, kind, current interval): first keepalives spread over one interval, like a fleet booted over time
+        heap = [(start + rng.uniform(0, interval), uid, "status", interval) for uid in uids]
+        if self.args.batch_interval:
+            heap += [(start + rng.uniform(0, self.args.batch_interval), uid, "batch", 0.0) for uid in uids]
+        heapq.heapify(heap)
+        while not stop.is_set():
+            try:
+                async with aiomqtt.Client(
+                    self.args.broker, self.args.port, identifier=f"fleet-sim-{os.getpid()}-{index}",
+                    max_inflight_messages=self.args.inflight, keepalive=60,
+                ) as client:
+                    client.pending_calls_threshold = self.args.inflight  # Many in flight is the point here
+                    while not stop.is_set():
+                        if self.storming[index].is_set():
+                            break
+                        due = heap[0][0] if heap else loop.time() + 1
+                        wait = due - loop.time()
+                        if wait > 0:
+                            # Short naps, so a stop or a storm is noticed promptly
+                            await asyncio.sleep(min(wait, 0.5))
+                            continue
+                        publishes = []
+                        now = loop.time()
+                        while heap and heap[0][0] <= now and len(publishes) < self.args.inflight:
+                            _, uid, kind, current = heapq.heappop(heap)
+                            timestamp = datetime.utcnow().replace(microsecond=0)
+                            if kind == "status":
+                                topic = f"farm/{self.farms[uid]}/device/{uid}/status"
+                                payload = self.status_payload("online", current, timestamp)
+                                self.tracker.published_at(uid, timestamp, time.monotonic())
+                                heapq.heappush(heap, (now + self.jittered(rng, current), uid, kind, min(current * 2, max_interval)))
+                            else:
+                                topic = f"farm/{self.farms[uid]}/device/{uid}/batch"
+                                payload = self.batch_payload(timestamp)
+                                self.batches_published += 1
+                                heapq.heappush(heap, (now + self.jittered(rng, self.args.batch_interval), uid, kind, 0.0))
+                            publishes.append(client.publish(topic, payload, qos=self.args.qos))
+                        results = await asyncio.gather(*publishes, return_exceptions=True)
+                        self.errors += sum(isinstance(result, Exception) for result in results)
+                    if self.storming[index].is_set() and not stop.is_set():
+                        # What the broker would publish for each device from its Last Will
+                        timestamp = datetime.utcnow().replace(microsecond=0)
+                        await asyncio.gather(*(
+                            client.publish(f"farm/{self.farms[uid]}/device/{uid}/status",
+                                           self.status_payload("offline", interval, timestamp), qos=self.args.qos)
+                            for uid in uids
+                        ), return_exceptions=True)
+                        self.offline_published += len(uids)
+            except aiomqtt.MqttError as e:
+                print(f"[FLEET][ERROR] Connection {index}: {e}; reconnecting", file=sys.stderr)
+                self.errors += 1
+                await asyncio.sleep(1)
+                continue
+            if self.storming[index].is_set() and not stop.is_set():
+                try:
+                    await asyncio.wait_for(stop.wait(), self.args.storm_downtime)
+                except asyncio.TimeoutError:
+                    pass
+                self.storming[index].clear()
+                self.reconnects += 1
+                # Every device reports at once on reconnect and starts backing off again
+                now = loop.time()
+                heap = [(now, uid, kind, interval if kind == "status" else 0.0) for _, uid, kind, _ in heap]
+                heapq.heapify(heap)
+
+    async def storms(self, stop: asyncio.Event):
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), self.args.storm_every)
+                return
+            except asyncio.TimeoutError:
+                pass
+            count = max(1, round(len(self.groups) * self.args.storm_fraction))
+            for index in self.random.sample(range(len(self.groups)), count):
+                self.storming[index].set()
+            print(f"[FLEET] Disconnect storm: {count} of {len(self.groups)} connections", file=sys.stderr)
+
+
+async def poll_last_seen(engine, tracker: LatencyTracker, interval: float, stop: asyncio.Event):
+    from sqlalchemy import select
+    from app.models.device import Device
+
+    devices = Device.__table__
+
+    def poll(since: datetime):
+        with engine.connect() as conn:
+            return conn.execute(
+                select(devices.c.device_uid, devices.c.last_seen)
+                .where(devices.c.is_deleted == False, devices.c.last_seen >= since)
+            ).all()
+
+    while not stop.is_set():
+        since = tracker.oldest_pending()
+        if since is not None:
+            rows = await asyncio.to_thread(poll, since)
+            now = time.monotonic()
+            for uid, last_seen in rows:
+                tracker.observed(uid, last_seen, now)
+            tracker.expire(now)
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+async def run(args, database_url: str) -> dict:
+    from sqlalchemy import create_engine
+
+    tracker = LatencyTracker()
+    fleet = Fleet(args, tracker)
+    engine = create_engine(database_url)
+    stop = asyncio.Event()
+    polled = asyncio.Event()
+    tasks = [asyncio.create_task(fleet.run_connection(i, stop)) for i in range(len(fleet.groups))]
+    if args.storm_every:
+        tasks.append(asyncio.create_task(fleet.storms(stop)))
+    poller = asyncio.create_task(poll_last_seen(engine, tracker, args.poll_interval, polled))
+    started = time.monotonic()
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.monotonic() - started
+    # Keep polling while the pipeline catches up
+    await asyncio.sleep(args.drain)
+    polled.set()
+    await poller
+    engine.dispose()
+    return {
+        "devices": args.devices,
+        "connections": len(fleet.groups),
+        "format": args.format,
+        "seconds": round(elapsed, 1),
+        "heartbeats": tracker.published,
+        "heartbeats_per_sec": round(tracker.published / elapsed, 1),
+        "batches": fleet.batches_published,
+        "offline": fleet.offline_published,
+        "reconnects": fleet.reconnects,
+        "publish_errors": fleet.errors,
+        "observed": len(tracker.latencies),
+        "observed_per_sec": round(len(tracker.latencies) / elapsed, 1),
+        "unobserved": tracker.published - len(tracker.latencies),
+        "lost": tracker.lost,
+        "p50_ms": round(percentile(tracker.latencies, 0.5) * 1000, 1),
+        "p95_ms": round(percentile(tracker.latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(tracker.latencies, 0.99) * 1000, 1),
+        "max_ms": round(max(tracker.latencies, default=0.0) * 1000, 1),
+    }
+
+
+def start_worker(args, database_url: str, log_path: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        MQTT_BROKER=args.broker,
+        MQTT_PORT=str(args.port),
+        MQTT_WORKER_MODE=args.worker_mode,
+        WORKER_STATS_INTERVAL_SECONDS="5",
+    )
+    log = open(log_path, "w")
+    return subprocess.Popen([sys.executable, "-u", "-m", "app.mqtt_status_worker"], env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def worker_counters(log_path: str) -> dict:
+    """The last ingestion counters the spawned worker logged."""
+    counters = {}
+    with open(log_path) as f:
+        for line in f:
+            match = WORKER_STATS.search(line)
+            if match:
+                msgs, dropped, flushes, rows = map(int, match.groups())
+                counters = {"worker_msgs": msgs, "worker_dropped": dropped, "worker_flushes": flushes, "worker_rows": rows}
+    return counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--broker", default=settings.MQTT_BROKER)
+    parser.add_argument("--port", type=int, default=settings.MQTT_PORT)
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--farms", type=int, default=100, help="Farms the devices are spread over")
+    parser.add_argument("--connections", type=int, default=20, help="MQTT connections the devices are multiplexed over")
+    parser.add_argument("--format", choices=("json", "compact"), default="json")
+    parser.add_argument("--heartbeat-interval", type=float, default=60.0, help="Seconds between keepalives (after a change)")
+    parser.add_argument("--heartbeat-max-interval", type=float, default=0.0,
+                        help="Back off up to this many seconds; 0 keeps the interval fixed")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Random +/- fraction on every interval")
+    parser.add_argument("--batch-interval", type=float, default=0.0, help="Seconds between event batches per device; 0: none")
+    parser.add_argument("--batch-records", type=int, default=10, help="Event records per batch")
+    parser.add_argument("--storm-every", type=float, default=0.0, help="Seconds between disconnect storms; 0: none")
+    parser.add_argument("--storm-fraction", type=float, default=0.2, help="Fraction of connections each storm drops")
+    parser.add_argument("--storm-downtime", type=float, default=10.0, help="Seconds a dropped connection stays down")
+    parser.add_argument("--qos", type=int, default=1, choices=(0, 1))
+    parser.add_argument("--inflight", type=int, default=200, help="Unacknowledged publishes per connection")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to publish for")
+    parser.add_argument("--drain", type=float, default=5.0, help="Seconds to keep polling after publishing stops")
+    parser.add_argument("--poll-interval", type=float, default=0.2, help="Seconds between devices.last_seen polls")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed, for repeatable runs")
+    parser.add_argument("--database-url", help="Poll this database and don't start a worker (one must already be running)")
+    parser.add_argument("--worker-mode", choices=("threaded", "asyncio"), default=settings.mqtt_worker_mode)
+    parser.add_argument("--json", action="store_true", help="Print the result as one JSON line")
+    args = parser.parse_args()
+    args.connections = max(1, min(args.connections, args.devices))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        worker = None
+        log_path = os.path.join(tmp, "worker.log")
+        database_url = args.database_url
+        if database_url is None:
+            database_url = f"sqlite:///{os.path.join(tmp, 'fleet.db')}"
+            seed(database_url, args.devices, args.farms)
+            worker = start_worker(args, database_url, log_path)
+            time.sleep(3)  # Registry load and subscriptions
+            if worker.poll() is not None:
+                with open(log_path) as f:
+                    sys.exit(f"Worker exited:\n{f.read()}")
+        try:
+            result = asyncio.run(run(args, database_url))
+        finally:
+            if worker is not None:
+                worker.terminate()
+                worker.wait(timeout=30)
+        if worker is not None:
+            result.update(worker_counters(log_path))
+
+    if args.json:
+        print(json.dumps(result))
+        return
+    for key, value in result.items():
+        print(f"{key:<20} {value}")
+
+
+if __name__ == "__main__":
+    main()
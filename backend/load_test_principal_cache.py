@@ -0,0 +1,67 @@
+"""Load test the hot list endpoints with and without the principal cache.
+
+Without the cache every request re-reads the authenticated user from the
+database before the handler runs its own queries. With it, get_current_user
+answers from memory until PRINCIPAL_CACHE_TTL_SECONDS expires. The "off" run
+sets that TTL to 0, so every lookup misses and goes to the database, as before
+the cache existed.
+
+Each run reuses load_test_api_db.py: a throwaway SQLite database, a fixed
+latency added to every SQL statement to stand in for a remote MySQL, and
+concurrent in-process clients over ASGI:
+
+    python load_test_principal_cache.py --latency-ms 5 --concurrency 50 --requests 3000
+    python load_test_principal_cache.py --modes sync,async --latency-ms 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from load_test_api_db import seed
+
+LOAD_TEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "load_test_api_db.py")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Added to every SQL statement")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=3000, help="Total requests per run")
+    parser.add_argument("--pool-size", type=int, default=50, help="DB_POOL_SIZE for both engines")
+    parser.add_argument("--farms", type=int, default=10, help="Farms (each with a section, device, mapping and schedule) to seed")
+    parser.add_argument("--modes", default="sync", help="API_DB_MODE values to run, comma-separated")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "loadtest.db")
+        seed(path, args.farms)
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{path}",
+            ASYNC_DATABASE_URL=f"sqlite+aiosqlite:///{path}",
+            DB_POOL_SIZE=str(args.pool_size),
+            DB_MAX_OVERFLOW="0",
+            LOG_LEVEL="WARNING",
+        )
+        print(f"{'mode':<6} {'cache':<6} {'requests':>8} {'errors':>6} {'seconds':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for mode in args.modes.split(","):
+            baseline = None
+            for cache, ttl in (("off", "0"), ("on", "60")):
+                output = subprocess.run(
+                    [sys.executable, LOAD_TEST, "--worker", mode, "--latency-ms", str(args.latency_ms),
+                     "--concurrency", str(args.concurrency), "--requests", str(args.requests)],
+                    env=dict(env, API_DB_MODE=mode, PRINCIPAL_CACHE_TTL_SECONDS=ttl),
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                r = json.loads(output.strip().splitlines()[-1])
+                speedup = f"  x{r['rps'] / baseline:.2f}" if baseline else ""
+                baseline = baseline or r["rps"]
+                print(f"{r['mode']:<6} {cache:<6} {r['requests']:>8} {r['errors']:>6} {r['seconds']:>8} "
+                      f"{r['rps']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8}{speedup}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Load test the status worker's telemetry ingest path without a broker.
+
+Seeds a throwaway SQLite database with --devices devices, then feeds the
+worker's on_message a stream of status, logs and events payloads, as paho
+would deliver them. Every message goes through decoding, the device
+registry and the status/telemetry buffers. Reports how many messages per
+second the handlers accept and how many per second end up written,
+counting the final drain of both buffers.
+
+With --late-fraction, that share of messages carries a timestamp up to
+--late-hours in the past, like a late heartbeat or an agent uploading its
+backlog. Telemetry maintenance then runs once. The hourly rollups of every
+hour in the run are compared with the raw rows to check that late rows
+were re-rolled:
+
+    python load_test_telemetry_ingest.py --messages 200000 --devices 2000
+    python load_test_telemetry_ingest.py --messages 50000 --format compact --late-fraction 0.1 --late-hours 6
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+KINDS = ("status", "logs", "events")
+
+
+def device_uid(index: int) -> str:
+    return f"ingest-{index:06d}"
+
+
+def seed(url: str, devices: int, farms: int):
+    from sqlalchemy import create_engine
+    from app.db.base import Base
+    from app.models.device import Device
+    from app.models.farm import Farm
+    from app.models.tenant import Tenant
+
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(Tenant.__table__.insert(), [{"id": 1, "name": "Ingest load test"}])
+        conn.execute(Farm.__table__.insert(), [
+            {"id": farm_id, "tenant_id": 1, "name": f"Farm {farm_id}", "farm_code": f"F{farm_id}",
+             "total_area": 10, "farm_owner_name": "Owner", "deleted": False}
+            for farm_id in range(1, farms + 1)
+        ])
+        conn.execute(Device.__table__.insert(), [
+            {"id": i + 1, "farm_id": i % farms + 1, "device_uid": device_uid(i), "status": "offline", "is_deleted": False}
+            for i in range(devices)
+        ])
+    engine.dispose()
+
+
+class Message:
+    """What paho hands on_message."""
+
+    def __init__(self, topic: str, payload: bytes):
+        self.topic = topic
+        self.payload = payload
+
+
+def messages(args, now: datetime):
+    from app.services.payload_codec import encode_record
+
+    rng = random.Random(args.seed)
+    for i in range(args.messages):
+        index = rng.randrange(args.devices)
+        kind = KINDS[i % len(KINDS)]
+        ts = now - timedelta(seconds=rng.random() * 60)
+        if rng.random() < args.late_fraction:
+            ts = now - timedelta(seconds=rng.random() * args.late_hours * 3600)
+        ts = ts.replace(microsecond=0)
+        if kind == "status":
+            record = {"type": "status", "status": "online", "heartbeat_interval": 900}
+        elif kind == "logs":
+            record = {"type": "log", "level": "info", "message": f"Relay on GPIO {4 + i % 20} ON"}
+        else:
+            record = {"type": "event", "event": "watering_started", "schedule_id": i % 500, "gpio_pin": 4 + i % 20}
+        record["timestamp"] = ts.isoformat() + "Z"
+        if args.format == "compact":
+            payload = encode_record(record)
+        else:
+            del record["type"]  # The topic says what it is
+            payload = json.dumps(record).encode()
+        yield Message(f"farm/{index % args.farms + 1}/device/{device_uid(index)}/{kind}", payload)
+
+
+def check_rollups(engine, start: datetime, end: datetime) -> int:
+    """Hours in [start, end) whose rollup doesn't count the same rows as the raw table."""
+    from sqlalchemy import func, select
+    from app.models.telemetry import DeviceTelemetry, DeviceTelemetryHourly
+
+    raw, hourly = DeviceTelemetry.__table__, DeviceTelemetryHourly.__table__
+    mismatched = 0
+    hour = start.replace(minute=0, second=0, microsecond=0)
+    with engine.connect() as conn:
+        while hour < end:
+            rows = conn.execute(select(func.count()).select_from(raw).where(
+                raw.c.ts >= hour, raw.c.ts < hour + timedelta(hours=1))).scalar()
+            rolled = conn.execute(select(func.coalesce(func.sum(hourly.c.message_count), 0)).where(
+                hourly.c.hour == hour)).scalar()
+            if rows != rolled:
+                print(f"  {hour:%Y-%m-%d %H:00}: {rows} raw rows, {rolled} rolled up")
+                mismatched += 1
+            hour += timedelta(hours=1)
+    return mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--farms", type=int, default=20, help="Farms the devices are spread over")
+    parser.add_argument("--format", choices=("json", "compact"), default="json")
+    parser.add_argument("--late-fraction", type=float, default=0.0, help="Share of messages timestamped in past hours")
+    parser.add_argument("--late-hours", type=float, default=3.0, help="How far back late timestamps go")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed, for repeatable runs")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="ingest-load-"), "ingest.db")
+    url = f"sqlite:///{path}"
+    seed(url, args.devices, args.farms)
+    # The worker builds its engine and buffers from settings at import
+    os.environ["DATABASE_URL"] = url
+    os.environ.setdefault("TELEMETRY_QUEUE_MAXSIZE", str(args.messages))
+    os.environ.setdefault("STATUS_QUEUE_MAXSIZE", str(args.messages))
+    from app import mqtt_status_worker as worker
+    from app.services.telemetry_service import run_telemetry_maintenance
+
+    now = datetime.utcnow()
+    payloads = list(messages(args, now))
+    worker.device_registry.load()
+    worker.status_buffer.start()
+    worker.telemetry_buffer.start()
+
+    started = time.perf_counter()
+    for message in payloads:
+        worker.on_message(None, None, message)
+    handled = time.perf_counter() - started
+    worker.status_buffer.stop()
+    worker.telemetry_buffer.stop()
+    written = time.perf_counter() - started
+
+    telemetry = worker.telemetry_buffer.stats()
+    status = worker.status_buffer.stats()
+    print(f"{args.messages} messages ({args.format}) from {args.devices} devices")
+    print(f"handled:  {args.messages / handled:>10.0f} msgs/s")
+    print(f"written:  {args.messages / written:>10.0f} msgs/s "
+          f"(telemetry rows {telemetry['rows_written']}, dropped {telemetry['rows_dropped']}, "
+          f"avg flush {telemetry['avg_flush_ms']:.1f} ms; status rows {status['rows_written']}, "
+          f"coalescing {status['coalescing_ratio']:.1f})")
+
+    # Late rows were flushed after their hour ended; the next maintenance run re-rolls them
+    run_telemetry_maintenance(
+        worker.engine, days_ahead=0, raw_retention_days=14, rollup_retention_days=365, now=datetime.utcnow(),
+    )
+    first = now - timedelta(hours=args.late_hours if args.late_fraction else 1)
+    mismatched = check_rollups(worker.engine, first, now.replace(minute=0, second=0, microsecond=0))
+    print(f"late rows: {telemetry['late_rows']}; hourly rollups matching raw rows: "
+          f"{'all' if not mismatched else f'{mismatched} hours off'}")
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,28 @@ import time
 import json
 import argparse
 import os
-from datetime import datetime
+import random
+import sys
+from datetime import datetime, timezone
 import threading
+from schedule_store import ScheduleStore
+from local_scheduler import START, LocalScheduler, RelayBank, convert
+from telemetry_buffer import BatchUploader, SegmentBuffer, json_lines_batch
+from heartbeat import AdaptiveHeartbeat
+try:
+    import payload_codec
+except ImportError:  # Source checkout: the codec is shared with the backend and packaged by build_deb.sh
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'app', 'services'))
+    import payload_codec
 
 DEFAULT_CONFIG_PATH = '/etc/device-agent/config.json'
+DEFAULT_SCHEDULE_DB_PATH = '/var/lib/device-agent/schedules.db'
+DEFAULT_BUFFER_DIR = '/var/lib/device-agent/telemetry'
+
+def utc_timestamp(wall=None, zone=None):
+    """ISO UTC timestamp of a wall-clock time in zone (device-local if None; default now), as the backend expects."""
+    moment = convert(wall, zone, timezone.utc) if wall is not None else datetime.now(timezone.utc).replace(tzinfo=None)
+    return moment.isoformat() + 'Z'
 
 def load_config(config_path):
     if not os.path.exists(config_path):
@@ -27,47 +45,196 @@ def main():
     port = config.get('mqtt_port', 1883)
     device_id = config.get('deviceId')
     farm_id = config.get('farmId')
-    status_interval = int(config.get('status_interval', 60))  # seconds
+    status_interval = int(config.get('status_interval', 60))  # seconds, heartbeat interval right after a change
+    heartbeat_max_interval = int(config.get('heartbeat_max_interval', 900))  # seconds, announced to the backend
     if not device_id or not farm_id:
         print(f"[AGENT][ERROR] deviceId and farmId are required in config. Got deviceId={device_id}, farmId={farm_id}")
         exit(1)
     topic = f"farm/{farm_id}/device/{device_id}/status"
+    device_topic = f"farm/{farm_id}/device/{device_id}"
+    commands_topic = f"{device_topic}/commands"
+    schedules_topic = f"{device_topic}/schedules"
+    version_topic = f"{schedules_topic}/version"
+    sync_topic = f"{schedules_topic}/sync"
+    batch_topic = f"{device_topic}/batch"
+    # auto: compact once the backend advertises it; json or compact: always that
+    payload_encoding = config.get('payload_encoding', 'auto')
+    sync_interval = float(config.get('schedule_sync_interval', 3600))  # seconds, fallback when no version nudge arrives
+    sync_jitter = float(config.get('schedule_sync_jitter', 30))  # seconds, spreads a fleet's sync requests
     print(f"[AGENT] Using topic: {topic}")
-    print(f"[AGENT] Status publish interval: {status_interval} seconds")
+    print(f"[AGENT] Status heartbeat interval: {status_interval}-{heartbeat_max_interval} seconds")
 
-    client = mqtt.Client()
+    # Events go through the on-disk buffer and leave in batches; status is published directly
+    telemetry = SegmentBuffer(
+        config.get('buffer_dir', DEFAULT_BUFFER_DIR),
+        max_bytes=int(float(config.get('buffer_max_mb', 16)) * 1024 * 1024),
+    )
 
-    def publish_status():
-        payload = json.dumps({
-            "status": "online",
-            "timestamp": datetime.utcnow().isoformat() + 'Z'
+    def record_watering(action, schedule, fire_time):
+        telemetry.append({
+            "type": "event",
+            "event": "watering_started" if action == START else "watering_completed",
+            "schedule_id": schedule.id,
+            "peripheral_mapping_id": schedule.peripheral_mapping_id,
+            "gpio_pin": schedule.gpio_pin,
+            "timestamp": utc_timestamp(fire_time, scheduler.timezone),
         })
-        print(f"[AGENT] Publishing status to {topic}: {payload}")
-        client.publish(topic, payload)
+
+    client = mqtt.Client()
+
+    def publish_status(record):
+        if not client.is_connected():
+            return False  # Nothing to report while offline; the reconnect publishes the current state
+        if use_compact():
+            payload = payload_codec.encode_record({"type": "status", **record, "timestamp": utc_timestamp()})
+        else:
+            payload = json.dumps({**record, "timestamp": utc_timestamp()})
+        return client.publish(topic, payload, qos=1).rc == mqtt.MQTT_ERR_SUCCESS
+
+    # State changes go out at once; keepalives back off while nothing changes
+    heartbeat = AdaptiveHeartbeat(
+        publish_status,
+        min_interval=status_interval,
+        max_interval=heartbeat_max_interval,
+        backoff=float(config.get('heartbeat_backoff', 2)),
+    )
+
+    # Schedules run from the local store, with or without the broker
+    store = ScheduleStore(config.get('schedule_db_path', DEFAULT_SCHEDULE_DB_PATH))
+    scheduler = LocalScheduler(
+        RelayBank(active_high=bool(config.get('relay_active_high', True)), on_change=heartbeat.set_relays),
+        misfire_grace_seconds=float(config.get('misfire_grace_seconds', 60)),
+        on_run=record_watering,
+    )
+    scheduler.replace(store.load(), resume=True, timezone=store.timezone())
+    print(f"[AGENT] Loaded {len(scheduler)} schedules (version {store.version()}) from the local store")
+    threading.Thread(target=scheduler.run, daemon=True).start()
+
+    sync_timer = {"timer": None}
+    sync_lock = threading.Lock()
+
+    def send_sync_request():
+        with sync_lock:
+            sync_timer["timer"] = None
+        payload = json.dumps({"since": store.version()})
+        print(f"[AGENT] Requesting schedule sync on {sync_topic}: {payload}")
+        client.publish(sync_topic, payload, qos=1)
+
+    def request_sync():
+        # Random delay, so devices reconnecting together don't all ask at once; one request in flight
+        with sync_lock:
+            if sync_timer["timer"] is not None:
+                return
+            timer = sync_timer["timer"] = threading.Timer(random.uniform(0, sync_jitter), send_sync_request)
+            timer.daemon = True
+        timer.start()
+
+    def apply_sync(payload):
+        delta = json.loads(payload)
+        if not store.apply(delta):
+            print(f"[AGENT] Ignoring stale schedule sync (version {delta.get('version')})")
+            return
+        scheduler.replace(store.load(), timezone=store.timezone())
+        print(f"[AGENT] Schedules synced to version {delta['version']}: {len(delta.get('schedules', []))} changed, "
+              f"{len(delta.get('deleted', []))} deleted{' (full)' if delta.get('full') else ''}; {len(scheduler)} active")
+
+    def on_version(payload):
+        version = json.loads(payload).get("version")
+        local = store.version()
+        if local is None or (version is not None and int(version) > local):
+            request_sync()
+
+    def on_command(payload):
+        command = json.loads(payload)
+        if command.get("action") in ("start", "stop") and command.get("gpio_pin") is not None:
+            scheduler.command(command["action"], command.get("schedule_id"), command["gpio_pin"], command.get("duration_minutes"))
+
+    server_formats = {"formats": ()}
+
+    def on_formats(payload):
+        server_formats["formats"] = tuple(json.loads(payload).get("formats", ()))
+        print(f"[AGENT] Backend accepts payload formats: {', '.join(server_formats['formats'])}")
+
+    def use_compact():
+        if payload_encoding == 'auto':
+            return payload_codec.COMPACT_FORMAT in server_formats["formats"]
+        return payload_encoding == 'compact'
+
+    def encode_batch(lines):
+        if use_compact():
+            try:
+                return payload_codec.encode_batch(json.loads(line) for line in lines)
+            except ValueError as e:
+                print(f"[AGENT][WARN] Sending batch as JSON, compact encoding failed: {e}")
+        return json_lines_batch(lines)
+
+    def publish_batch(payload):
+        info = client.publish(batch_topic, payload, qos=1)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            return False
+        info.wait_for_publish(timeout=10)
+        return info.is_published()
+
+    uploader = BatchUploader(
+        telemetry,
+        publish_batch,
+        client.is_connected,
+        batch_records=int(config.get('upload_batch_records', 500)),
+        max_batches_per_second=float(config.get('upload_max_batches_per_second', 2)),
+        interval=float(config.get('upload_interval', 5)),
+        encode=encode_batch,
+    )
 
     def on_connect(client, userdata, flags, rc):
         print(f"[AGENT] Connected with result code {rc}")
-        client.subscribe(topic)
-        publish_status()  # Publish immediately on connect
+        client.subscribe([(commands_topic, 1), (schedules_topic, 1), (version_topic, 1),
+                          (payload_codec.FORMATS_TOPIC, 1)])
+        heartbeat.reset()
+        # The retained version message tells a synced agent whether it is behind; a new one has nothing to compare
+        if store.version() is None:
+            request_sync()
 
     def on_message(client, userdata, msg):
-        print(f"[AGENT] Received message: {msg.topic} {msg.payload.decode()}")
+        print(f"[AGENT] Received message: {msg.topic} {msg.payload.decode(errors='replace')}")
+        try:
+            if msg.topic == schedules_topic:
+                apply_sync(msg.payload)
+            elif msg.topic == version_topic:
+                on_version(msg.payload)
+            elif msg.topic == commands_topic:
+                on_command(msg.payload)
+            elif msg.topic == payload_codec.FORMATS_TOPIC:
+                on_formats(msg.payload)
+        except Exception as e:
+            print(f"[AGENT][ERROR] Failed to handle message on {msg.topic}: {e}")
 
     client.on_connect = on_connect
     client.on_message = on_message
+    # The broker publishes this when the connection drops without a clean disconnect
+    client.will_set(topic, json.dumps({"status": "offline"}), qos=1)
 
     print(f"[AGENT] Connecting to MQTT broker at {broker}:{port}...")
-    client.connect(broker, port, 60)
+    # Keep retrying in the background; schedules keep running from the local store meanwhile
+    client.connect_async(broker, port, 60)
+
+    threading.Thread(target=heartbeat.run, daemon=True).start()
 
-    # Start periodic status publishing in a background thread
-    def periodic_status():
+    # Fallback for missed version messages
+    def periodic_sync():
         while True:
-            time.sleep(status_interval)
-            publish_status()
+            time.sleep(sync_interval)
+            request_sync()
 
-    threading.Thread(target=periodic_status, daemon=True).start()
+    threading.Thread(target=periodic_sync, daemon=True).start()
+    threading.Thread(target=uploader.run, daemon=True).start()
 
-    client.loop_forever()
+    try:
+        client.loop_forever(retry_first_connection=True)
+    finally:
+        heartbeat.stop()
+        uploader.stop()
+        scheduler.stop()
+        telemetry.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
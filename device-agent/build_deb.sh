@@ -30,7 +30,9 @@ Description: IoT device agent for farm automation
 EOF
 
 # Copy agent code
-cp -r agent.py mqtt_hello.py requirements.txt "$build_dir/opt/device-agent/"
+cp -r agent.py schedule_store.py local_scheduler.py telemetry_buffer.py heartbeat.py mqtt_hello.py requirements.txt "$build_dir/opt/device-agent/"
+# Payload codec is shared with the backend's status worker
+cp ../backend/app/services/payload_codec.py "$build_dir/opt/device-agent/"
 
 # Config template (always include as example)
 cat > "$build_dir/etc/device-agent/config.json.example" <<EOF
@@ -38,7 +40,16 @@ cat > "$build_dir/etc/device-agent/config.json.example" <<EOF
   "deviceId": "REPLACE_WITH_DEVICE_ID",
   "farmId": "REPLACE_WITH_FARM_ID",
   "mqtt_broker": "REPLACE_WITH_BROKER",
-  "mqtt_port": 1883
+  "mqtt_port": 1883,
+  "status_interval": 60,
+  "heartbeat_max_interval": 900,
+  "schedule_db_path": "/var/lib/device-agent/schedules.db",
+  "schedule_sync_interval": 3600,
+  "schedule_sync_jitter": 30,
+  "buffer_dir": "/var/lib/device-agent/telemetry",
+  "buffer_max_mb": 16,
+  "upload_max_batches_per_second": 2,
+  "payload_encoding": "auto"
 }
 EOF
 
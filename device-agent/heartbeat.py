@@ -0,0 +1,100 @@
+"""Adaptive status publishing for the agent.
+
+The agent's state (online, and which relay pins are on) is published as soon
+as it changes and again whenever the agent (re)connects. While it stays the
+same, keepalive heartbeats back off: the interval starts at min_interval and
+is multiplied by backoff after each unchanged heartbeat, up to max_interval.
+Every status announces max_interval as heartbeat_interval, so the backend can
+tell how long a silent device may still be online. Going offline is reported
+by the broker through the agent's MQTT Last Will, not by a heartbeat.
+"""
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+
+class AdaptiveHeartbeat:
+    def __init__(self, publish: Callable[[dict], bool], min_interval: float = 60.0,
+                 max_interval: float = 900.0, backoff: float = 2.0):
+        self.publish = publish  # Sends a status record; False if it could not be sent (e.g. disconnected)
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.backoff = backoff
+        self.interval = min_interval
+        self._state = {"status": "online", "relays_on": []}
+        self._due = 0.0  # Monotonic time of the next publish; 0 = now
+        self._changes = 0  # Bumped by every request to publish now
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        # Counters
+        self.heartbeats = 0
+        self.transitions = 0
+        self.failures = 0
+
+    def set_relays(self, pins: Iterable[int]):
+        """Relay outputs changed: publish the new state now, and reset the backoff."""
+        pins = sorted(pins)
+        with self._lock:
+            if pins == self._state["relays_on"]:
+                return
+            self._state["relays_on"] = pins
+            self.transitions += 1
+            self._publish_soon()
+
+    def reset(self):
+        """Publish now and start backing off again, e.g. after a reconnect."""
+        with self._lock:
+            self._publish_soon()
+
+    def _publish_soon(self):
+        self.interval = self.min_interval
+        self._due = 0.0
+        self._changes += 1
+        self._wake.set()
+
+    def send_once(self, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            record = {**self._state, "relays_on": list(self._state["relays_on"]), "heartbeat_interval": self.max_interval}
+            changes = self._changes
+        try:
+            sent = self.publish(record)
+        except Exception as e:
+            print(f"[AGENT][ERROR] Status publish failed: {e}")
+            sent = False
+        with self._lock:
+            if self._changes != changes:
+                return sent  # Changed while publishing: leave the next publish due now
+            if not sent:
+                # Try again at the shortest interval; a reconnect calls reset() anyway
+                self.failures += 1
+                self._due = now + self.min_interval
+                return False
+            self.heartbeats += 1
+            self._due = now + self.interval
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        return True
+
+    def run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                wait = self._due - time.monotonic()
+            if wait > 0:
+                self._wake.wait(wait)
+                self._wake.clear()
+                continue
+            self.send_once()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "heartbeats": self.heartbeats,
+                "transitions": self.transitions,
+                "failures": self.failures,
+                "interval": self.interval,
+            }
@@ -0,0 +1,254 @@
+"""Runs this device's schedules locally: a min-heap timer loop driving relays.
+
+Each schedule has one pending start in the heap, keyed on its next cron fire
+time. Cron expressions are evaluated in the backend's SCHEDULE_TIMEZONE, which
+arrives with every schedule sync, so the device fires when the backend's
+executor would; device-local time is used until the first sync. A
+start switches the schedule's relay on and queues its stop duration_minutes
+later. Edited or removed schedules bump a version instead of being searched
+out of the heap; stale starts are dropped when they reach the top. Stops
+always run, so an edit mid-run never leaves a valve open.
+
+Schedules in the local store are run here only: a start/stop command from
+the backend's executor for one of them is ignored, so it never waters twice.
+Commands for other schedules (e.g. not synced yet) switch the relay directly.
+"""
+import heapq
+import itertools
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from croniter import croniter
+
+from schedule_store import LocalSchedule
+
+START = "start"
+STOP = "stop"
+COMMAND_VERSION = -1  # Heap version of the safety stop queued for a backend start command
+
+
+def convert(wall: datetime, from_zone: Optional[ZoneInfo], to_zone) -> datetime:
+    """A naive wall-clock time in from_zone as naive wall-clock time in to_zone; None is device-local time."""
+    aware = wall.replace(tzinfo=from_zone) if from_zone is not None else wall.astimezone()
+    return aware.astimezone(to_zone).replace(tzinfo=None)
+
+
+class RelayBank:
+    """GPIO outputs by pin; a pin stays on while any run holding it is active."""
+
+    def __init__(self, active_high: bool = True, on_change: Optional[Callable[[List[int]], None]] = None):
+        self.active_high = active_high
+        self.on_change = on_change  # Called with the pins that are on, after each switch
+        self._outputs = {}
+        self._holders: Dict[int, Set[object]] = {}
+        self._lock = threading.Lock()
+        try:
+            from gpiozero import OutputDevice
+            self._output_device = OutputDevice
+        except Exception as e:
+            print(f"[AGENT][WARN] gpiozero unavailable ({e}); relay changes are only logged")
+            self._output_device = None
+
+    def _set(self, pin: int, on: bool):
+        print(f"[AGENT] Relay on GPIO {pin} {'ON' if on else 'OFF'}")
+        if self._output_device is not None:
+            output = self._outputs.get(pin)
+            if output is None:
+                output = self._outputs[pin] = self._output_device(pin, active_high=self.active_high, initial_value=False)
+            output.on() if on else output.off()
+        if self.on_change is not None:
+            self.on_change([p for p, holders in self._holders.items() if holders])
+
+    def hold(self, key, pin: int):
+        with self._lock:
+            holders = self._holders.setdefault(pin, set())
+            if key in holders:
+                return
+            holders.add(key)
+            if len(holders) == 1:
+                self._set(pin, True)
+
+    def release(self, key, pin: int):
+        with self._lock:
+            holders = self._holders.get(pin)
+            if not holders or key not in holders:
+                return
+            holders.discard(key)
+            if not holders:
+                self._set(pin, False)
+
+    def all_off(self):
+        with self._lock:
+            for pin, holders in self._holders.items():
+                if holders:
+                    holders.clear()
+                    self._set(pin, False)
+
+
+class LocalScheduler:
+    def __init__(self, relays: RelayBank, misfire_grace_seconds: float = 60.0,
+                 on_run: Optional[Callable[[str, LocalSchedule, datetime], None]] = None):
+        self.relays = relays
+        self.on_run = on_run  # Called with (action, schedule, fire time) for each local start and stop
+        self.misfire_grace = timedelta(seconds=misfire_grace_seconds)
+        self.timezone: Optional[ZoneInfo] = None  # Cron timezone; None until the backend sends one
+        self._heap: List[Tuple[datetime, int, str, int, int, LocalSchedule]] = []
+        self._schedules: Dict[int, Tuple[LocalSchedule, int]] = {}
+        self._versions = itertools.count()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        # Counters
+        self.starts = 0
+        self.stops = 0
+        self.misfires = 0
+
+    def __len__(self) -> int:
+        return len(self._schedules)
+
+    def now(self) -> datetime:
+        return datetime.now(self.timezone).replace(tzinfo=None)
+
+    def _set_timezone(self, name: Optional[str]):
+        """Switch cron evaluation to the named timezone. Pending stops keep their moment; every start is re-planned."""
+        if name is None or (self.timezone is not None and self.timezone.key == name):
+            return
+        try:
+            zone = ZoneInfo(name)
+        except Exception as e:
+            print(f"[AGENT][ERROR] Unknown schedule timezone '{name}': {e}")
+            return
+        print(f"[AGENT] Evaluating schedules in {name}")
+        self._heap = [
+            (convert(fire_time, self.timezone, zone), seq, action, schedule_id, version, schedule)
+            for fire_time, seq, action, schedule_id, version, schedule in self._heap
+            if action == STOP
+        ]
+        heapq.heapify(self._heap)
+        self._schedules.clear()
+        self.timezone = zone
+
+    def _push(self, fire_time: datetime, action: str, schedule: LocalSchedule, version: int):
+        heapq.heappush(self._heap, (fire_time, next(self._seq), action, schedule.id, version, schedule))
+
+    def replace(self, schedules: Iterable[LocalSchedule], now: Optional[datetime] = None, resume: bool = False,
+                timezone: Optional[str] = None):
+        """Make the heap hold exactly these schedules; unchanged ones keep their pending start.
+
+        timezone is the backend's SCHEDULE_TIMEZONE; a change re-plans every
+        schedule. With resume (agent start-up), a schedule whose latest run should still
+        be on, e.g. after a reboot mid-run, is switched on for the rest of it.
+        """
+        schedules = {schedule.id: schedule for schedule in schedules}
+        resumed = []
+        with self._lock:
+            self._set_timezone(timezone)
+            now = now or self.now()
+            for schedule_id in list(self._schedules):
+                if schedule_id not in schedules:
+                    del self._schedules[schedule_id]
+            for schedule in schedules.values():
+                current = self._schedules.get(schedule.id)
+                if current is not None and current[0] == schedule:
+                    continue
+                try:
+                    fire_time = croniter(schedule.cron_expression, now).get_next(datetime)
+                    previous = croniter(schedule.cron_expression, now).get_prev(datetime) if resume else None
+                except Exception as e:
+                    print(f"[AGENT][ERROR] Invalid cron '{schedule.cron_expression}' for schedule {schedule.id}: {e}")
+                    self._schedules.pop(schedule.id, None)
+                    continue
+                version = next(self._versions)
+                self._schedules[schedule.id] = (schedule, version)
+                self._push(fire_time, START, schedule, version)
+                end_time = previous + timedelta(minutes=schedule.duration_minutes) if previous is not None else None
+                if end_time is not None and end_time > now:
+                    print(f"[AGENT] Resuming schedule {schedule.id} started at {previous}")
+                    self._push(end_time, STOP, schedule, version)
+                    resumed.append(schedule)
+        for schedule in resumed:
+            self.relays.hold(schedule.id, schedule.gpio_pin)
+        self._wake.set()
+
+    def command(self, action: str, schedule_id: int, gpio_pin: int, duration_minutes: Optional[int] = None):
+        """A start/stop command from the backend. Starts also queue their own stop, in case the stop never arrives.
+
+        Ignored for schedules in the local store, which run from the heap.
+        """
+        with self._lock:
+            if schedule_id in self._schedules:
+                print(f"[AGENT] Ignoring backend {action} for schedule {schedule_id}; it runs from the local store")
+                return
+        schedule = LocalSchedule(schedule_id, "", int(duration_minutes or 0), int(gpio_pin), 0)
+        if action == START:
+            self.relays.hold(schedule_id, schedule.gpio_pin)
+            if duration_minutes:
+                with self._lock:
+                    self._push(self.now() + timedelta(minutes=schedule.duration_minutes), STOP, schedule, COMMAND_VERSION)
+                self._wake.set()
+        elif action == STOP:
+            self.relays.release(schedule_id, schedule.gpio_pin)
+
+    def _is_live(self, schedule_id: int, version: int) -> bool:
+        current = self._schedules.get(schedule_id)
+        return current is not None and current[1] == version
+
+    def fire_due(self, now: Optional[datetime] = None):
+        now = now or self.now()
+        with self._lock:
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                fire_time, _, action, schedule_id, version, schedule = heapq.heappop(self._heap)
+                if action == STOP:
+                    due.append((STOP, schedule, fire_time, version != COMMAND_VERSION))
+                    continue
+                if not self._is_live(schedule_id, version):
+                    continue
+                if now - fire_time > self.misfire_grace:
+                    self.misfires += 1
+                else:
+                    due.append((START, schedule, fire_time, True))
+                    self._push(fire_time + timedelta(minutes=schedule.duration_minutes), STOP, schedule, version)
+                # Skip occurrences already in the past (e.g. after the loop was held up)
+                self._push(croniter(schedule.cron_expression, max(fire_time, now)).get_next(datetime), START, schedule, version)
+        for action, schedule, fire_time, local in due:
+            if action == START:
+                self.starts += 1
+                self.relays.hold(schedule.id, schedule.gpio_pin)
+            else:
+                self.stops += 1
+                self.relays.release(schedule.id, schedule.gpio_pin)
+            if local and self.on_run is not None:
+                self.on_run(action, schedule, fire_time)
+
+    def next_fire_time(self) -> Optional[datetime]:
+        with self._lock:
+            while self._heap:
+                fire_time, _, action, schedule_id, version, _ = self._heap[0]
+                if action == STOP or self._is_live(schedule_id, version):
+                    return fire_time
+                heapq.heappop(self._heap)
+        return None
+
+    def run(self):
+        """Fire schedules until stop(); needs no network."""
+        while not self._stop.is_set():
+            self.fire_due()
+            next_fire = self.next_fire_time()
+            timeout = 60.0
+            if next_fire is not None:
+                timeout = min(timeout, (next_fire - self.now()).total_seconds())
+            self._wake.wait(max(timeout, 0))
+            self._wake.clear()
+        self.relays.all_off()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"schedules": len(self._schedules), "starts": self.starts, "stops": self.stops, "misfires": self.misfires}
@@ -0,0 +1,90 @@
+"""Local copy of this device's schedules, so they keep running without the broker.
+
+Schedules and the backend's schedule version live in one SQLite file. Sync
+messages from the backend are applied in a single transaction: a full sync
+replaces every schedule, a delta upserts the changed rows and drops deleted
+ones. The version is what the agent sends as "since" on its next sync request;
+the timezone is the one the backend evaluates cron expressions in.
+"""
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import List, Optional
+
+
+@dataclass(frozen=True)
+class LocalSchedule:
+    id: int
+    cron_expression: str
+    duration_minutes: int
+    gpio_pin: int
+    peripheral_mapping_id: int
+
+
+class ScheduleStore:
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS schedules ("
+                " id INTEGER PRIMARY KEY, cron_expression TEXT NOT NULL, duration_minutes INTEGER NOT NULL,"
+                " gpio_pin INTEGER NOT NULL, peripheral_mapping_id INTEGER NOT NULL)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def version(self) -> Optional[int]:
+        """The backend schedule version this copy reflects; None if it has never synced."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return int(row[0]) if row else None
+
+    def timezone(self) -> Optional[str]:
+        """The backend's SCHEDULE_TIMEZONE as of the last sync; None if it has never sent one."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'timezone'").fetchone()
+        return row[0] if row else None
+
+    def load(self) -> List[LocalSchedule]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, cron_expression, duration_minutes, gpio_pin, peripheral_mapping_id FROM schedules ORDER BY id"
+            ).fetchall()
+        return [LocalSchedule(*row) for row in rows]
+
+    def apply(self, delta: dict) -> bool:
+        """Apply a sync message. Returns False (and changes nothing) if it is older than this copy."""
+        version = int(delta["version"])
+        rows = [
+            (s["id"], s["cron_expression"], int(s["duration_minutes"]), int(s["gpio_pin"]), s["peripheral_mapping_id"])
+            for s in delta.get("schedules", [])
+        ]
+        deleted = [(schedule_id,) for schedule_id in delta.get("deleted", [])]
+        with self._lock:
+            current = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if current is not None and version < int(current[0]) and not delta.get("full"):
+                return False
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if delta.get("full"):
+                    self._conn.execute("DELETE FROM schedules")
+                self._conn.executemany("INSERT OR REPLACE INTO schedules VALUES (?, ?, ?, ?, ?)", rows)
+                self._conn.executemany("DELETE FROM schedules WHERE id = ?", deleted)
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(version),))
+                if delta.get("timezone"):
+                    self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('timezone', ?)", (delta["timezone"],))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
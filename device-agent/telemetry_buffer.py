@@ -0,0 +1,243 @@
+"""Store-and-forward buffer for the agent's outgoing telemetry.
+
+Events (watering results, readings) and logs are appended as JSON lines to
+segment files on disk, so nothing is lost while the broker is unreachable or
+the Pi reboots. The total size is capped; past the cap the
+oldest segment is evicted. A cursor file records the first record the backend
+has not acknowledged.
+
+BatchUploader drains the buffer as zlib-compressed multi-record payloads
+(JSON lines, or whatever its encode function makes of them) on
+farm/{farm_id}/device/{device_id}/batch, at most max_batches_per_second, and
+advances the cursor only once the broker acknowledges a batch (QoS 1).
+Delivery is at-least-once: a batch whose acknowledgement is lost is sent again.
+"""
+import json
+import os
+import threading
+import zlib
+from typing import Callable, List, Optional, Tuple
+
+SEGMENT_SUFFIX = ".seg"
+CURSOR_FILE = "cursor.json"
+
+Position = Tuple[int, int]  # (segment number, byte offset)
+
+
+class SegmentBuffer:
+    def __init__(self, directory: str, segment_bytes: int = 256 * 1024, max_bytes: int = 16 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._segments: List[int] = sorted(
+            int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory)
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()
+        )
+        if not self._segments:
+            self._segments.append(1)
+        # A crash mid-append can leave a partial last line; cut it off before appending again
+        self._truncate_partial_line(self._path(self._segments[-1]))
+        self._sizes = {segment: os.path.getsize(self._path(segment)) if os.path.exists(self._path(segment)) else 0
+                       for segment in self._segments}
+        self._writer = open(self._path(self._segments[-1]), "ab")
+        self._cursor = self._load_cursor()
+        # Segments already sent before a crash kept them from being removed
+        while self._segments[0] < self._cursor[0]:
+            os.remove(self._path(self._segments[0]))
+            del self._sizes[self._segments.pop(0)]
+        # Counters
+        self.records_appended = 0
+        self.segments_evicted = 0
+        self.bytes_evicted = 0
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:012d}{SEGMENT_SUFFIX}")
+
+    @staticmethod
+    def _truncate_partial_line(path: str):
+        if not os.path.exists(path):
+            return
+        with open(path, "rb+") as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end != len(data):
+                f.truncate(end)
+
+    def _load_cursor(self) -> Position:
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE)) as f:
+                saved = json.load(f)
+            position = (int(saved["segment"]), int(saved["offset"]))
+        except (OSError, ValueError, KeyError, TypeError):
+            position = (self._segments[0], 0)
+        if position[0] not in self._sizes:
+            position = (self._segments[0], 0)
+        return position
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, CURSOR_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"segment": self._cursor[0], "offset": self._cursor[1]}, f)
+        os.replace(path + ".tmp", path)
+
+    def append(self, record: dict):
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        with self._lock:
+            current = self._segments[-1]
+            if self._sizes[current] and self._sizes[current] + len(line) > self.segment_bytes:
+                current = self._rotate()
+            self._writer.write(line)
+            self._writer.flush()
+            self._sizes[current] += len(line)
+            self.records_appended += 1
+            self._enforce_cap()
+
+    def _rotate(self) -> int:
+        self._writer.flush()
+        os.fsync(self._writer.fileno())
+        self._writer.close()
+        segment = self._segments[-1] + 1
+        self._segments.append(segment)
+        self._sizes[segment] = 0
+        self._writer = open(self._path(segment), "ab")
+        return segment
+
+    def _enforce_cap(self):
+        """Evict the oldest segments, sent or not, until the buffer fits max_bytes. Caller holds the lock."""
+        while sum(self._sizes.values()) > self.max_bytes and len(self._segments) > 1:
+            oldest = self._segments.pop(0)
+            size = self._sizes.pop(oldest)
+            os.remove(self._path(oldest))
+            if self._cursor[0] == oldest:
+                self.segments_evicted += 1
+                self.bytes_evicted += size - self._cursor[1]
+                self._cursor = (self._segments[0], 0)
+                self._save_cursor()
+
+    def read_batch(self, max_records: int, max_bytes: int) -> Tuple[List[bytes], Position]:
+        """Up to max_records unacknowledged lines from the cursor on, and the position after them."""
+        with self._lock:
+            segment, offset = self._cursor
+            lines: List[bytes] = []
+            size = 0
+            self._writer.flush()
+            while len(lines) < max_records and size < max_bytes:
+                with open(self._path(segment), "rb") as f:
+                    f.seek(offset)
+                    # A single line larger than max_bytes still goes out, alone
+                    while len(lines) < max_records and (size < max_bytes or not lines):
+                        line = f.readline()
+                        if not line.endswith(b"\n"):
+                            break
+                        lines.append(line[:-1])
+                        offset += len(line)
+                        size += len(line)
+                index = self._segments.index(segment)
+                if offset < self._sizes[segment] or index + 1 >= len(self._segments):
+                    break
+                segment, offset = self._segments[index + 1], 0
+            return lines, (segment, offset)
+
+    def ack(self, position: Position):
+        """Mark everything before position as delivered, dropping fully sent segments."""
+        with self._lock:
+            if position <= self._cursor:
+                return  # Eviction already moved past it
+            self._cursor = position
+            self._save_cursor()
+            while len(self._segments) > 1 and self._segments[0] < position[0]:
+                sent = self._segments.pop(0)
+                del self._sizes[sent]
+                os.remove(self._path(sent))
+
+    def pending_bytes(self) -> int:
+        with self._lock:
+            segment, offset = self._cursor
+            return sum(size for s, size in self._sizes.items() if s >= segment) - offset
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "segments": len(self._segments),
+                "records_appended": self.records_appended,
+                "segments_evicted": self.segments_evicted,
+                "bytes_evicted": self.bytes_evicted,
+            }
+
+    def close(self):
+        with self._lock:
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+            self._writer.close()
+
+
+def json_lines_batch(lines: List[bytes]) -> bytes:
+    return zlib.compress(b"\n".join(lines))
+
+
+class BatchUploader:
+    """Drains a SegmentBuffer as compressed batches while the agent is connected."""
+
+    def __init__(self, buffer: SegmentBuffer, publish: Callable[[bytes], bool], is_connected: Callable[[], bool],
+                 batch_records: int = 500, batch_bytes: int = 256 * 1024,
+                 max_batches_per_second: float = 2.0, interval: float = 5.0,
+                 encode: Callable[[List[bytes]], bytes] = json_lines_batch):
+        self.buffer = buffer
+        self.encode = encode  # Buffered JSON lines -> batch payload
+        self.publish = publish
+        self.is_connected = is_connected
+        self.batch_records = batch_records
+        self.batch_bytes = batch_bytes
+        self.min_gap = 1.0 / max_batches_per_second if max_batches_per_second > 0 else 0.0
+        self.interval = interval
+        self._stop = threading.Event()
+        # Counters
+        self.batches_sent = 0
+        self.records_sent = 0
+        self.bytes_sent = 0
+        self.failures = 0
+
+    def send_once(self) -> Optional[int]:
+        """Send one batch. Returns the records sent, 0 if there was nothing to send, None on failure."""
+        lines, position = self.buffer.read_batch(self.batch_records, self.batch_bytes)
+        if not lines:
+            return 0
+        try:
+            payload = self.encode(lines)
+            delivered = self.publish(payload)
+        except Exception as e:
+            print(f"[AGENT][ERROR] Telemetry batch publish failed: {e}")
+            delivered = False
+        if not delivered:
+            self.failures += 1
+            return None
+        self.buffer.ack(position)
+        self.batches_sent += 1
+        self.records_sent += len(lines)
+        self.bytes_sent += len(payload)
+        return len(lines)
+
+    def run(self):
+        while not self._stop.is_set():
+            if not self.is_connected():
+                self._stop.wait(self.interval)
+                continue
+            sent = self.send_once()
+            # With a backlog, keep draining at the rate limit; otherwise let records accumulate
+            backlog = sent and self.buffer.pending_bytes() > 0
+            self._stop.wait(self.min_gap if backlog else self.interval)
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        return {
+            "batches_sent": self.batches_sent,
+            "records_sent": self.records_sent,
+            "bytes_sent": self.bytes_sent,
+            "failures": self.failures,
+            "pending_bytes": self.buffer.pending_bytes(),
+            **self.buffer.stats(),
+        }